@@ -0,0 +1,285 @@
+"""
+Animación de tránsitos sobre una carta natal (GIF, APNG o WebM).
+
+Parte de las mismas capas que generar_carta_astral_imagen: la rueda
+zodiacal y la carta natal (casas, planetas, ASC/MC) se dibujan una sola vez
+y se guardan como fondo. Cada fotograma restaura ese fondo y dibuja encima
+solo los artistas de los tránsitos (un marcador y un símbolo por cuerpo, y
+la fecha) con blitting; la figura no se vuelve a construir.
+
+Las posiciones de los tránsitos se calculan por bloques (transitos._bloques)
+y cada fotograma se pasa al codificador en cuanto se dibuja, sin guardar la
+animación en memoria:
+
+- "gif": GIF escrito fotograma a fotograma con Pillow (paleta propia en cada uno).
+- "apng": PNG animado; cada fotograma se comprime con Pillow y sus datos se
+  copian a un fdAT.
+- "webm": VP9 con ffmpeg (FFMPEG), que recibe los píxeles por una tubería.
+  Sin ffmpeg este formato no está disponible.
+
+En GIF y APNG cada fotograma guarda solo el rectángulo que cambia respecto
+al anterior (el resto se conserva), igual que el blitting al dibujar.
+"""
+import io
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+from astral_calculator import PLANETAS_INDICES
+from carta import como_carta
+from formatos_compactos import FormatoNoDisponible
+from generador_carta_astral_visual import _nueva_figura, _dibujar_rueda, _dibujar_capa_carta, COMPRESION_PNG
+from simbolos_carta import SIMBOLOS_PLANETAS, COLORES_PLANETAS
+from transitos import _bloques
+
+# --- Configuración (variables de entorno) ---
+# Ejecutable de ffmpeg (solo para WebM)
+FFMPEG = os.getenv("FFMPEG", "ffmpeg")
+
+FORMATOS_ANIMACION = {
+    "gif": "image/gif",
+    "apng": "image/apng",
+    "webm": "video/webm"
+}
+
+# Radio (en unidades del dibujo) de los tránsitos: entre los planetas natales
+# (0.6) y los números de casa (0.8)
+RADIO_TRANSITOS = 0.72
+
+# Instantes que se calculan juntos antes de dibujarlos
+TAMANO_BLOQUE = 256
+
+_FIRMA_PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def comprobar_formato(formato):
+    """Lanza ValueError si el formato no existe y FormatoNoDisponible si falta ffmpeg."""
+    if formato not in FORMATOS_ANIMACION:
+        raise ValueError(f"Formato de animación desconocido: {formato} (use {', '.join(FORMATOS_ANIMACION)})")
+    if formato == "webm" and shutil.which(FFMPEG) is None:
+        raise FormatoNoDisponible("WebM no está disponible en este servidor (falta ffmpeg)")
+
+
+# --- Codificadores (reciben fotogramas RGB uint8 de uno en uno) ---
+
+def _rectangulo_cambiado(anterior, actual):
+    """
+    (x, y, ancho, alto) del menor rectángulo que contiene los píxeles que
+    cambian entre dos fotogramas; si no cambia nada, un píxel.
+    """
+    cambiado = (anterior != actual).any(axis=2)
+    filas = np.flatnonzero(cambiado.any(axis=1))
+    if len(filas) == 0:
+        return 0, 0, 1, 1
+    columnas = np.flatnonzero(cambiado.any(axis=0))
+    return (int(columnas[0]), int(filas[0]),
+            int(columnas[-1] - columnas[0] + 1), int(filas[-1] - filas[0] + 1))
+
+
+class _CodificadorIncremental:
+    """Guarda el fotograma anterior (una copia) para escribir solo lo que cambia."""
+
+    def __init__(self):
+        self._anterior = None
+
+    def _recortar(self, pixeles):
+        """(x, y, píxeles del rectángulo cambiado); el primer fotograma va entero."""
+        if self._anterior is None:
+            self._anterior = pixeles.copy()
+            return 0, 0, self._anterior
+        x, y, ancho, alto = _rectangulo_cambiado(self._anterior, pixeles)
+        recorte = pixeles[y:y + alto, x:x + ancho]
+        self._anterior[y:y + alto, x:x + ancho] = recorte
+        return x, y, recorte
+
+
+class CodificadorGif(_CodificadorIncremental):
+    """GIF animado en bucle, escrito a medida que llegan los fotogramas."""
+
+    def __init__(self, ruta, ancho, alto, fps, fotogramas):
+        super().__init__()
+        self._fichero = open(ruta, "wb")
+        self._duracion = round(1000 / fps)
+
+    def escribir(self, pixeles):
+        primero = self._anterior is None
+        x, y, recorte = self._recortar(pixeles)
+        imagen = Image.fromarray(np.ascontiguousarray(recorte)).quantize(256, method=Image.Quantize.FASTOCTREE)
+        if primero:
+            cabecera, _ = GifImagePlugin.getheader(imagen, info={"loop": 0})
+            self._fichero.write(b"".join(cabecera))
+        # disposal 1: el resto del fotograma anterior se conserva
+        for trozo in GifImagePlugin.getdata(imagen, offset=(x, y), duration=self._duracion, disposal=1,
+                                            include_color_table=True):
+            self._fichero.write(trozo)
+
+    def cerrar(self):
+        self._fichero.write(b";")
+        self._fichero.close()
+
+
+def _trozo_png(tipo, datos):
+    return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos))
+
+
+def _idat_de_png(png):
+    """Datos comprimidos (IDAT concatenados) de un PNG."""
+    datos = []
+    posicion = len(_FIRMA_PNG)
+    while posicion < len(png):
+        longitud, = struct.unpack(">I", png[posicion:posicion + 4])
+        tipo = png[posicion + 4:posicion + 8]
+        if tipo == b"IDAT":
+            datos.append(png[posicion + 8:posicion + 8 + longitud])
+        posicion += 12 + longitud
+    return b"".join(datos)
+
+
+class CodificadorApng(_CodificadorIncremental):
+    """
+    PNG animado en bucle. El número de fotogramas va en la cabecera (acTL),
+    así que debe conocerse al empezar.
+    """
+
+    def __init__(self, ruta, ancho, alto, fps, fotogramas):
+        super().__init__()
+        self._fichero = open(ruta, "wb")
+        self._retardo = (1, fps)
+        self._secuencia = 0
+        self._escritos = 0
+        self._fichero.write(_FIRMA_PNG)
+        self._fichero.write(_trozo_png(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 2, 0, 0, 0)))
+        self._fichero.write(_trozo_png(b"acTL", struct.pack(">II", fotogramas, 0)))
+
+    def escribir(self, pixeles):
+        x, y, recorte = self._recortar(pixeles)
+        buffer = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(recorte)).save(buffer, format="PNG", compress_level=COMPRESION_PNG)
+        datos = _idat_de_png(buffer.getvalue())
+
+        # dispose_op 0 y blend_op 0: el rectángulo sustituye a lo que había y el resto se conserva
+        alto, ancho = recorte.shape[:2]
+        control = struct.pack(">IIIIIHHBB", self._secuencia, ancho, alto, x, y,
+                              self._retardo[0], self._retardo[1], 0, 0)
+        self._fichero.write(_trozo_png(b"fcTL", control))
+        self._secuencia += 1
+        # El primer fotograma es también la imagen por defecto (IDAT)
+        if self._escritos == 0:
+            self._fichero.write(_trozo_png(b"IDAT", datos))
+        else:
+            self._fichero.write(_trozo_png(b"fdAT", struct.pack(">I", self._secuencia) + datos))
+            self._secuencia += 1
+        self._escritos += 1
+
+    def cerrar(self):
+        self._fichero.write(_trozo_png(b"IEND", b""))
+        self._fichero.close()
+
+
+class CodificadorFfmpeg:
+    """WebM (VP9) con ffmpeg; los píxeles le llegan por la entrada estándar."""
+
+    def __init__(self, ruta, ancho, alto, fps, fotogramas):
+        self._proceso = subprocess.Popen(
+            [FFMPEG, "-loglevel", "error", "-y",
+             "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{ancho}x{alto}", "-r", str(fps), "-i", "-",
+             "-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "36", "-pix_fmt", "yuv420p", "-f", "webm", ruta],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def escribir(self, pixeles):
+        self._proceso.stdin.write(np.ascontiguousarray(pixeles).data)
+
+    def cerrar(self):
+        _, errores = self._proceso.communicate()
+        if self._proceso.returncode != 0:
+            raise RuntimeError(f"ffmpeg terminó con código {self._proceso.returncode}: "
+                               f"{errores.decode('utf-8', 'replace').strip()}")
+
+
+CODIFICADORES = {"gif": CodificadorGif, "apng": CodificadorApng, "webm": CodificadorFfmpeg}
+
+
+# --- Fotogramas ---
+
+def fotogramas_transitos(carta, inicio, paso, filas, cuerpos, tamaño_figura=(6, 6), dpi=100):
+    """
+    Genera los fotogramas de la animación como arrays RGB (alto x ancho x 3).
+
+    Args:
+        carta: Carta natal (Carta o diccionario del formato de la API)
+        inicio, paso, filas, cuerpos: Serie de tránsitos (ver transitos.preparar_serie)
+
+    Cada array es una vista del lienzo: solo es válido hasta pedir el siguiente.
+    """
+    fig, ax = _nueva_figura(tamaño_figura, dpi)
+    _dibujar_rueda(ax)
+    _dibujar_capa_carta(fig, ax, como_carta(carta))
+
+    # Artistas de los tránsitos: se dibujan aparte (animated) sobre el fondo
+    marcadores, simbolos = [], []
+    for nombre in cuerpos:
+        color = COLORES_PLANETAS.get(nombre, "#000000")
+        marcador, = ax.plot([], [], "o", markersize=11, markerfacecolor="white", markeredgecolor=color,
+                            markeredgewidth=2, animated=True)
+        marcadores.append(marcador)
+        simbolos.append(ax.text(0, 0, SIMBOLOS_PLANETAS.get(nombre, nombre[:2]), fontsize=8, ha="center",
+                                va="center", color=color, fontweight="bold", animated=True))
+    # La fecha, en el margen superior izquierdo (por encima del título)
+    fecha = fig.text(0.02, 0.985, "", fontsize=9, ha="left", va="top", fontweight="bold", animated=True)
+
+    fig.canvas.draw()
+    fondo = fig.canvas.copy_from_bbox(fig.bbox)
+    lienzo = np.asarray(fig.canvas.buffer_rgba())
+
+    for desde, jds, longitudes, velocidades in _bloques(inicio, paso, filas, cuerpos, TAMANO_BLOQUE):
+        angulos = np.radians(90 - longitudes)
+        xs = (RADIO_TRANSITOS * np.cos(angulos)).tolist()
+        ys = (RADIO_TRANSITOS * np.sin(angulos)).tolist()
+        retrogrados = (velocidades < 0).tolist()
+
+        for i in range(len(jds)):
+            fig.canvas.restore_region(fondo)
+            for k, (marcador, simbolo) in enumerate(zip(marcadores, simbolos)):
+                marcador.set_data([xs[k][i]], [ys[k][i]])
+                marcador.set_markerfacecolor("#FFE4E1" if retrogrados[k][i] else "white")
+                simbolo.set_position((xs[k][i], ys[k][i]))
+                ax.draw_artist(marcador)
+                ax.draw_artist(simbolo)
+            fecha.set_text(f"Tránsitos: {(inicio + (desde + i) * paso):%d/%m/%Y %H:%M} UT")
+            fig.draw_artist(fecha)
+            yield lienzo[..., :3]
+
+
+def generar_animacion_transitos(carta, inicio, paso, filas, cuerpos, ruta, formato="gif",
+                                tamaño_figura=(6, 6), dpi=100, fps=10):
+    """
+    Escribe en `ruta` la animación de los tránsitos sobre la carta natal.
+    La memoria no crece con el número de fotogramas. Devuelve cuántos se escribieron.
+    """
+    comprobar_formato(formato)
+    if isinstance(cuerpos, (list, tuple)):
+        cuerpos = {nombre: PLANETAS_INDICES[nombre] for nombre in cuerpos}
+    if isinstance(paso, (int, float)):
+        paso = timedelta(days=paso)
+
+    codificador = None
+    escritos = 0
+    try:
+        for pixeles in fotogramas_transitos(carta, inicio, paso, filas, cuerpos, tamaño_figura, dpi):
+            if codificador is None:
+                # El tamaño en píxeles es el del lienzo de matplotlib
+                alto, ancho = pixeles.shape[:2]
+                codificador = CODIFICADORES[formato](ruta, ancho, alto, fps, filas)
+            codificador.escribir(pixeles)
+            escritos += 1
+    finally:
+        if codificador is not None:
+            codificador.cerrar()
+    return escritos
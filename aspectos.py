@@ -0,0 +1,220 @@
+"""
+Motor de aspectos vectorizado.
+
+Todas las distancias angulares entre los cuerpos de una carta (o entre dos
+cartas, para sinastría) se calculan como una sola operación de NumPy sobre
+la matriz de longitudes. El modo uno-contra-muchos compara una carta de
+referencia con N perfiles guardados (arrays de longitudes) por bloques, sin
+bucles de Python por pareja.
+"""
+import numpy as np
+
+from astral_calculator import ASPECTOS_MAYORES, PLANETAS_INDICES
+from carta import Carta
+
+# Orbe máximo (grados) de cada aspecto
+ORBES_DEFECTO = {
+    "conjunción": 8.0,
+    "sextil": 6.0,
+    "cuadratura": 7.0,
+    "trígono": 8.0,
+    "oposición": 8.0
+}
+
+# Peso de cada aspecto en la puntuación de compatibilidad
+PESOS_COMPATIBILIDAD = {
+    "conjunción": 1.0,
+    "sextil": 0.6,
+    "cuadratura": -0.8,
+    "trígono": 1.0,
+    "oposición": -0.5
+}
+
+# Perfiles que se comparan a la vez en el modo uno-contra-muchos
+TAMANO_BLOQUE = 4096
+
+
+def _tabla_orbes(orbes):
+    """Nombres, ángulos y orbes de los aspectos en uso, como arrays."""
+    if orbes is None:
+        orbes = ORBES_DEFECTO
+    desconocidos = [a for a in orbes if a not in ASPECTOS_MAYORES]
+    if desconocidos:
+        raise ValueError(f"Aspectos desconocidos: {', '.join(desconocidos)}")
+    nombres = [a for a in ASPECTOS_MAYORES if a in orbes]
+    angulos = np.array([ASPECTOS_MAYORES[a] for a in nombres])
+    limites = np.array([float(orbes[a]) for a in nombres])
+    if (limites < 0).any():
+        raise ValueError("Los orbes no pueden ser negativos")
+    return nombres, angulos, limites
+
+
+def matriz_distancias(longitudes_a, longitudes_b=None):
+    """
+    Distancia angular (0-180°) entre cada par de cuerpos.
+
+    Args:
+        longitudes_a: array (..., A)
+        longitudes_b: array (..., B); si se omite, se usa longitudes_a
+    Devuelve un array (..., A, B).
+    """
+    a = np.asarray(longitudes_a, dtype=np.float64)
+    b = a if longitudes_b is None else np.asarray(longitudes_b, dtype=np.float64)
+    diferencia = np.abs(a[..., :, None] - b[..., None, :]) % 360.0
+    return np.minimum(diferencia, 360.0 - diferencia)
+
+
+def matriz_aspectos(longitudes_a, longitudes_b=None, orbes=None):
+    """
+    Aspecto entre cada par de cuerpos.
+
+    Devuelve (indices, desvios, nombres). indices y desvios son arrays
+    (..., A, B): indices es la posición del aspecto en `nombres` (o -1 si no
+    hay aspecto dentro de orbe) y desvios la distancia al ángulo exacto.
+    Si dos aspectos entran en orbe, gana el más exacto.
+    """
+    nombres, angulos, limites = _tabla_orbes(orbes)
+    distancias = matriz_distancias(longitudes_a, longitudes_b)
+
+    desvios = np.abs(distancias[..., None] - angulos)
+    desvios = np.where(desvios <= limites, desvios, np.inf)
+    indices = np.argmin(desvios, axis=-1)
+    minimos = np.take_along_axis(desvios, indices[..., None], axis=-1)[..., 0]
+
+    indices = np.where(np.isfinite(minimos), indices, -1)
+    return indices, np.where(np.isfinite(minimos), minimos, np.nan), nombres
+
+
+def _longitudes_de_carta(carta, incluir_angulos=True):
+    """Nombres y longitudes (sin redondear) de los cuerpos de una Carta."""
+    nombres = list(carta.cuerpos)
+    longitudes = carta.longitudes.tolist()
+    if incluir_angulos:
+        for campo, nombre, grados in (("ascendente", "Ascendente", carta.ascendente),
+                                      ("medio_cielo", "Medio_Cielo", carta.medio_cielo)):
+            if campo in carta.campos and grados is not None:
+                nombres.append(nombre)
+                longitudes.append(grados)
+    return nombres, np.array(longitudes, dtype=np.float64)
+
+
+def _longitudes_de_resultado(resultado, incluir_angulos=True):
+    """Nombres y longitudes de los cuerpos de una Carta o de un resultado de realizar_calculo_astral."""
+    if isinstance(resultado, Carta):
+        return _longitudes_de_carta(resultado, incluir_angulos)
+    nombres = list(resultado.get("posiciones_planetarias", {}))
+    longitudes = [resultado["posiciones_planetarias"][n]["grados_totales"] for n in nombres]
+    if incluir_angulos:
+        for clave, nombre in (("ascendente", "Ascendente"), ("medio_cielo", "Medio_Cielo")):
+            if resultado.get(clave):
+                nombres.append(nombre)
+                longitudes.append(resultado[clave]["grados_totales"])
+    return nombres, np.array(longitudes, dtype=np.float64)
+
+
+def _lista_aspectos(indices, desvios, nombres_aspectos, cuerpos_a, cuerpos_b, solo_triangulo):
+    filas, columnas = np.nonzero(indices >= 0)
+    aspectos = []
+    for i, j in zip(filas.tolist(), columnas.tolist()):
+        if solo_triangulo and j <= i:
+            continue
+        nombre = nombres_aspectos[indices[i, j]]
+        aspectos.append({
+            "cuerpos": [cuerpos_a[i], cuerpos_b[j]],
+            "aspecto": nombre,
+            "angulo": ASPECTOS_MAYORES[nombre],
+            "orbe": round(float(desvios[i, j]), 2)
+        })
+    aspectos.sort(key=lambda a: a["orbe"])
+    return aspectos
+
+
+def aspectos_de_carta(resultado, orbes=None, incluir_angulos=True):
+    """
+    Aspectos dentro de una carta (Carta o resultado de realizar_calculo_astral),
+    ordenados del más exacto al menos exacto.
+    """
+    cuerpos, longitudes = _longitudes_de_resultado(resultado, incluir_angulos)
+    indices, desvios, nombres = matriz_aspectos(longitudes, orbes=orbes)
+    return _lista_aspectos(indices, desvios, nombres, cuerpos, cuerpos, solo_triangulo=True)
+
+
+def aspectos_sinastria(resultado_a, resultado_b, orbes=None, incluir_angulos=True):
+    """
+    Aspectos entre los cuerpos de dos cartas; cada aspecto lleva primero
+    el cuerpo de la carta A y después el de la carta B.
+    """
+    cuerpos_a, longitudes_a = _longitudes_de_resultado(resultado_a, incluir_angulos)
+    cuerpos_b, longitudes_b = _longitudes_de_resultado(resultado_b, incluir_angulos)
+    indices, desvios, nombres = matriz_aspectos(longitudes_a, longitudes_b, orbes)
+    return _lista_aspectos(indices, desvios, nombres, cuerpos_a, cuerpos_b, solo_triangulo=False)
+
+
+def puntuar_compatibilidad(longitudes_referencia, longitudes_perfiles, orbes=None, pesos=None,
+                           tamano_bloque=TAMANO_BLOQUE):
+    """
+    Modo uno-contra-muchos: compara una carta con N perfiles.
+
+    Args:
+        longitudes_referencia: array (B,) con las longitudes de la carta de referencia
+        longitudes_perfiles: array (N, B) con las de cada perfil, en el mismo orden
+    Cada aspecto suma su peso multiplicado por su exactitud (1 en el ángulo
+    exacto, 0 en el límite del orbe). Devuelve (puntuaciones (N,), aspectos (N,)),
+    donde aspectos es el número de aspectos en orbe de cada perfil.
+    """
+    nombres, angulos, limites = _tabla_orbes(orbes)
+    if pesos is None:
+        pesos = PESOS_COMPATIBILIDAD
+    peso = np.array([float(pesos.get(n, 0.0)) for n in nombres])
+
+    referencia = np.asarray(longitudes_referencia, dtype=np.float64)
+    perfiles = np.asarray(longitudes_perfiles, dtype=np.float64)
+    if perfiles.ndim != 2 or perfiles.shape[1] != referencia.shape[0]:
+        raise ValueError("Cada perfil debe tener tantas longitudes como la carta de referencia")
+
+    n = perfiles.shape[0]
+    puntuaciones = np.empty(n)
+    conteos = np.empty(n, dtype=np.int64)
+    # Orbe 0 equivale a "solo exacto": se evita la división por cero
+    limites_seguros = np.where(limites > 0, limites, 1.0)
+
+    for desde in range(0, n, tamano_bloque):
+        bloque = perfiles[desde:desde + tamano_bloque]
+        distancias = matriz_distancias(referencia, bloque).reshape(len(bloque), -1)  # (n_bloque, B*B)
+        puntuacion = np.zeros(len(bloque))
+        alguno = np.zeros(distancias.shape, dtype=bool)
+
+        # Un recorrido por aspecto (son pocos) en lugar de un eje más en memoria
+        for angulo, limite, limite_seguro, w in zip(angulos, limites, limites_seguros, peso):
+            desvio = np.abs(distancias - angulo)
+            en_orbe = desvio <= limite
+            puntuacion += w * np.where(en_orbe, 1.0 - desvio / limite_seguro, 0.0).sum(axis=1)
+            alguno |= en_orbe
+
+        puntuaciones[desde:desde + len(bloque)] = puntuacion
+        conteos[desde:desde + len(bloque)] = alguno.sum(axis=1)
+
+    return puntuaciones, conteos
+
+
+def ranking_compatibilidad(longitudes_referencia, longitudes_perfiles, limite=50, orbes=None, pesos=None):
+    """
+    Los `limite` perfiles con mayor puntuación, de mayor a menor.
+    Devuelve una lista de (índice del perfil, puntuación, número de aspectos).
+    """
+    puntuaciones, conteos = puntuar_compatibilidad(longitudes_referencia, longitudes_perfiles, orbes, pesos)
+    limite = min(limite, len(puntuaciones))
+    if limite <= 0:
+        return []
+    mejores = np.argpartition(-puntuaciones, limite - 1)[:limite]
+    mejores = mejores[np.argsort(-puntuaciones[mejores], kind="stable")]
+    return [(int(i), float(puntuaciones[i]), int(conteos[i])) for i in mejores]
+
+
+def longitudes_planetarias(resultado):
+    """Longitudes de los diez planetas de una Carta o un resultado, en el orden de PLANETAS_INDICES."""
+    if isinstance(resultado, Carta):
+        posiciones = resultado.longitudes_por_cuerpo()
+        return [posiciones[nombre] for nombre in PLANETAS_INDICES]
+    posiciones = resultado["posiciones_planetarias"]
+    return [posiciones[nombre]["grados_totales"] for nombre in PLANETAS_INDICES]
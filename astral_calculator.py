@@ -1,15 +1,130 @@
 import swisseph as swe
-import math
+import os
+import time
+import numpy as np
 
-def realizar_calculo_astral(data):
+from cache_lru import CacheLRU
+from carta import Carta, SIGNOS, NOMBRES_CASAS
+from metricas import DURACION_ETAPAS, DURACION_CASAS, INTENTOS_CASAS
+from motores_casas import SISTEMAS_CASAS, detectar_motor_casas, motor_aproximado
+
+# Índices numéricos de los planetas en Swiss Ephemeris
+PLANETAS_INDICES = {
+    "Sol": 0, 
+    "Luna": 1, 
+    "Mercurio": 2,
+    "Venus": 3, 
+    "Marte": 4, 
+    "Júpiter": 5,
+    "Saturno": 6, 
+    "Urano": 7, 
+    "Neptuno": 8,
+    "Plutón": 9
+}
+
+# Cuerpos adicionales: solo se calculan si se piden en `cuerpos`.
+# El Nodo Sur no se calcula: es el opuesto del Nodo Norte (nodo verdadero).
+# Quirón necesita el fichero seas_18.se1 (ver download_eph.py).
+CUERPOS_EXTRA = {
+    "Nodo_Norte": swe.TRUE_NODE,
+    "Nodo_Sur": swe.TRUE_NODE,
+    "Quirón": swe.CHIRON,
+    "Lilith": swe.MEAN_APOG
+}
+
+# Todos los cuerpos que se pueden pedir, en el orden en que se devuelven
+CUERPOS = {**PLANETAS_INDICES, **CUERPOS_EXTRA}
+
+# Partes de la carta que se pueden pedir en `campos` (por defecto, todas).
+# Las casas de los cuerpos solo se dan si se calculan las casas, es decir,
+# si se pide "casas", "ascendente" o "medio_cielo".
+CAMPOS = ("planetas", "ascendente", "medio_cielo", "casas")
+
+# Sistema de casas por defecto (Placidus); ver motores_casas.SISTEMAS_CASAS
+SISTEMA_CASAS = "P"
+
+# Aspectos mayores y su ángulo exacto
+ASPECTOS_MAYORES = {
+    "conjunción": 0.0,
+    "sextil": 60.0,
+    "cuadratura": 90.0,
+    "trígono": 120.0,
+    "oposición": 180.0
+}
+
+# Caché de posiciones planetarias por minuto (no dependen del lugar)
+CACHE_PLANETAS_TAMANO = int(os.getenv("CACHE_PLANETAS_TAMANO", "2048"))
+cache_planetas = CacheLRU(tamano_max=CACHE_PLANETAS_TAMANO)
+
+# Tabla precalculada de efemérides (motor "tabla"); None = Swiss Ephemeris
+_tabla_efemerides = None
+# Origen real de las posiciones de swisseph ("swisseph" o "moshier"), probado una vez
+_origen_swisseph = None
+
+# Motor de casas: se prueba una sola vez, al importar (ver motores_casas)
+_motor_casas = detectar_motor_casas()
+
+
+def configurar_motor_efemerides(motor="swisseph", ruta_tabla=None):
     """
-    Motor de cálculo de la carta astral COMPLETO.
-    Incluye planetas, ascendente, medio cielo y las 12 casas astrológicas.
-    Recibe un objeto de datos y devuelve un diccionario con el resultado.
-    Lanza un ValueError si los datos de entrada no son válidos.
+    Elige de dónde salen las posiciones planetarias:
+    - "swisseph": swe.calc_ut (ficheros de ephe/ o Moshier)
+    - "tabla": tabla precalculada de Chebyshev mapeada en memoria (más rápida);
+      fuera de su rango de fechas se sigue usando swe.calc_ut
+    Pensada para llamarse una vez al arrancar.
     """
+    global _tabla_efemerides, _origen_swisseph
+    
+    # La ruta de las efemérides se fija antes de configurar el motor: se vuelve a probar
+    _origen_swisseph = None
+    if motor == "swisseph":
+        _tabla_efemerides = None
+    elif motor == "tabla":
+        from tabla_efemerides import cargar_tabla, RUTA_TABLA
+        _tabla_efemerides = cargar_tabla(ruta_tabla or RUTA_TABLA)
+    else:
+        raise ValueError(f"Motor de efemérides desconocido: {motor}")
     
-    # 1. Validar fechas
+    cache_planetas.limpiar()
+
+
+def motor_efemerides():
+    """Nombre del motor de efemérides activo."""
+    return "tabla" if _tabla_efemerides is not None else "swisseph"
+
+
+def origen_efemerides():
+    """
+    De dónde salen de verdad las posiciones: "tabla", "swisseph" (ficheros
+    de ephe/) o "moshier" (swisseph sin ficheros válidos). Se prueba con el
+    Sol en J2000 la primera vez y tras cada configurar_motor_efemerides.
+    """
+    global _origen_swisseph
+    if _tabla_efemerides is not None:
+        return "tabla"
+    if _origen_swisseph is None:
+        _, retflag = swe.calc_ut(2451545.0, swe.SUN, swe.FLG_SWIEPH)
+        _origen_swisseph = "swisseph" if retflag & swe.FLG_SWIEPH else "moshier"
+    return _origen_swisseph
+
+
+def configurar_motor_casas(nombre=None):
+    """Vuelve a elegir el motor de casas (o fuerza `nombre`). Lanza ValueError si no funciona."""
+    global _motor_casas
+    _motor_casas = detectar_motor_casas(nombre)
+    return _motor_casas
+
+
+def motor_casas():
+    """Motor de casas activo (nombre, precisión y sistemas con describir())."""
+    return _motor_casas
+
+
+def _validar_datos(data):
+    """
+    Valida fecha, hora y coordenadas de entrada.
+    Lanza un ValueError con el primer problema encontrado.
+    """
     if not (1900 <= data.anio <= 2100):
         raise ValueError("Año debe estar entre 1900 y 2100")
     if not (1 <= data.mes <= 12):
@@ -26,260 +141,525 @@ def realizar_calculo_astral(data):
         raise ValueError("Latitud debe estar entre -90 y 90")
     if not (-180 <= data.lng <= 180):
         raise ValueError("Longitud debe estar entre -180 y 180")
+    
+    sistema = getattr(data, "sistema_casas", SISTEMA_CASAS)
+    if sistema not in SISTEMAS_CASAS:
+        raise ValueError(f"Sistema de casas desconocido: {sistema} (use {', '.join(SISTEMAS_CASAS)})")
+    
+    campos = getattr(data, "campos", None)
+    if campos is not None:
+        if not campos:
+            raise ValueError(f"Indique al menos un campo (use {', '.join(CAMPOS)})")
+        desconocidos = [c for c in campos if c not in CAMPOS]
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)} (use {', '.join(CAMPOS)})")
+    cuerpos = getattr(data, "cuerpos", None)
+    if cuerpos is not None:
+        if not cuerpos:
+            raise ValueError("Indique al menos un cuerpo")
+        desconocidos = [c for c in cuerpos if c not in CUERPOS]
+        if desconocidos:
+            raise ValueError(f"Cuerpos desconocidos: {', '.join(desconocidos)} (use {', '.join(CUERPOS)})")
 
-    # Calcular el día juliano en UT
-    jd_ut = swe.julday(data.anio, data.mes, data.dia, data.hora + data.minuto / 60.0)
+
+def seleccion_de_datos(data):
+    """
+    Campos y cuerpos pedidos en `data`, normalizados: (campos, cuerpos) como
+    tuplas sin repetidos y en el orden de CAMPOS y CUERPOS. Sin selección,
+    todos los campos y los diez planetas.
+    """
+    campos = getattr(data, "campos", None)
+    cuerpos = getattr(data, "cuerpos", None)
+    campos = CAMPOS if campos is None else tuple(c for c in CAMPOS if c in campos)
+    cuerpos = tuple(PLANETAS_INDICES) if cuerpos is None else tuple(c for c in CUERPOS if c in cuerpos)
+    return campos, cuerpos
+
+
+def es_seleccion_completa(campos, cuerpos):
+    """Indica si una selección normalizada es la carta completa por defecto."""
+    return campos == CAMPOS and cuerpos == tuple(PLANETAS_INDICES)
+
+
+def calcular_posiciones_y_velocidades(jd_ut, cuerpos=None):
+    """
+    Etapa de planetas: longitudes y velocidades de los diez planetas (o de
+    `cuerpos`, una tupla de nombres de CUERPOS) para un día juliano.
+    Solo depende del instante, así que el resultado se guarda en una caché
+    por minuto y se comparte entre todas las cartas de ese mismo minuto,
+    sea cual sea el lugar.
+    Devuelve (posiciones, velocidades, errores) como copias que el llamador
+    puede modificar.
+    """
+    clave = round(jd_ut * 1440)
+    if cuerpos is not None and tuple(cuerpos) != tuple(PLANETAS_INDICES):
+        clave = (clave, tuple(cuerpos))
+    guardado = cache_planetas.obtener(clave)
+    if guardado is None:
+        guardado = _calcular_posiciones(jd_ut, cuerpos)
+        cache_planetas.guardar(clave, guardado)
     
-    # Inicializar variables
+    posiciones, velocidades, errores = guardado
+    return dict(posiciones), dict(velocidades), list(errores)
+
+
+def calcular_posiciones_planetarias(jd_ut, cuerpos=None):
+    """Como calcular_posiciones_y_velocidades, sin las velocidades: (posiciones, errores)."""
+    posiciones, _, errores = calcular_posiciones_y_velocidades(jd_ut, cuerpos)
+    return posiciones, errores
+
+
+def _calcular_posiciones(jd_ut, cuerpos=None):
+    """
+    Calcula la longitud eclíptica de los diez planetas (o de `cuerpos`) para
+    un día juliano. Devuelve (posiciones, velocidades, errores); un planeta
+    que falla queda en 0.0 y un cuerpo adicional que falla (Quirón sin
+    seas_18.se1) se omite.
+    """
     posiciones = {}
-    casas = {}
+    velocidades = {}
     errores = []
     flags = swe.FLG_SWIEPH | swe.FLG_SPEED
+    tabla = _tabla_efemerides
+    if tabla is not None and not tabla.cubre(jd_ut):
+        tabla = None
     
-    # Índices numéricos de los planetas
-    planetas_indices = {
-        "Sol": 0, 
-        "Luna": 1, 
-        "Mercurio": 2,
-        "Venus": 3, 
-        "Marte": 4, 
-        "Júpiter": 5,
-        "Saturno": 6, 
-        "Urano": 7, 
-        "Neptuno": 8,
-        "Plutón": 9
-    }
-    
-    # Calcular posiciones planetarias
-    for nombre, planeta_id in planetas_indices.items():
+    for nombre in (PLANETAS_INDICES if cuerpos is None else cuerpos):
+        if nombre in CUERPOS_EXTRA:
+            try:
+                longitud, velocidad = calcular_posicion(jd_ut, CUERPOS_EXTRA[nombre])
+                posiciones[nombre] = (longitud + 180.0) % 360 if nombre == "Nodo_Sur" else longitud
+                velocidades[nombre] = velocidad
+            except Exception as e:
+                errores.append(f"Error calculando {nombre}: {str(e)}")
+            continue
+        planeta_id = PLANETAS_INDICES[nombre]
         try:
+            if tabla is not None:
+                posiciones[nombre], velocidades[nombre] = tabla.posicion(jd_ut, planeta_id)
+                continue
             pos, _ = swe.calc_ut(jd_ut, planeta_id, flags)
-            posiciones[nombre] = pos[0]
+            posiciones[nombre], velocidades[nombre] = pos[0], pos[3]
         except Exception as e:
             errores.append(f"Error calculando {nombre}: {str(e)}")
-            posiciones[nombre] = 0.0
+            posiciones[nombre], velocidades[nombre] = 0.0, 0.0
     
-    # --- Cálculo de Casas, Ascendente y Medio Cielo ---
+    return posiciones, velocidades, errores
+
+
+def calcular_posicion(jd_ut, cuerpo):
+    """
+    Longitud (grados) y velocidad (°/día) de un cuerpo en un instante,
+    con el motor de efemérides activo. Lanza swe.Error si no se puede calcular.
+    """
+    tabla = _tabla_efemerides
+    if tabla is not None and tabla.cubre(jd_ut, cuerpo):
+        return tabla.posicion(jd_ut, cuerpo)
+    pos, _ = swe.calc_ut(jd_ut, cuerpo, swe.FLG_SWIEPH | swe.FLG_SPEED)
+    return pos[0], pos[3]
+
+
+def calcular_posiciones_bloque(jds, cuerpos):
+    """
+    Longitudes y velocidades de varios cuerpos en muchos instantes.
+    
+    Args:
+        jds: array de días juliano (UT)
+        cuerpos: lista de índices de Swiss Ephemeris (ver PLANETAS_INDICES)
+    
+    Devuelve (longitudes, velocidades), dos arrays (len(cuerpos), len(jds)).
+    Con el motor "tabla" se evalúa todo el bloque de una vez; si no, se
+    llama a swe.calc_ut instante a instante. Lanza swe.Error si un cuerpo
+    no se puede calcular.
+    """
+    jds = np.asarray(jds, dtype=np.float64)
+    longitudes = np.empty((len(cuerpos), len(jds)))
+    velocidades = np.empty((len(cuerpos), len(jds)))
+    flags = swe.FLG_SWIEPH | swe.FLG_SPEED
+    
+    tabla = _tabla_efemerides
+    en_tabla = tabla is not None and len(jds) > 0 and tabla.cubre(jds.min()) and tabla.cubre(jds.max())
+    
+    for k, cuerpo in enumerate(cuerpos):
+        if en_tabla and tabla.cubre(jds[0], cuerpo):
+            longitudes[k], velocidades[k] = tabla.posiciones(jds, cuerpo)
+            continue
+        for i, jd in enumerate(jds.tolist()):
+            pos, _ = swe.calc_ut(jd, cuerpo, flags)
+            longitudes[k, i] = pos[0]
+            velocidades[k, i] = pos[3]
+    
+    return longitudes, velocidades
+
+
+def _medir_intento_casas(metodo, resultado, inicio):
+    """Registra la duración y el resultado de un intento de swe.houses; devuelve el instante actual."""
+    ahora = time.perf_counter()
+    DURACION_CASAS.observar(ahora - inicio, metodo=metodo)
+    INTENTOS_CASAS.incrementar(metodo=metodo, resultado=resultado)
+    return ahora
+
+
+def _calcular_casas(jd_ut, lat, lng, sistema=SISTEMA_CASAS):
+    """
+    Calcula Ascendente, Medio Cielo y las 12 cúspides con el motor de casas
+    elegido al arrancar. Si no hay solución (Placidus y Koch en los círculos
+    polares), recurre a la aproximación manual de casas iguales.
+    Devuelve (angulos, casas, errores).
+    """
+    errores = []
+    motor = _motor_casas
+    
+    inicio = time.perf_counter()
     try:
-        # Método 1: Capturar todos los valores que devuelve swe.houses()
-        resultado_houses = swe.houses(jd_ut, data.lat, data.lng, b'P')
-        
-        # swe.houses() típicamente devuelve (house_cusps, ascmc)
-        if len(resultado_houses) >= 2:
-            house_cusps, ascmc = resultado_houses[0], resultado_houses[1]
-            
-            # Ascendente y Medio Cielo
-            posiciones["Ascendente"] = ascmc[0]  # Ascendente
-            posiciones["Medio_Cielo"] = ascmc[1]  # Medio Cielo
-            
-            # Las 12 casas (house_cusps[0] es casa 1, house_cusps[1] es casa 2, etc.)
-            nombres_casas = [
-                "Casa 1", "Casa 2", "Casa 3", "Casa 4", "Casa 5", "Casa 6",
-                "Casa 7", "Casa 8", "Casa 9", "Casa 10", "Casa 11", "Casa 12"
-            ]
-            
-            for i, nombre_casa in enumerate(nombres_casas):
-                if i < len(house_cusps):
-                    casas[nombre_casa] = house_cusps[i]
-                else:
-                    casas[nombre_casa] = 0.0
-                    errores.append(f"No se pudo calcular {nombre_casa}")
-            
-        else:
-            # Si solo devuelve un valor, intentar extraer de ahí
-            house_cusps = resultado_houses[0]
-            posiciones["Ascendente"] = house_cusps[0] if len(house_cusps) > 0 else 0.0
-            posiciones["Medio_Cielo"] = house_cusps[9] if len(house_cusps) > 9 else 0.0
-            
-            # Intentar extraer las casas del array único
-            nombres_casas = [
-                "Casa 1", "Casa 2", "Casa 3", "Casa 4", "Casa 5", "Casa 6",
-                "Casa 7", "Casa 8", "Casa 9", "Casa 10", "Casa 11", "Casa 12"
-            ]
-            
-            for i, nombre_casa in enumerate(nombres_casas):
-                if i < len(house_cusps):
-                    casas[nombre_casa] = house_cusps[i]
-                else:
-                    casas[nombre_casa] = 0.0
-                    
+        cuspides, ascendente, medio_cielo = motor.calcular(jd_ut, lat, lng, sistema)
+        _medir_intento_casas(motor.nombre, "ok", inicio)
+        if motor.precision == "aproximada":
+            errores.append("Usando cálculo aproximado de casas y ascendente (método manual)")
     except Exception as e:
+        inicio = _medir_intento_casas(motor.nombre, "error", inicio)
         try:
-            # Método 2: Usar string normal (algunas versiones lo aceptan)
-            resultado_houses = swe.houses(jd_ut, data.lat, data.lng, 'P')
-            
-            if len(resultado_houses) >= 2:
-                house_cusps, ascmc = resultado_houses[0], resultado_houses[1]
-                posiciones["Ascendente"] = ascmc[0]
-                posiciones["Medio_Cielo"] = ascmc[1]
-                
-                nombres_casas = [
-                    "Casa 1", "Casa 2", "Casa 3", "Casa 4", "Casa 5", "Casa 6",
-                    "Casa 7", "Casa 8", "Casa 9", "Casa 10", "Casa 11", "Casa 12"
-                ]
-                
-                for i, nombre_casa in enumerate(nombres_casas):
-                    if i < len(house_cusps):
-                        casas[nombre_casa] = house_cusps[i]
-                    else:
-                        casas[nombre_casa] = 0.0
-                        
+            cuspides, ascendente, medio_cielo = motor_aproximado.calcular(jd_ut, lat, lng, sistema)
+            errores.append("Usando cálculo aproximado de casas y ascendente (método manual)")
+            _medir_intento_casas(motor_aproximado.nombre, "ok", inicio)
         except Exception as e2:
-            # Método 3: Cálculo manual aproximado
-            try:
-                # Tiempo sidéreo en Greenwich
-                sidt = swe.sidtime(jd_ut)
-                # Tiempo sidéreo local (aproximado)
-                local_sidt = (sidt + data.lng / 15.0) % 24.0
-                
-                # Fórmula aproximada para el Ascendente
-                lat_rad = math.radians(data.lat)
-                lst_rad = math.radians(local_sidt * 15.0)
-                
-                # Aproximación del Ascendente
-                asc_rad = math.atan2(-math.cos(lst_rad), 
-                                    math.sin(lst_rad) * math.cos(lat_rad))
-                ascendente_aprox = math.degrees(asc_rad) % 360
-                
-                posiciones["Ascendente"] = ascendente_aprox
-                posiciones["Medio_Cielo"] = (local_sidt * 15.0) % 360  # MC aproximado
-                
-                # Casas aproximadas (método Equal House - casas de 30° cada una)
-                casa_1 = ascendente_aprox
-                for i in range(12):
-                    casa_grados = (casa_1 + (i * 30)) % 360
-                    casas[f"Casa {i+1}"] = casa_grados
-                
-                errores.append("Usando cálculo aproximado de casas y ascendente (método manual)")
-                
-            except Exception as e3:
-                # Si todo falla
-                errores.append(f"Error calculando casas: {str(e)} | {str(e2)} | {str(e3)}")
-                posiciones["Ascendente"] = 0.0
-                posiciones["Medio_Cielo"] = 0.0
-                
-                # Casas por defecto (todas en 0)
-                for i in range(12):
-                    casas[f"Casa {i+1}"] = 0.0
-
-    # Función para determinar en qué casa está cada planeta
-    def determinar_casa_planeta(grados_planeta, casas_cusps):
-        """
-        Determina en qué casa está un planeta basado en sus grados
-        y las cúspides de las casas.
-        """
-        # Normalizar grados del planeta
-        grados_planeta = grados_planeta % 360
-        
-        # Convertir diccionario de casas a lista ordenada
-        cusps_list = []
-        for i in range(1, 13):
-            cusp = casas_cusps.get(f"Casa {i}", 0.0) % 360
-            cusps_list.append(cusp)
-        
-        # Encontrar en qué casa cae el planeta
-        for i in range(12):
-            cusp_actual = cusps_list[i]
-            cusp_siguiente = cusps_list[(i + 1) % 12]
-            
-            # Manejar el caso donde la casa cruza 0° (ej: de 350° a 10°)
-            if cusp_actual <= cusp_siguiente:
-                if cusp_actual <= grados_planeta < cusp_siguiente:
-                    return i + 1
-            else:  # Casa que cruza 0°
-                if grados_planeta >= cusp_actual or grados_planeta < cusp_siguiente:
-                    return i + 1
-        
-        return 1  # Por defecto, casa 1
+            _medir_intento_casas(motor_aproximado.nombre, "error", inicio)
+            # Si todo falla: casas por defecto (todas en 0)
+            errores.append(f"Error calculando casas: {str(e)} | {str(e2)}")
+            cuspides, ascendente, medio_cielo = [0.0] * 12, 0.0, 0.0
+    
+    angulos = {"Ascendente": ascendente, "Medio_Cielo": medio_cielo}
+    casas = dict(zip(NOMBRES_CASAS, cuspides))
+    return angulos, casas, errores
 
-    # Formatear las posiciones con signos y casas
-    signos = ["Aries", "Tauro", "Géminis", "Cáncer", "Leo", "Virgo", 
-             "Libra", "Escorpio", "Sagitario", "Capricornio", "Acuario", "Piscis"]
+def formatear_signo(grados):
+    """
+    Formato estándar de una longitud eclíptica: grados totales, signo y
+    grados dentro del signo (redondeados a 2 decimales).
+    """
+    # Asegurarse de que los grados estén en el rango [0, 360)
+    grados_normalizados = grados % 360
+    if grados_normalizados < 0:
+        grados_normalizados += 360
     
-    posiciones_con_signos = {}
-    for planeta, grados in posiciones.items():
-        # Saltar Ascendente y Medio Cielo para el cálculo de casas
-        if planeta in ["Ascendente", "Medio_Cielo"]:
-            continue
-            
-        # Asegurarse de que los grados estén en el rango [0, 360)
-        grados_normalizados = grados % 360
-        if grados_normalizados < 0:
-            grados_normalizados += 360
-
-        signo_index = int(grados_normalizados // 30)
-        grados_en_signo = grados_normalizados % 30
-        
-        # Determinar casa del planeta
-        casa_planeta = determinar_casa_planeta(grados_normalizados, casas)
-        
-        posiciones_con_signos[planeta] = {
-            "grados_totales": round(grados, 2),
-            "signo": signos[signo_index],
-            "grados_en_signo": round(grados_en_signo, 2),
-            "casa": casa_planeta
-        }
+    return {
+        "grados_totales": round(grados, 2),
+        "signo": SIGNOS[int(grados_normalizados // 30)],
+        "grados_en_signo": round(grados_normalizados % 30, 2)
+    }
+
+
+def ordenar_cuspides(cuspides):
+    """
+    Prepara cúspides para asignar_casas.
     
-    # Formatear las casas con signos
-    casas_con_signos = {}
-    for casa, grados in casas.items():
-        grados_normalizados = grados % 360
-        if grados_normalizados < 0:
-            grados_normalizados += 360
+    Args:
+        cuspides: array (..., 12) con las cúspides de las casas 1 a 12,
+                  en orden zodiacal (como las devuelve swe.houses)
+    
+    Normaliza las cúspides a [0, 360) y las ordena de menor a mayor, de modo
+    que ninguna casa cruza 0° dentro del array (la que lo cruzaba queda
+    repartida entre el final y el principio). Las cúspides repetidas
+    conservan su orden zodiacal. Devuelve
+    (cuspides_ordenadas, numero_casa), donde numero_casa[..., k] es la casa
+    (1-12) que empieza en cuspides_ordenadas[..., k].
+    """
+    normalizadas = np.asarray(cuspides, dtype=np.float64) % 360
+    
+    # Empezar a contar en la cúspide que sigue al paso por 0°, para que las
+    # cúspides repetidas queden en su orden zodiacal al ordenar
+    bajada = normalizadas < np.roll(normalizadas, 1, axis=-1)
+    inicio = np.argmax(bajada, axis=-1)[..., None]
+    rotacion = (inicio + np.arange(12)) % 12
+    rotadas = np.take_along_axis(normalizadas, rotacion, axis=-1)
+    
+    orden = np.take_along_axis(rotacion, np.argsort(rotadas, axis=-1, kind="stable"), axis=-1)
+    return np.take_along_axis(normalizadas, orden, axis=-1), orden + 1
 
-        signo_index = int(grados_normalizados // 30)
-        grados_en_signo = grados_normalizados % 30
-        
-        casas_con_signos[casa] = {
-            "grados_totales": round(grados, 2),
-            "signo": signos[signo_index],
-            "grados_en_signo": round(grados_en_signo, 2)
-        }
+
+def asignar_casas(longitudes, cuspides_ordenadas, numero_casa):
+    """
+    Casa (1-12) de cada cuerpo, para una o muchas cartas en una sola llamada.
     
-    # Formatear Ascendente y Medio Cielo
-    ascendente_formateado = {}
-    medio_cielo_formateado = {}
+    Args:
+        longitudes: array (..., P) con los grados de los cuerpos
+        cuspides_ordenadas, numero_casa: arrays (..., 12) de ordenar_cuspides
     
-    if "Ascendente" in posiciones:
-        grados_asc = posiciones["Ascendente"] % 360
-        if grados_asc < 0:
-            grados_asc += 360
-        signo_index_asc = int(grados_asc // 30)
-        grados_en_signo_asc = grados_asc % 30
-        
-        ascendente_formateado = {
-            "grados_totales": round(posiciones["Ascendente"], 2),
-            "signo": signos[signo_index_asc],
-            "grados_en_signo": round(grados_en_signo_asc, 2)
-        }
+    Un cuerpo está en la casa de la mayor cúspide que no lo supera; si está
+    antes de todas, en la de la última (la casa que cruza 0°). Las
+    comparaciones se hacen sobre los mismos grados normalizados que la regla
+    original por intervalos, así que el resultado es idéntico, incluidas las
+    casas que cruzan 0°. Si todas las cúspides coinciden se devuelve la casa 1.
+    """
+    grados = np.asarray(longitudes, dtype=np.float64) % 360
+    
+    # Cuántas cúspides quedan por debajo de cada cuerpo (searchsorted por carta)
+    debajo = (cuspides_ordenadas[..., None, :] <= grados[..., :, None]).sum(axis=-1)
+    posicion = np.where(debajo == 0, 11, debajo - 1)
+    casas = np.take_along_axis(numero_casa, posicion, axis=-1)
     
-    if "Medio_Cielo" in posiciones:
-        grados_mc = posiciones["Medio_Cielo"] % 360
-        if grados_mc < 0:
-            grados_mc += 360
-        signo_index_mc = int(grados_mc // 30)
-        grados_en_signo_mc = grados_mc % 30
+    degeneradas = cuspides_ordenadas[..., :1] == cuspides_ordenadas[..., 11:]
+    return np.where(degeneradas, 1, casas)
+
+
+def casas_de_planetas(longitudes, cuspides):
+    """
+    Atajo de ordenar_cuspides + asignar_casas.
+    longitudes: (N, P); cuspides: (N, 12). Devuelve un array (N, P) de casas.
+    """
+    cuspides_ordenadas, numero_casa = ordenar_cuspides(cuspides)
+    return asignar_casas(longitudes, cuspides_ordenadas, numero_casa)
+
+
+def calcular_carta(data):
+    """
+    Motor de cálculo de la carta astral COMPLETO.
+    Incluye planetas, ascendente, medio cielo y las 12 casas astrológicas.
+    Recibe un objeto de datos y devuelve una Carta (ver carta.py), con las
+    longitudes, velocidades y cúspides sin redondear; Carta.a_dict() da el
+    formato de la API. Lanza un ValueError si los datos no son válidos.
+    
+    Si `data` tiene `campos` (ver CAMPOS) o `cuerpos` (ver CUERPOS), solo se
+    calcula y se devuelve lo pedido: sin "casas", "ascendente" ni
+    "medio_cielo" no se llama a swe.houses y los cuerpos no llevan casa.
+    """
+    
+    # Marcas de tiempo de cada etapa (ver metricas.DURACION_ETAPAS; el
+    # formato se mide en Carta.a_dict)
+    t0 = time.perf_counter()
+
+    # 1. Validar fechas y coordenadas
+    _validar_datos(data)
+    campos, cuerpos = seleccion_de_datos(data)
+    con_casas = any(c in campos for c in ("ascendente", "medio_cielo", "casas"))
+    t1 = time.perf_counter()
+
+    # Calcular el día juliano en UT
+    jd_ut = swe.julday(data.anio, data.mes, data.dia, data.hora + data.minuto / 60.0)
+    t2 = time.perf_counter()
+    
+    # Calcular posiciones planetarias (etapa compartida por instante)
+    posiciones, velocidades, errores = {}, {}, []
+    if "planetas" in campos:
+        posiciones, velocidades, errores = calcular_posiciones_y_velocidades(jd_ut, cuerpos)
+    nombres_planetas = list(posiciones)
+    longitudes = np.array([posiciones[p] for p in nombres_planetas], dtype=np.float64)
+    t3 = time.perf_counter()
+    
+    # --- Cálculo de Casas, Ascendente y Medio Cielo ---
+    sistema = getattr(data, "sistema_casas", SISTEMA_CASAS)
+    angulos, cuspides = {}, None
+    if con_casas:
+        angulos, casas, errores_casas = _calcular_casas(jd_ut, data.lat, data.lng, sistema)
+        cuspides = np.array([casas.get(nombre_casa, 0.0) for nombre_casa in NOMBRES_CASAS])
+        errores.extend(errores_casas)
+    t4 = time.perf_counter()
+
+    # Casa de cada planeta, todas en una sola operación
+    casas_planetas = None
+    if con_casas:
+        casas_planetas = casas_de_planetas(longitudes[None, :], cuspides[None, :])[0]
+    t5 = time.perf_counter()
+
+    carta = Carta(
+        nombre=data.nombre,
+        ciudad=data.ciudad,
+        lat=data.lat,
+        lng=data.lng,
+        fecha_hora_calculo=f"{data.dia:02d}/{data.mes:02d}/{data.anio} {data.hora:02d}:{data.minuto:02d}",
+        jd_ut=jd_ut,
+        campos=campos,
+        cuerpos=nombres_planetas,
+        longitudes=longitudes,
+        velocidades=[velocidades[p] for p in nombres_planetas],
+        casas_cuerpos=casas_planetas,
+        cuspides=cuspides,
+        ascendente=angulos.get("Ascendente"),
+        medio_cielo=angulos.get("Medio_Cielo"),
+        sistema_casas=sistema if con_casas else None,
+        advertencias=errores
+    )
+
+    DURACION_ETAPAS.observar(t1 - t0, etapa="validacion")
+    DURACION_ETAPAS.observar(t2 - t1, etapa="julday")
+    DURACION_ETAPAS.observar(t3 - t2, etapa="planetas")
+    if con_casas:
+        DURACION_ETAPAS.observar(t4 - t3, etapa="casas")
+        DURACION_ETAPAS.observar(t5 - t4, etapa="casas_planetas")
         
-        medio_cielo_formateado = {
-            "grados_totales": round(posiciones["Medio_Cielo"], 2),
-            "signo": signos[signo_index_mc],
-            "grados_en_signo": round(grados_en_signo_mc, 2)
-        }
+    return carta
+
+
+def realizar_calculo_astral(data):
+    """
+    Carta astral en el formato de la API (diccionario): calcular_carta(data).a_dict().
+    Lanza un ValueError si los datos de entrada no son válidos.
+    """
+    return calcular_carta(data).a_dict()
+
+
+# --- Cálculo por lotes ---
+
+def _dias_julianos(anios, meses, dias, horas):
+    """
+    Versión vectorizada de swe.julday para el calendario gregoriano.
+    Reproduce la aritmética de la librería C, así que cada valor es idéntico
+    al que devolvería swe.julday llamado registro a registro.
+    """
+    anios = np.asarray(anios, dtype=np.float64)
+    meses = np.asarray(meses, dtype=np.float64)
+    dias = np.asarray(dias, dtype=np.float64)
+    horas = np.asarray(horas, dtype=np.float64)
     
-    # Resultado final estructurado
-    resultado = {
-        "nombre": data.nombre,
-        "fecha_hora_calculo": f"{data.dia:02d}/{data.mes:02d}/{data.anio} {data.hora:02d}:{data.minuto:02d}",
-        "ciudad": data.ciudad,
-        "coordenadas": {"lat": data.lat, "lng": data.lng},
-        "ascendente": ascendente_formateado,
-        "medio_cielo": medio_cielo_formateado,
-        "posiciones_planetarias": posiciones_con_signos,
-        "casas_astrologicas": casas_con_signos,
-        "dia_juliano": round(jd_ut, 2)
-    }
+    u = anios - (meses < 3)
+    u0 = u + 4712.0
+    u1 = meses + 1.0
+    u1 = np.where(u1 < 4, u1 + 12.0, u1)
+    jd = np.floor(u0 * 365.25) + np.floor(30.6 * u1 + 0.000001) + dias + horas / 24.0 - 63.5
     
-    if errores:
-        resultado["advertencias"] = errores
+    # Corrección gregoriana (todos los años válidos son positivos)
+    u2 = np.floor(np.abs(u) / 100) - np.floor(np.abs(u) / 400)
+    return jd - u2 + 2
+
+
+def _signos_y_grados(grados):
+    """
+    Devuelve (índice de signo, grados dentro del signo) para un array de longitudes.
+    """
+    grados_normalizados = np.asarray(grados, dtype=np.float64) % 360
+    return (grados_normalizados // 30).astype(np.int64), grados_normalizados % 30
+
+
+def realizar_calculo_astral_lote(registros):
+    """
+    Motor de cálculo de cartas astrales por lotes.
+    
+    Equivale a llamar a realizar_calculo_astral para cada registro, pero
+    agrupa los registros que comparten instante (los planetas se calculan
+    una vez por día juliano distinto), calcula todos los días julianos en
+    una sola pasada y asigna signos y casas con operaciones de arrays.
+    
+    Devuelve una lista en el mismo orden que `registros`. Cada elemento es
+    {"indice": i, "resultado": {...}} o, si el registro no es válido,
+    {"indice": i, "error": "mensaje"}. Los registros con una selección de
+    campos o cuerpos se calculan uno a uno con realizar_calculo_astral.
+    """
+    salida = [None] * len(registros)
+    validos = []
+    for i, data in enumerate(registros):
+        try:
+            _validar_datos(data)
+            if es_seleccion_completa(*seleccion_de_datos(data)):
+                validos.append(i)
+            else:
+                salida[i] = {"indice": i, "resultado": realizar_calculo_astral(data)}
+        except ValueError as ve:
+            salida[i] = {"indice": i, "error": str(ve)}
+    
+    if not validos:
+        return salida
+    
+    lote = [registros[i] for i in validos]
+    
+    # 1. Días julianos de todo el lote en una pasada
+    jd = _dias_julianos(
+        [d.anio for d in lote],
+        [d.mes for d in lote],
+        [d.dia for d in lote],
+        [d.hora + d.minuto / 60.0 for d in lote]
+    )
+    
+    # 2. Planetas: una vez por instante distinto
+    jds_unicos, inversa = np.unique(jd, return_inverse=True)
+    longitudes_unicas = np.empty((len(jds_unicos), len(PLANETAS_INDICES)))
+    errores_unicos = []
+    for k, jd_k in enumerate(jds_unicos.tolist()):
+        posiciones, errores = calcular_posiciones_planetarias(jd_k)
+        longitudes_unicas[k] = list(posiciones.values())
+        errores_unicos.append(errores)
+    longitudes = longitudes_unicas[inversa]
+    
+    # 3. Casas: una vez por combinación distinta de instante y lugar
+    casas_por_clave = {}
+    casas_lote = []
+    for jd_r, data in zip(jd.tolist(), lote):
+        sistema = getattr(data, "sistema_casas", SISTEMA_CASAS)
+        clave = (jd_r, data.lat, data.lng, sistema)
+        if clave not in casas_por_clave:
+            casas_por_clave[clave] = _calcular_casas(jd_r, data.lat, data.lng, sistema)
+        casas_lote.append(casas_por_clave[clave])
+    
+    cuspides = np.array([
+        [casas.get(nombre_casa, 0.0) for nombre_casa in NOMBRES_CASAS]
+        for _, casas, _ in casas_lote
+    ])
+    angulos = np.array([
+        [angs.get("Ascendente", np.nan), angs.get("Medio_Cielo", np.nan)]
+        for angs, _, _ in casas_lote
+    ])
+    
+    # 4. Signos y casas como operaciones de arrays
+    casa_planetas = casas_de_planetas(longitudes, cuspides).tolist()
+    signo_planetas, en_signo_planetas = _signos_y_grados(longitudes)
+    signo_cuspides, en_signo_cuspides = _signos_y_grados(cuspides)
+    signo_angulos, en_signo_angulos = _signos_y_grados(angulos)
+    
+    signo_planetas, en_signo_planetas = signo_planetas.tolist(), en_signo_planetas.tolist()
+    signo_cuspides, en_signo_cuspides = signo_cuspides.tolist(), en_signo_cuspides.tolist()
+    signo_angulos, en_signo_angulos = signo_angulos.tolist(), en_signo_angulos.tolist()
+    jds, longitudes = jd.tolist(), longitudes.tolist()
+    nombres_planetas = list(PLANETAS_INDICES)
+    
+    # 5. Construir los diccionarios de resultado, con el mismo formato que
+    # realizar_calculo_astral
+    for j, (i, data) in enumerate(zip(validos, lote)):
+        angs, casas, errores_casas = casas_lote[j]
+        
+        posiciones_con_signos = {}
+        for p, planeta in enumerate(nombres_planetas):
+            posiciones_con_signos[planeta] = {
+                "grados_totales": round(longitudes[j][p], 2),
+                "signo": SIGNOS[signo_planetas[j][p]],
+                "grados_en_signo": round(en_signo_planetas[j][p], 2),
+                "casa": casa_planetas[j][p]
+            }
+        
+        casas_con_signos = {}
+        for c, casa in enumerate(NOMBRES_CASAS):
+            if casa in casas:
+                casas_con_signos[casa] = {
+                    "grados_totales": round(casas[casa], 2),
+                    "signo": SIGNOS[signo_cuspides[j][c]],
+                    "grados_en_signo": round(en_signo_cuspides[j][c], 2)
+                }
         
-    return resultado
+        formateados = []
+        for a, clave in enumerate(["Ascendente", "Medio_Cielo"]):
+            if clave in angs:
+                formateados.append({
+                    "grados_totales": round(angs[clave], 2),
+                    "signo": SIGNOS[signo_angulos[j][a]],
+                    "grados_en_signo": round(en_signo_angulos[j][a], 2)
+                })
+            else:
+                formateados.append({})
+        
+        resultado = {
+            "nombre": data.nombre,
+            "fecha_hora_calculo": f"{data.dia:02d}/{data.mes:02d}/{data.anio} {data.hora:02d}:{data.minuto:02d}",
+            "ciudad": data.ciudad,
+            "coordenadas": {"lat": data.lat, "lng": data.lng},
+            "ascendente": formateados[0],
+            "medio_cielo": formateados[1],
+            "posiciones_planetarias": posiciones_con_signos,
+            "casas_astrologicas": casas_con_signos,
+            "sistema_casas": getattr(data, "sistema_casas", SISTEMA_CASAS),
+            "dia_juliano": round(jds[j], 2)
+        }
+        
+        errores = errores_unicos[inversa[j]] + errores_casas
+        if errores:
+            resultado["advertencias"] = errores
+        
+        salida[i] = {"indice": i, "resultado": resultado}
+    
+    return salida
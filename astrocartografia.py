@@ -0,0 +1,207 @@
+"""
+Astrocartografía: líneas MC, IC, ascendente y descendente de cada planeta
+sobre el globo, como GeoJSON.
+
+Para un instante, cada planeta tiene ascensión recta α y declinación δ, y
+el tiempo sidéreo de Greenwich es GST (todo calculado una vez). En longitud
+geográfica λ el tiempo sidéreo local es GST + λ, así que:
+- MC (culmina): λ = α - GST, en todas las latitudes; IC: λ + 180°.
+- Asciende / se pone donde el ángulo horario es ∓H0, con
+  cos H0 = -tan φ · tan δ (horizonte geométrico, sin refracción):
+  λ = α ∓ H0 - GST. Solo hay solución donde |tan φ · tan δ| <= 1; más allá
+  el planeta es circumpolar o no sale.
+Las latitudes son un array de NumPy: cada línea es una sola operación
+vectorizada, sin swe.houses por celda. Una carta completa cuesta unos
+milisegundos.
+"""
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import swisseph as swe
+
+from astral_calculator import PLANETAS_INDICES, _validar_datos
+
+TIPOS_LINEA = ("MC", "IC", "ASC", "DSC")
+
+# Latitud máxima por defecto: más allá las líneas de horizonte se vuelven casi horizontales
+LATITUD_MAXIMA = 85.0
+PASO_LATITUD = 0.5
+
+# Decimales de las coordenadas (4 ≈ 11 metros)
+DECIMALES = 4
+
+
+def posiciones_ecuatoriales(jd_ut, cuerpos):
+    """Ascensión recta y declinación (grados, verdaderas de la fecha) de cada cuerpo."""
+    flags = swe.FLG_SWIEPH | swe.FLG_EQUATORIAL
+    posiciones = {}
+    for nombre in cuerpos:
+        pos = swe.calc_ut(jd_ut, PLANETAS_INDICES[nombre], flags)[0]
+        posiciones[nombre] = (pos[0], pos[1])
+    return posiciones
+
+
+def _normalizar_longitud(grados):
+    """Lleva longitudes a [-180, 180)."""
+    return (np.asarray(grados) + 180.0) % 360.0 - 180.0
+
+
+def _partir_antimeridiano(longitudes, latitudes, latitud_en=None):
+    """
+    Parte una polilínea en tramos que no cruzan ±180° ni atraviesan puntos
+    sin solución (NaN). En cada cruce se añade el punto del borde: con
+    `latitud_en(lng)` si se da (exacto), si no interpolado.
+    Devuelve una lista de arrays (n, 2) de [lng, lat].
+    """
+    validos = ~np.isnan(longitudes)
+    tramos = []
+    # Tramos continuos de puntos válidos
+    cambios = np.flatnonzero(np.diff(validos.astype(np.int8))) + 1
+    limites = np.concatenate(([0], cambios, [len(longitudes)]))
+    for desde, hasta in zip(limites[:-1], limites[1:]):
+        if not validos[desde] or hasta - desde < 2:
+            continue
+        lng = longitudes[desde:hasta]
+        lat = latitudes[desde:hasta]
+        saltos = np.flatnonzero(np.abs(np.diff(lng)) > 180.0)
+        inicio = 0
+        borde_anterior = None
+        for s in saltos.tolist():
+            # Distancia real hasta el siguiente punto, cruzando el antimeridiano
+            delta = lng[s + 1] - lng[s]
+            delta -= 360.0 * np.sign(delta)
+            borde = 180.0 if delta > 0 else -180.0
+            fraccion = (borde - lng[s]) / delta
+            lat_borde = lat[s] + fraccion * (lat[s + 1] - lat[s])
+            if latitud_en is not None:
+                lat_borde = latitud_en(borde)
+            puntos = np.column_stack((lng[inicio:s + 1], lat[inicio:s + 1]))
+            if borde_anterior is not None:
+                puntos = np.vstack((borde_anterior, puntos))
+            tramos.append(np.vstack((puntos, [borde, lat_borde])))
+            borde_anterior = np.array([[-borde, lat_borde]])
+            inicio = s + 1
+        puntos = np.column_stack((lng[inicio:], lat[inicio:]))
+        if borde_anterior is not None:
+            puntos = np.vstack((borde_anterior, puntos))
+        tramos.append(puntos)
+    return [t for t in tramos if len(t) >= 2]
+
+
+def _latitudes_planeta(latitudes, declinacion, lat_max):
+    """Rejilla de latitudes más las latitudes límite ±(90 - |δ|), donde la línea toca MC/IC."""
+    limite = 90.0 - abs(declinacion)
+    extra = [l for l in (-limite, limite) if -lat_max <= l <= lat_max]
+    if not extra:
+        return latitudes
+    return np.unique(np.concatenate((latitudes, extra)))
+
+
+def lineas_planeta(nombre, ascension_recta, declinacion, gst, latitudes, lat_max, tipos=TIPOS_LINEA):
+    """
+    Líneas de un planeta como Features de GeoJSON (MultiLineString).
+    `latitudes` es la rejilla común; las de horizonte añaden sus latitudes límite.
+    """
+    features = []
+    lng_mc = float(_normalizar_longitud(ascension_recta - gst))
+
+    for tipo in tipos:
+        if tipo in ("MC", "IC"):
+            lng = lng_mc if tipo == "MC" else float(_normalizar_longitud(lng_mc + 180.0))
+            tramos = [np.column_stack((np.full(2, lng), [-lat_max, lat_max]))]
+        else:
+            lats = _latitudes_planeta(latitudes, declinacion, lat_max)
+            coseno = -np.tan(np.radians(lats)) * np.tan(np.radians(declinacion))
+            # En las latitudes límite el redondeo puede dar 1.0000000002
+            coseno = np.where(np.abs(coseno) <= 1.0 + 1e-12, np.clip(coseno, -1.0, 1.0), np.nan)
+            h0 = np.degrees(np.arccos(coseno))
+            signo = -1.0 if tipo == "ASC" else 1.0
+            lng = _normalizar_longitud(ascension_recta + signo * h0 - gst)
+
+            def latitud_en(lng_borde):
+                # Inversa de la línea: H = GST + λ - α y tan φ = -cos H / tan δ
+                h = np.radians(gst + lng_borde - ascension_recta)
+                return float(np.degrees(np.arctan2(-np.cos(h), np.tan(np.radians(declinacion)))))
+
+            tramos = _partir_antimeridiano(lng, lats, latitud_en)
+        if not tramos:
+            continue
+        features.append({
+            "type": "Feature",
+            "properties": {"planeta": nombre, "tipo": tipo},
+            "geometry": {
+                "type": "MultiLineString",
+                "coordinates": [np.round(t, DECIMALES).tolist() for t in tramos]
+            }
+        })
+    return features
+
+
+def calcular_astrocartografia(data, cuerpos=None, tipos=None, paso=PASO_LATITUD, lat_max=LATITUD_MAXIMA):
+    """
+    Líneas de astrocartografía de un instante.
+
+    Args:
+        data: Objeto con anio, mes, dia, hora, minuto (UT)
+        cuerpos: Planetas (por defecto los diez)
+        tipos: Subconjunto de TIPOS_LINEA (por defecto todos)
+        paso: Separación (grados) de la rejilla de latitudes
+        lat_max: Las líneas se dibujan entre -lat_max y lat_max
+
+    Devuelve (propiedades de la colección, generador de Features).
+    Lanza ValueError si los parámetros no son válidos.
+    """
+    _validar_datos(SimpleNamespace(anio=data.anio, mes=data.mes, dia=data.dia,
+                                   hora=data.hora, minuto=data.minuto, lat=0.0, lng=0.0))
+    cuerpos = list(PLANETAS_INDICES) if cuerpos is None else list(cuerpos)
+    desconocidos = [c for c in cuerpos if c not in PLANETAS_INDICES]
+    if desconocidos:
+        raise ValueError(f"Cuerpos desconocidos: {', '.join(desconocidos)}")
+    tipos = TIPOS_LINEA if tipos is None else tuple(tipos)
+    desconocidos = [t for t in tipos if t not in TIPOS_LINEA]
+    if desconocidos:
+        raise ValueError(f"Tipos de línea desconocidos: {', '.join(desconocidos)}")
+    if not 0 < paso <= 10:
+        raise ValueError("El paso de latitud debe estar entre 0 y 10 grados")
+    if not 0 < lat_max < 90:
+        raise ValueError("La latitud máxima debe estar entre 0 y 90 grados")
+
+    jd_ut = swe.julday(data.anio, data.mes, data.dia, data.hora + data.minuto / 60.0)
+    gst = swe.sidtime(jd_ut) * 15.0
+    posiciones = posiciones_ecuatoriales(jd_ut, cuerpos)
+    latitudes = np.unique(np.append(np.arange(-lat_max, lat_max, paso), lat_max))
+
+    propiedades = {
+        "fecha_hora_calculo": f"{data.dia:02d}/{data.mes:02d}/{data.anio} {data.hora:02d}:{data.minuto:02d}",
+        "dia_juliano": round(jd_ut, 6),
+        "tiempo_sidereo_greenwich": round(gst, 6),
+        "posiciones_ecuatoriales": {
+            nombre: {"ascension_recta": round(a, 4), "declinacion": round(d, 4)}
+            for nombre, (a, d) in posiciones.items()
+        }
+    }
+
+    def features():
+        for nombre, (ascension_recta, declinacion) in posiciones.items():
+            yield from lineas_planeta(nombre, ascension_recta, declinacion, gst, latitudes, lat_max, tipos)
+
+    return propiedades, features()
+
+
+def astrocartografia_geojson(propiedades, features):
+    """
+    FeatureCollection de GeoJSON en trozos de bytes: la cabecera y luego una
+    Feature por trozo, para enviarla con StreamingResponse sin montarla entera.
+    """
+    yield (
+        '{"type":"FeatureCollection","properties":'
+        + json.dumps(propiedades, ensure_ascii=False, separators=(",", ":"))
+        + ',"features":['
+    ).encode("utf-8")
+    primera = True
+    for feature in features:
+        texto = json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+        yield (texto if primera else "," + texto).encode("utf-8")
+        primera = False
+    yield b"]}"
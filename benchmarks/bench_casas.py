@@ -0,0 +1,106 @@
+"""
+Micro-benchmark: asignación de casas vectorizada frente al bucle por planeta.
+
+Compara la regla original (lista de cúspides reconstruida para cada planeta
+y recorrido lineal con los casos que cruzan 0°) con casas_de_planetas, que
+asigna todos los cuerpos de todas las cartas en una sola operación.
+Antes de medir comprueba que ambas dan exactamente las mismas casas,
+incluidos cuerpos situados justo sobre una cúspide.
+
+Uso:
+    python benchmarks/bench_casas.py --cartas 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from astral_calculator import casas_de_planetas
+
+
+def determinar_casa_planeta(grados_planeta, casas_cusps):
+    """Versión por bucle (la que usaba realizar_calculo_astral)."""
+    grados_planeta = grados_planeta % 360
+    
+    cusps_list = []
+    for i in range(1, 13):
+        cusp = casas_cusps.get(f"Casa {i}", 0.0) % 360
+        cusps_list.append(cusp)
+    
+    for i in range(12):
+        cusp_actual = cusps_list[i]
+        cusp_siguiente = cusps_list[(i + 1) % 12]
+        
+        if cusp_actual <= cusp_siguiente:
+            if cusp_actual <= grados_planeta < cusp_siguiente:
+                return i + 1
+        else:
+            if grados_planeta >= cusp_actual or grados_planeta < cusp_siguiente:
+                return i + 1
+    
+    return 1
+
+
+def _cartas(n, planetas=10, semilla=1):
+    """Cúspides en orden zodiacal que empiezan en cualquier grado (muchas cruzan 0°)."""
+    aleatorio = np.random.default_rng(semilla)
+    anchos = aleatorio.uniform(10, 50, (n, 12))
+    anchos *= 360 / anchos.sum(axis=1, keepdims=True)
+    inicio = aleatorio.uniform(0, 360, (n, 1))
+    cuspides = (inicio + np.concatenate([np.zeros((n, 1)), np.cumsum(anchos, axis=1)[:, :11]], axis=1)) % 360
+    
+    # Algunas cartas con cúspides repetidas justo en la casa que cierra el círculo
+    cuspides[: n // 100, 11] = cuspides[: n // 100, 0]
+    
+    longitudes = aleatorio.uniform(0, 360, (n, planetas))
+    # Algunos cuerpos exactamente sobre una cúspide
+    longitudes[:, 0] = cuspides[:, 3]
+    longitudes[:, 1] = cuspides[:, 0]
+    return longitudes, cuspides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cartas", type=int, default=10000)
+    args = parser.parse_args()
+
+    longitudes, cuspides = _cartas(args.cartas)
+    diccionarios = [
+        {f"Casa {i + 1}": c for i, c in enumerate(fila)} for fila in cuspides.tolist()
+    ]
+    filas = longitudes.tolist()
+
+    inicio = time.perf_counter()
+    bucle = [
+        [determinar_casa_planeta(g, casas) for g in fila]
+        for fila, casas in zip(filas, diccionarios)
+    ]
+    tiempo_bucle = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorizado = casas_de_planetas(longitudes, cuspides)
+    tiempo_vectorizado = time.perf_counter() - inicio
+
+    if vectorizado.tolist() != bucle:
+        print("✗ Los resultados no coinciden")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    for fila, casas in zip(longitudes[:1000], cuspides[:1000]):
+        casas_de_planetas(fila[None, :], casas[None, :])
+    tiempo_una = (time.perf_counter() - inicio) / min(1000, args.cartas)
+
+    n = longitudes.size
+    print(f"{args.cartas} cartas, {n} cuerpos (resultados idénticos)")
+    print(f"  bucle por planeta:  {tiempo_bucle * 1e3:9.2f} ms  ({tiempo_bucle / n * 1e9:7.0f} ns/cuerpo)")
+    print(f"  vectorizado:        {tiempo_vectorizado * 1e3:9.2f} ms  ({tiempo_vectorizado / n * 1e9:7.0f} ns/cuerpo)")
+    print(f"  aceleración: x{tiempo_bucle / tiempo_vectorizado:.1f}")
+    print(f"  una carta suelta (vectorizado): {tiempo_una * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
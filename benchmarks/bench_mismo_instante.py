@@ -0,0 +1,74 @@
+"""
+Benchmark: muchas cartas del mismo instante en lugares distintos.
+
+Compara realizar_calculo_astral con la caché de planetas vacía en cada
+llamada (los diez swe.calc_ut se repiten siempre) frente a la caché ya
+caliente (solo se calculan las casas y el formato).
+
+Las peticiones de varios instantes se intercalan, como ocurre en el
+servidor: Swiss Ephemeris recuerda internamente la última posición de cada
+planeta, y con un único instante repetido esa memoria ocultaría el coste
+real de swe.calc_ut.
+
+Uso:
+    python benchmarks/bench_mismo_instante.py --lugares 2000 --instantes 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import swisseph as swe
+
+from astral_calculator import realizar_calculo_astral, cache_planetas
+
+
+def _lugares(n, instantes, semilla=42):
+    """n cartas repartidas en `instantes` minutos distintos, intercaladas."""
+    aleatorio = random.Random(semilla)
+    return [
+        SimpleNamespace(
+            nombre=f"Persona {i}", anio=2024, mes=6, dia=21 + i % instantes, hora=18, minuto=30,
+            ciudad="", lat=aleatorio.uniform(-60, 60), lng=aleatorio.uniform(-180, 180)
+        )
+        for i in range(n)
+    ]
+
+
+def _medir(registros, limpiar_cada_vez):
+    cache_planetas.limpiar()
+    inicio = time.perf_counter()
+    for data in registros:
+        if limpiar_cada_vez:
+            cache_planetas.limpiar()
+        realizar_calculo_astral(data)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lugares", type=int, default=2000, help="cartas del mismo minuto a calcular")
+    parser.add_argument("--instantes", type=int, default=4, help="minutos distintos, intercalados")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    swe.set_ephe_path("ephe")
+    registros = _lugares(args.lugares, args.instantes)
+    realizar_calculo_astral(registros[0])  # calentar imports y efemérides
+
+    sin_cache = min(_medir(registros, True) for _ in range(args.repeticiones))
+    con_cache = min(_medir(registros, False) for _ in range(args.repeticiones))
+
+    n = len(registros)
+    print(f"{n} cartas repartidas en {args.instantes} instantes")
+    print(f"  sin caché de planetas: {sin_cache * 1e3:9.1f} ms  ({sin_cache / n * 1e6:7.1f} µs/carta)")
+    print(f"  con caché de planetas: {con_cache * 1e3:9.1f} ms  ({con_cache / n * 1e6:7.1f} µs/carta)")
+    print(f"  aceleración: x{sin_cache / con_cache:.2f}")
+
+
+if __name__ == "__main__":
+    main()
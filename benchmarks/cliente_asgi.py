@@ -0,0 +1,87 @@
+"""
+Cliente ASGI mínimo, sin dependencias, para medir la API en el mismo proceso.
+
+Llama directamente a la aplicación (app(scope, receive, send)) sin sockets
+ni servidor, así que las latencias medidas son las del propio FastAPI y del
+cálculo, sin ruido de red.
+"""
+import json
+from urllib.parse import urlsplit
+
+
+class RespuestaASGI:
+    def __init__(self, estado, cabeceras, cuerpo):
+        self.estado = estado
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+
+    def json(self):
+        return json.loads(self.cuerpo)
+
+
+class ClienteASGI:
+    """
+    Args:
+        app: Aplicación ASGI (p. ej. carta_app.app)
+        cabeceras: Cabeceras que se envían en todas las peticiones (p. ej. x-api-key)
+    """
+
+    def __init__(self, app, cabeceras=None):
+        self.app = app
+        self.cabeceras = {k.lower(): v for k, v in (cabeceras or {}).items()}
+
+    async def peticion(self, metodo, url, json_cuerpo=None, cabeceras=None):
+        partes = urlsplit(url)
+        cuerpo = b"" if json_cuerpo is None else json.dumps(json_cuerpo).encode("utf-8")
+        todas = dict(self.cabeceras)
+        todas.update({k.lower(): v for k, v in (cabeceras or {}).items()})
+        if json_cuerpo is not None:
+            todas["content-type"] = "application/json"
+        todas["content-length"] = str(len(cuerpo))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": metodo.upper(),
+            "scheme": "http",
+            "path": partes.path,
+            "raw_path": partes.path.encode("latin-1"),
+            "query_string": partes.query.encode("latin-1"),
+            "root_path": "",
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in todas.items()],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80)
+        }
+
+        enviado = False
+
+        async def receive():
+            nonlocal enviado
+            if not enviado:
+                enviado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        estado = None
+        cabeceras_respuesta = {}
+        trozos = []
+
+        async def send(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                cabeceras_respuesta.update(
+                    (k.decode("latin-1"), v.decode("latin-1")) for k, v in mensaje.get("headers", [])
+                )
+            elif mensaje["type"] == "http.response.body":
+                trozos.append(mensaje.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return RespuestaASGI(estado, cabeceras_respuesta, b"".join(trozos))
+
+    async def post(self, url, json_cuerpo=None, cabeceras=None):
+        return await self.peticion("POST", url, json_cuerpo, cabeceras)
+
+    async def get(self, url, cabeceras=None):
+        return await self.peticion("GET", url, None, cabeceras)
@@ -0,0 +1,325 @@
+"""
+Suite de rendimiento: cálculo, renderizado y carga de la API.
+
+Partes:
+- micro: realizar_calculo_astral con la caché de planetas fría y caliente,
+  en latitudes polares (donde Placidus falla y se recorren los métodos de
+  respaldo) y en el camino normal.
+- render: generar_carta_astral_imagen (a archivo) y renderizar_carta_png
+  (en memoria) a varios dpi, y el renderizador SVG.
+- carga: reproduce un JSONL de peticiones grabadas contra carta_app en el
+  mismo proceso, con un cliente ASGI propio y la concurrencia indicada.
+
+Cada medida da operaciones por segundo y p50/p95/p99 en milisegundos; al
+final se informa del pico de memoria residente (RSS) del proceso.
+Los resultados se pueden guardar como línea base y comparar con ella: la
+comparación marca como regresión cualquier medida cuyo rendimiento baje o
+cuyo p95 suba más que la tolerancia, y termina con código 1.
+
+Uso:
+    python benchmarks/suite.py generar-cargas --salida cargas.jsonl --n 2000
+    python benchmarks/suite.py micro render carga --cargas cargas.jsonl --guardar base.json
+    python benchmarks/suite.py micro carga --cargas cargas.jsonl --comparar base.json --tolerancia 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import swisseph as swe
+
+from astral_calculator import realizar_calculo_astral, calcular_carta, cache_planetas
+
+PARTES = ("micro", "render", "carga")
+VERSION_LINEA_BASE = 1
+
+
+# --- Utilidades ---
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def _resumen(latencias, total_segundos):
+    """Operaciones por segundo y percentiles (ms) de una lista de latencias en segundos."""
+    return {
+        "n": len(latencias),
+        "ops_s": round(len(latencias) / total_segundos, 2) if total_segundos > 0 else None,
+        "p50_ms": round(_percentil(latencias, 50) * 1000, 4),
+        "p95_ms": round(_percentil(latencias, 95) * 1000, 4),
+        "p99_ms": round(_percentil(latencias, 99) * 1000, 4)
+    }
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso (ru_maxrss es KB en Linux y bytes en macOS)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+
+def _medir(funcion, argumentos, antes=None):
+    """Llama funcion(a) para cada a; devuelve el resumen de latencias."""
+    latencias = []
+    inicio = time.perf_counter()
+    for a in argumentos:
+        if antes is not None:
+            antes()
+        t = time.perf_counter()
+        funcion(a)
+        latencias.append(time.perf_counter() - t)
+    return _resumen(latencias, time.perf_counter() - inicio)
+
+
+def _cartas_aleatorias(n, semilla, lat_min=-60.0, lat_max=60.0):
+    aleatorio = random.Random(semilla)
+    return [
+        SimpleNamespace(
+            nombre=f"Persona {i}", anio=aleatorio.randint(1900, 2099), mes=aleatorio.randint(1, 12),
+            dia=aleatorio.randint(1, 28), hora=aleatorio.randint(0, 23), minuto=aleatorio.randint(0, 59),
+            ciudad="", lat=round(aleatorio.uniform(lat_min, lat_max), 4), lng=round(aleatorio.uniform(-180, 180), 4)
+        )
+        for i in range(n)
+    ]
+
+
+# --- Partes de la suite ---
+
+def bench_micro(n):
+    """realizar_calculo_astral: caché fría, caliente, latitudes polares."""
+    swe.set_ephe_path("ephe")
+    cartas = _cartas_aleatorias(n, semilla=1)
+    polares = _cartas_aleatorias(n, semilla=2, lat_min=67.0, lat_max=89.9)
+    resultados = {}
+
+    # Instantes distintos y caché vaciada en cada llamada: los diez planetas siempre se calculan
+    resultados["micro.frio"] = _medir(realizar_calculo_astral, cartas, antes=cache_planetas.limpiar)
+
+    # Mismas cartas con la caché ya llena: solo casas y formato
+    cache_planetas.limpiar()
+    for data in cartas:
+        realizar_calculo_astral(data)
+    resultados["micro.caliente"] = _medir(realizar_calculo_astral, cartas)
+
+    # Placidus falla por encima del círculo polar: b'P' -> 'P' -> aproximación manual
+    cache_planetas.limpiar()
+    resultados["micro.polar_respaldo"] = _medir(realizar_calculo_astral, polares, antes=cache_planetas.limpiar)
+    return resultados
+
+
+def bench_render(n, dpis):
+    """Imágenes a varios dpi: a archivo (pyplot), en memoria (PNG) y SVG."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from generador_carta_astral_visual import generar_carta_astral_imagen, renderizar_carta_png
+    from generador_carta_astral_svg import renderizar_carta_svg
+
+    swe.set_ephe_path("ephe")
+    cartas = [calcular_carta(d) for d in _cartas_aleatorias(n, semilla=3)]
+    resultados = {}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "carta.png")
+
+        def a_archivo(datos, dpi):
+            fig, _ = generar_carta_astral_imagen(datos, archivo, dpi=dpi, mostrar=False)
+            plt.close(fig)
+
+        for dpi in dpis:
+            a_archivo(cartas[0], dpi)  # calentar fuentes
+            resultados[f"render.archivo_{dpi}dpi"] = _medir(lambda d: a_archivo(d, dpi), cartas)
+
+    for dpi in dpis:
+        renderizar_carta_png(cartas[0], dpi=dpi)  # dibuja y guarda el fondo de este dpi
+        resultados[f"render.png_{dpi}dpi"] = _medir(lambda d: renderizar_carta_png(d, dpi=dpi), cartas)
+
+    resultados["render.svg"] = _medir(renderizar_carta_svg, cartas * 20)
+    return resultados
+
+
+def _leer_cargas(ruta):
+    """
+    Peticiones de un JSONL. Cada línea es un CartaAstralInput o bien
+    {"ruta": "/carta-astral/imagen?format=svg", "cuerpo": {...}}.
+    """
+    cargas = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            registro = json.loads(linea)
+            if "cuerpo" in registro:
+                cargas.append((registro.get("ruta", "/carta-astral"), registro["cuerpo"]))
+            else:
+                cargas.append(("/carta-astral", registro))
+    return cargas
+
+
+async def _reproducir(cargas, concurrencia):
+    from cliente_asgi import ClienteASGI
+    import carta_app
+
+    # Cada concurrencia empieza con las cachés vacías, para que sean comparables
+    carta_app.cache_cartas.limpiar()
+    cache_planetas.limpiar()
+
+    cabeceras = {"x-api-key": os.environ["API_KEY"]} if os.getenv("API_KEY") else {}
+    cliente = ClienteASGI(carta_app.app, cabeceras)
+    cola = asyncio.Queue()
+    for carga in cargas:
+        cola.put_nowait(carga)
+    latencias = []
+    estados = {}
+
+    async def trabajador():
+        while True:
+            try:
+                ruta, cuerpo = cola.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t = time.perf_counter()
+            respuesta = await cliente.post(ruta, cuerpo)
+            latencias.append(time.perf_counter() - t)
+            estados[respuesta.estado] = estados.get(respuesta.estado, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    resumen = _resumen(latencias, time.perf_counter() - inicio)
+    resumen["estados"] = {str(k): v for k, v in sorted(estados.items())}
+    return resumen
+
+
+def bench_carga(ruta_cargas, concurrencias):
+    """Reproduce las peticiones grabadas contra la API, una vez por concurrencia."""
+    cargas = _leer_cargas(ruta_cargas)
+    if not cargas:
+        raise ValueError(f"{ruta_cargas} no contiene peticiones")
+    resultados = {}
+    for concurrencia in concurrencias:
+        resultados[f"carga.c{concurrencia}"] = asyncio.run(_reproducir(cargas, concurrencia))
+    return resultados
+
+
+def generar_cargas(ruta, n, repetidas, semilla=7):
+    """
+    Escribe n peticiones de ejemplo; la fracción `repetidas` repite cartas ya
+    vistas (como un cliente que vuelve a pedir la suya) para ejercitar la caché.
+    """
+    aleatorio = random.Random(semilla)
+    vistas = []
+    with open(ruta, "w", encoding="utf-8") as f:
+        for i, data in enumerate(_cartas_aleatorias(n, semilla)):
+            if vistas and aleatorio.random() < repetidas:
+                registro = aleatorio.choice(vistas)
+            else:
+                registro = dict(vars(data), ciudad="Ciudad")
+                vistas.append(registro)
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+# --- Línea base ---
+
+def comparar(actual, base, tolerancia):
+    """Lista de (medida, descripción, es_regresion) entre dos ejecuciones."""
+    filas = []
+    for clave, medida in sorted(actual.items()):
+        anterior = base.get(clave)
+        if anterior is None:
+            filas.append((clave, "nueva", False))
+            continue
+        regresion = False
+        partes = []
+        if medida.get("ops_s") and anterior.get("ops_s"):
+            cambio = medida["ops_s"] / anterior["ops_s"] - 1
+            partes.append(f"ops/s {anterior['ops_s']:.1f} -> {medida['ops_s']:.1f} ({cambio:+.1%})")
+            regresion |= cambio < -tolerancia
+        if anterior.get("p95_ms"):
+            cambio = medida["p95_ms"] / anterior["p95_ms"] - 1
+            partes.append(f"p95 {anterior['p95_ms']:.3f} -> {medida['p95_ms']:.3f} ms ({cambio:+.1%})")
+            regresion |= cambio > tolerancia
+        filas.append((clave, ", ".join(partes), regresion))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("partes", nargs="+", choices=PARTES + ("generar-cargas",))
+    parser.add_argument("--salida", help="JSONL de destino de generar-cargas")
+    parser.add_argument("--n", type=int, default=500, help="cartas por medida (micro) o peticiones a generar")
+    parser.add_argument("--n-render", type=int, default=10, help="imágenes por medida de render")
+    parser.add_argument("--dpis", default="72,100,150", help="dpi de las medidas de render, separados por comas")
+    parser.add_argument("--cargas", help="JSONL de peticiones para la parte carga")
+    parser.add_argument("--concurrencias", default="1,8,32", help="concurrencias de la parte carga")
+    parser.add_argument("--repetidas", type=float, default=0.3, help="fracción de peticiones repetidas (generar-cargas)")
+    parser.add_argument("--guardar", help="guarda los resultados como línea base JSON")
+    parser.add_argument("--comparar", help="compara con una línea base JSON")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="cambio relativo admitido antes de marcar regresión")
+    args = parser.parse_args()
+
+    if "generar-cargas" in args.partes:
+        if not args.salida:
+            parser.error("generar-cargas necesita --salida")
+        generar_cargas(args.salida, args.n, args.repetidas)
+        print(f"{args.n} peticiones escritas en {args.salida}")
+        return 0
+
+    resultados = {}
+    rss = {}
+    if "micro" in args.partes:
+        resultados.update(bench_micro(args.n))
+        rss["micro"] = rss_pico_mb()
+    if "render" in args.partes:
+        resultados.update(bench_render(args.n_render, [int(d) for d in args.dpis.split(",")]))
+        rss["render"] = rss_pico_mb()
+    if "carga" in args.partes:
+        if not args.cargas:
+            parser.error("la parte carga necesita --cargas")
+        resultados.update(bench_carga(args.cargas, [int(c) for c in args.concurrencias.split(",")]))
+        rss["carga"] = rss_pico_mb()
+
+    print(f"{'medida':32} {'n':>6} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for clave, medida in resultados.items():
+        print(f"{clave:32} {medida['n']:>6} {medida['ops_s']:>10} {medida['p50_ms']:>10.3f} "
+              f"{medida['p95_ms']:>10.3f} {medida['p99_ms']:>10.3f}  {medida.get('estados', '')}")
+    # El pico es acumulado: cada parte incluye la memoria de las anteriores
+    print("RSS pico (MB) al terminar cada parte:", rss)
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": VERSION_LINEA_BASE,
+                "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "rss_pico_mb": rss,
+                "resultados": resultados
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        filas = comparar(resultados, base["resultados"], args.tolerancia)
+        print(f"\nComparación con {args.comparar} ({base.get('fecha')}), tolerancia {args.tolerancia:.0%}:")
+        for clave, descripcion, regresion in filas:
+            print(f"{'REGRESIÓN' if regresion else 'ok':10} {clave:32} {descripcion}")
+        if any(regresion for _, _, regresion in filas):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
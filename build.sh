@@ -11,6 +11,16 @@ pip install -r requirements.txt
 echo "Configurando efemérides..."
 python download_eph.py
 
+# Generar la tabla precalculada si se va a usar el motor rápido
+if [ "$MOTOR_EFEMERIDES" = "tabla" ]; then
+    echo "Generando tabla precalculada de efemérides..."
+    python tabla_efemerides.py
+fi
+
+# Generar el nomenclátor de ciudades (NOMENCLATOR_FUENTE: fichero de GeoNames)
+echo "Generando nomenclátor de ciudades..."
+python nomenclator.py --entrada "${NOMENCLATOR_FUENTE:-datos/ciudades_muestra.tsv}"
+
 # Verificar que los archivos fueron creados
 echo "Verificando archivos de efemérides..."
 ls -la ephe/ || echo "Directorio ephe no encontrado"
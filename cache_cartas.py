@@ -0,0 +1,130 @@
+import os
+from types import SimpleNamespace
+
+from astral_calculator import (calcular_carta, SISTEMA_CASAS, seleccion_de_datos, es_seleccion_completa,
+                               origen_efemerides, motor_casas)
+from carta import Carta
+from cache_lru import CacheLRU
+from cache_compartida import cache_compartida
+
+# --- Configuración (variables de entorno) ---
+# Número máximo de cartas guardadas en memoria
+CACHE_CARTAS_TAMANO = int(os.getenv("CACHE_CARTAS_TAMANO", "4096"))
+# Segundos de vida de cada carta (0 = sin caducidad)
+CACHE_CARTAS_TTL = float(os.getenv("CACHE_CARTAS_TTL", "0")) or None
+# Decimales de lat/lng que se usan en la clave (4 decimales ≈ 11 metros)
+CACHE_PRECISION_COORDENADAS = int(os.getenv("CACHE_PRECISION_COORDENADAS", "4"))
+
+# Cambiar al modificar el cálculo o el formato del resultado, para que las
+# cartas guardadas en la caché compartida (que sobrevive a los despliegues)
+# dejen de coincidir
+VERSION_CALCULO = 1
+
+cache_cartas = CacheLRU(tamano_max=CACHE_CARTAS_TAMANO, ttl=CACHE_CARTAS_TTL)
+
+
+def clave_carta(data, precision=None):
+    """
+    Clave normalizada de una carta: fecha, hora, coordenadas redondeadas
+    y sistema de casas. `nombre` y `ciudad` no forman parte de la clave,
+    así que el mismo momento y lugar comparten entrada. Las cartas con una
+    selección de campos o cuerpos llevan además la selección (como texto,
+    para que la clave siga siendo válida en JSON).
+    La clave incluye también de dónde salen las posiciones (ficheros,
+    Moshier o tabla), el motor de casas y VERSION_CALCULO: una carta de la
+    caché compartida calculada con otro motor o por otra versión no se sirve.
+    """
+    if precision is None:
+        precision = CACHE_PRECISION_COORDENADAS
+    clave = (
+        data.anio, data.mes, data.dia, data.hora, data.minuto,
+        round(data.lat, precision), round(data.lng, precision),
+        getattr(data, "sistema_casas", SISTEMA_CASAS),
+        origen_efemerides(), motor_casas().nombre, VERSION_CALCULO
+    )
+    campos, cuerpos = seleccion_de_datos(data)
+    if not es_seleccion_completa(campos, cuerpos):
+        clave += (",".join(campos), ",".join(cuerpos))
+    return clave
+
+
+def _aplicar_datos_personales(carta, data):
+    """
+    Copia de la carta con los datos propios de esta petición. Los arrays
+    (y el diccionario de a_dict) se comparten con la caché.
+    """
+    return carta.con_datos_personales(data.nombre, data.ciudad, data.lat, data.lng)
+
+
+def _buscar_en_caches(clave):
+    """Carta de la caché en memoria o, si no está, de la compartida (y la sube a memoria)."""
+    carta = cache_cartas.obtener(clave)
+    if carta is None and cache_compartida is not None:
+        # Las entradas de otra versión de Carta.a_estado se tratan como fallos
+        carta = Carta.desde_estado(cache_compartida.obtener(clave))
+        if carta is not None:
+            cache_cartas.guardar(clave, carta)
+    return carta
+
+
+def _guardar_en_caches(clave, carta):
+    cache_cartas.guardar(clave, carta)
+    if cache_compartida is not None:
+        cache_compartida.guardar(clave, carta.a_estado())
+
+
+def precargar_cache_cartas(n):
+    """
+    Carga en la caché en memoria las `n` cartas más pedidas de la caché
+    compartida (si la hay). Devuelve cuántas se han cargado.
+    """
+    if cache_compartida is None:
+        return 0
+    cartas = cache_compartida.precargar(min(n, cache_cartas.tamano_max))
+    cargadas = 0
+    # De menos a más pedida, para que las más pedidas queden como más recientes
+    for clave, estado in reversed(cartas):
+        carta = Carta.desde_estado(estado)
+        if carta is not None:
+            cache_cartas.guardar(clave, carta)
+            cargadas += 1
+    return cargadas
+
+
+def calcular_carta_con_cache(data, usar_cache=True):
+    """
+    Igual que calcular_carta (devuelve una Carta), pero reutiliza la carta de
+    una petición anterior con la misma clave normalizada: primero en la
+    caché en memoria del proceso y después en la compartida entre workers.
+    Con usar_cache=False se calcula siempre de nuevo (y no se guarda).
+    """
+    if not usar_cache:
+        return calcular_carta(data)
+    
+    clave = clave_carta(data)
+    carta = _buscar_en_caches(clave)
+    if carta is None:
+        carta = calcular_carta(data)
+        _guardar_en_caches(clave, carta)
+    
+    return _aplicar_datos_personales(carta, data)
+
+
+async def calcular_carta_con_cache_async(data, ejecutor, usar_cache=True):
+    """
+    Versión asíncrona de calcular_carta_con_cache: la caché se consulta en el
+    proceso del servidor y solo los fallos se calculan en `ejecutor`
+    (un EjecutorCalculo). Al ejecutor se le pasa un SimpleNamespace con los
+    campos de la petición, que se puede enviar a otro proceso.
+    """
+    datos = SimpleNamespace(**data.model_dump()) if hasattr(data, "model_dump") else data
+    if not usar_cache:
+        return await ejecutor.ejecutar(calcular_carta, datos)
+
+    clave = clave_carta(data)
+    carta = _buscar_en_caches(clave)
+    if carta is None:
+        carta = await ejecutor.ejecutar(calcular_carta, datos)
+        _guardar_en_caches(clave, carta)
+
+    return _aplicar_datos_personales(carta, data)
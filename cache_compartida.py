@@ -0,0 +1,265 @@
+"""
+Caché de cartas compartida entre workers y persistente, en SQLite (modo WAL).
+
+La caché en memoria (cache_cartas) es de cada proceso y se pierde al
+reiniciar. Esta es un segundo nivel en un fichero local que comparten todos
+los workers de la máquina, sin servidor externo:
+
+- En modo WAL las lecturas no esperan nunca a las escrituras: cada hilo
+  lee con su propia conexión.
+- Las peticiones no escriben: encolan la carta nueva (o el acierto, para
+  contar accesos) y un hilo por proceso las escribe por lotes, en una sola
+  transacción cada INTERVALO_ESCRITURA segundos. Así hay pocas escrituras
+  y nunca bloquean una petición; si la cola se llena, se descarta.
+- Se guarda el tamaño de cada carta; cuando el total pasa de max_bytes se
+  expulsan las menos usadas recientemente hasta quedar en el 90 %.
+- precargar() devuelve las cartas más pedidas para llenar la caché en
+  memoria al arrancar.
+
+Las claves son las de clave_carta (datos de nacimiento normalizados,
+sistema de casas, motores de efemérides y casas, versión del cálculo y, si
+la hay, selección de campos y cuerpos) y los
+valores, el estado de la carta (Carta.a_estado) en JSON.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+# --- Configuración (variables de entorno) ---
+# Fichero SQLite compartido (vacío = sin caché compartida)
+CACHE_COMPARTIDA_RUTA = os.getenv("CACHE_COMPARTIDA_RUTA", "")
+# Bytes máximos de cartas guardadas
+CACHE_COMPARTIDA_BYTES = int(os.getenv("CACHE_COMPARTIDA_BYTES", str(256 * 1024 * 1024)))
+# Cartas más pedidas que se cargan en memoria al arrancar (0 = ninguna)
+CACHE_COMPARTIDA_PRECARGA = int(os.getenv("CACHE_COMPARTIDA_PRECARGA", "0"))
+
+# Segundos entre lotes de escritura y escrituras pendientes admitidas
+INTERVALO_ESCRITURA = 0.2
+COLA_ESCRITURA_MAX = 10000
+# Tras expulsar se deja la caché en esta fracción de max_bytes
+FRACCION_TRAS_EXPULSAR = 0.9
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cartas (
+    clave TEXT PRIMARY KEY,
+    valor BLOB NOT NULL,
+    bytes INTEGER NOT NULL,
+    accesos INTEGER NOT NULL DEFAULT 1,
+    ultimo_acceso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cartas_ultimo_acceso ON cartas (ultimo_acceso);
+CREATE INDEX IF NOT EXISTS cartas_accesos ON cartas (accesos);
+"""
+
+
+def _clave_texto(clave):
+    return json.dumps(list(clave), ensure_ascii=False, separators=(",", ":"))
+
+
+def _clave_tupla(texto):
+    return tuple(json.loads(texto))
+
+
+class CacheCompartida:
+    """
+    Args:
+        ruta: Fichero SQLite (se crea si no existe)
+        max_bytes: Tamaño máximo de las cartas guardadas
+        intervalo_escritura: Segundos entre lotes de escritura
+    """
+
+    def __init__(self, ruta, max_bytes=CACHE_COMPARTIDA_BYTES, intervalo_escritura=INTERVALO_ESCRITURA):
+        if max_bytes < 1:
+            raise ValueError("El tamaño máximo de la caché compartida debe ser positivo")
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.intervalo_escritura = intervalo_escritura
+        self._local = threading.local()
+        self._cola = queue.Queue(maxsize=COLA_ESCRITURA_MAX)
+        self._lock = threading.Lock()
+        self._escritor = None
+        self._cerrada = False
+        self.aciertos = 0
+        self.fallos = 0
+        self.escrituras = 0
+        self.descartadas = 0
+        self.expulsiones = 0
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = self._conectar()
+        # auto_vacuum solo surte efecto en una base de datos nueva: así el
+        # fichero encoge tras expulsar (PRAGMA incremental_vacuum)
+        conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(_ESQUEMA)
+
+    def _conectar(self):
+        """Conexión del hilo actual (cada hilo lee con la suya)."""
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, clave):
+        """Resultado guardado para `clave`, o None."""
+        texto = _clave_texto(clave)
+        fila = self._conectar().execute("SELECT valor FROM cartas WHERE clave = ?", (texto,)).fetchone()
+        with self._lock:
+            if fila is None:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+        self._encolar(("acceso", texto))
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor):
+        """Encola `valor` para escribirlo en el siguiente lote (no bloquea)."""
+        self._encolar(("guardar", _clave_texto(clave), valor))
+
+    def _encolar(self, operacion):
+        if self._cerrada:
+            return
+        self._arrancar_escritor()
+        try:
+            self._cola.put_nowait(operacion)
+        except queue.Full:
+            with self._lock:
+                self.descartadas += 1
+
+    def _arrancar_escritor(self):
+        # Se arranca con la primera escritura: nunca antes de que uvicorn cree los workers
+        if self._escritor is None:
+            with self._lock:
+                if self._escritor is None:
+                    self._escritor = threading.Thread(target=self._escribir, name="cache-compartida", daemon=True)
+                    self._escritor.start()
+
+    def _escribir(self):
+        """Hilo escritor: junta lo encolado y lo escribe en una transacción."""
+        while True:
+            operaciones = [self._cola.get()]
+            time.sleep(self.intervalo_escritura)
+            while True:
+                try:
+                    operaciones.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = any(op is None for op in operaciones)
+            try:
+                self._escribir_lote([op for op in operaciones if op is not None])
+            except sqlite3.Error as e:
+                print(f"ERROR en la caché compartida: {e}")
+            finally:
+                for _ in operaciones:
+                    self._cola.task_done()
+            if fin:
+                return
+
+    def _escribir_lote(self, operaciones):
+        ahora = time.time()
+        nuevas = {}
+        accesos = Counter()
+        for operacion in operaciones:
+            if operacion[0] == "guardar":
+                nuevas[operacion[1]] = operacion[2]
+            else:
+                accesos[operacion[1]] += 1
+        if not nuevas and not accesos:
+            return
+
+        filas = []
+        for texto, valor in nuevas.items():
+            contenido = json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            filas.append((texto, contenido, len(contenido), ahora))
+
+        conexion = self._conectar()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.executemany(
+                "INSERT INTO cartas (clave, valor, bytes, accesos, ultimo_acceso) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, bytes = excluded.bytes, "
+                "ultimo_acceso = excluded.ultimo_acceso",
+                filas
+            )
+            conexion.executemany(
+                "UPDATE cartas SET accesos = accesos + ?, ultimo_acceso = ? WHERE clave = ?",
+                [(n, ahora, texto) for texto, n in accesos.items()]
+            )
+            expulsadas = self._expulsar(conexion) if filas else 0
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        if expulsadas:
+            conexion.execute("PRAGMA incremental_vacuum")
+        with self._lock:
+            self.escrituras += len(filas)
+            self.expulsiones += expulsadas
+
+    def _expulsar(self, conexion):
+        """Si se pasa de max_bytes, borra las menos usadas recientemente. Devuelve cuántas."""
+        total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM cartas").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        sobrante = total - int(self.max_bytes * FRACCION_TRAS_EXPULSAR)
+        borrar = []
+        for rowid, tamano in conexion.execute("SELECT rowid, bytes FROM cartas ORDER BY ultimo_acceso"):
+            borrar.append((rowid,))
+            sobrante -= tamano
+            if sobrante <= 0:
+                break
+        conexion.executemany("DELETE FROM cartas WHERE rowid = ?", borrar)
+        return len(borrar)
+
+    def precargar(self, n):
+        """Las `n` cartas más pedidas, como lista de (clave, resultado)."""
+        if n <= 0:
+            return []
+        filas = self._conectar().execute(
+            "SELECT clave, valor FROM cartas ORDER BY accesos DESC LIMIT ?", (n,)
+        ).fetchall()
+        return [(_clave_tupla(clave), json.loads(valor)) for clave, valor in filas]
+
+    def esperar_escrituras(self):
+        """Bloquea hasta que se haya escrito todo lo encolado."""
+        if self._escritor is not None:
+            self._cola.join()
+
+    def cerrar(self):
+        """Escribe lo pendiente y termina el hilo escritor."""
+        if self._escritor is not None and not self._cerrada:
+            self._cerrada = True
+            self._cola.put(None)
+            self._escritor.join()
+
+    def estadisticas(self):
+        """Entradas, bytes y contadores de la caché compartida."""
+        entradas, total = self._conectar().execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM cartas"
+        ).fetchone()
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "ruta": self.ruta,
+                "entradas": entradas,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "escrituras": self.escrituras,
+                "descartadas": self.descartadas,
+                "expulsiones": self.expulsiones,
+                "pendientes": self._cola.qsize(),
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0
+            }
+
+
+cache_compartida = CacheCompartida(CACHE_COMPARTIDA_RUTA) if CACHE_COMPARTIDA_RUTA else None
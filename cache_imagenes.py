@@ -0,0 +1,211 @@
+"""
+Caché direccionada por contenido de las imágenes de las cartas (PNG/SVG).
+
+Una imagen depende solo de la carta (Carta, ver carta.py) y de las
+opciones de renderizado, así que se identifica con el sha256 de ambos
+(normalizados). Ese hash es también el ETag de la respuesta: un cliente que
+ya tiene la imagen manda If-None-Match y recibe 304 sin cuerpo.
+
+Las imágenes se guardan en memoria con un límite en bytes; si se configura
+CACHE_IMAGENES_DIR, las que salen de memoria se escriben en ese directorio
+(con su propio límite) y se recuperan de allí antes de volver a renderizar.
+
+Para contestar 304 sin calcular siquiera la carta, se recuerda además qué
+ETag produjo cada entrada (datos de la petición + opciones).
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from cache_cartas import clave_carta
+from cache_lru import CacheLRU
+
+# --- Configuración (variables de entorno) ---
+# Bytes máximos de imágenes en memoria
+CACHE_IMAGENES_BYTES = int(os.getenv("CACHE_IMAGENES_BYTES", str(64 * 1024 * 1024)))
+# Directorio donde se vuelcan las imágenes expulsadas de memoria (vacío = sin disco)
+CACHE_IMAGENES_DIR = os.getenv("CACHE_IMAGENES_DIR", "")
+# Bytes máximos de imágenes en disco
+CACHE_IMAGENES_DISCO_BYTES = int(os.getenv("CACHE_IMAGENES_DISCO_BYTES", str(1024 * 1024 * 1024)))
+# Entradas recordadas de petición -> ETag
+CACHE_ETIQUETAS_TAMANO = int(os.getenv("CACHE_ETIQUETAS_TAMANO", "65536"))
+
+# Cambiar al modificar el dibujo, para que los ETag antiguos dejen de coincidir
+VERSION_RENDER = 3
+
+
+def etag_imagen(carta, formato, tamano, dpi):
+    """sha256 (hex) de la carta (Carta.a_estado) y las opciones de renderizado."""
+    contenido = {
+        "resultado": carta.a_estado(),
+        "formato": formato,
+        "tamano": float(tamano),
+        "dpi": int(dpi),
+        "version": VERSION_RENDER
+    }
+    normalizado = json.dumps(contenido, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+def clave_peticion_imagen(data, formato, tamano, dpi):
+    """Clave de los datos de entrada de una imagen (sin calcular la carta)."""
+    return (clave_carta(data), data.nombre, data.ciudad, data.lat, data.lng,
+            formato, float(tamano), int(dpi))
+
+
+def coincide_etag(if_none_match, etag):
+    """True si la cabecera If-None-Match incluye el ETag (se aceptan ETag débiles y '*')."""
+    if not if_none_match:
+        return False
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*":
+            return True
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato.strip('"') == etag:
+            return True
+    return False
+
+
+class CacheImagenes:
+    """
+    Imágenes por ETag, con límite de bytes en memoria y volcado opcional a disco.
+
+    Args:
+        max_bytes: Bytes máximos en memoria; al superarlos se expulsan las menos usadas
+        directorio: Directorio para las imágenes expulsadas (None = se descartan)
+        max_bytes_disco: Bytes máximos en el directorio; se borran las más antiguas
+    """
+
+    def __init__(self, max_bytes=CACHE_IMAGENES_BYTES, directorio=None, max_bytes_disco=CACHE_IMAGENES_DISCO_BYTES):
+        self.max_bytes = max_bytes
+        self.directorio = directorio or None
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria = OrderedDict()
+        self._bytes = 0
+        self._disco = OrderedDict()  # etag -> tamaño, de más antigua a más reciente
+        self._bytes_disco = 0
+        self._lock = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            self._indexar_disco()
+
+    def _indexar_disco(self):
+        """Recupera las imágenes de un arranque anterior, de más antigua a más reciente."""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if len(nombre) == 64 and os.path.isfile(ruta):
+                estado = os.stat(ruta)
+                entradas.append((estado.st_mtime, nombre, estado.st_size))
+        for _, nombre, tamano in sorted(entradas):
+            self._disco[nombre] = tamano
+            self._bytes_disco += tamano
+
+    def _ruta(self, etag):
+        return os.path.join(self.directorio, etag)
+
+    def obtener(self, etag):
+        """Bytes de la imagen, o None si no está ni en memoria ni en disco."""
+        with self._lock:
+            contenido = self._memoria.get(etag)
+            if contenido is not None:
+                self._memoria.move_to_end(etag)
+                self.aciertos_memoria += 1
+                return contenido
+            en_disco = etag in self._disco
+
+        if en_disco:
+            try:
+                with open(self._ruta(etag), "rb") as f:
+                    contenido = f.read()
+            except OSError:
+                contenido = None
+            if contenido:
+                with self._lock:
+                    self.aciertos_disco += 1
+                self.guardar(etag, contenido)
+                return contenido
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, etag, contenido):
+        """Guarda la imagen en memoria; las que no caben pasan a disco (si hay directorio)."""
+        if len(contenido) > self.max_bytes:
+            self._volcar([(etag, contenido)])
+            return
+        with self._lock:
+            anterior = self._memoria.pop(etag, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._memoria[etag] = contenido
+            self._bytes += len(contenido)
+            expulsadas = []
+            while self._bytes > self.max_bytes:
+                clave, valor = self._memoria.popitem(last=False)
+                self._bytes -= len(valor)
+                self.expulsiones += 1
+                expulsadas.append((clave, valor))
+        self._volcar(expulsadas)
+
+    def _volcar(self, imagenes):
+        """Escribe en disco las imágenes expulsadas y respeta el límite del directorio."""
+        if not self.directorio:
+            return
+        for etag, contenido in imagenes:
+            with self._lock:
+                if etag in self._disco:
+                    self._disco.move_to_end(etag)
+                    continue
+            temporal = self._ruta(etag) + ".tmp"
+            try:
+                with open(temporal, "wb") as f:
+                    f.write(contenido)
+                os.replace(temporal, self._ruta(etag))
+            except OSError as e:
+                print(f"ERROR al guardar la imagen {etag} en disco: {e}")
+                continue
+            with self._lock:
+                self._disco[etag] = len(contenido)
+                self._bytes_disco += len(contenido)
+                borrar = []
+                while self._bytes_disco > self.max_bytes_disco and self._disco:
+                    clave, tamano = self._disco.popitem(last=False)
+                    self._bytes_disco -= tamano
+                    borrar.append(clave)
+            for clave in borrar:
+                try:
+                    os.remove(self._ruta(clave))
+                except OSError:
+                    pass
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._memoria),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "entradas_disco": len(self._disco),
+                "bytes_disco": self._bytes_disco,
+                "directorio": self.directorio,
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones
+            }
+
+
+cache_imagenes = CacheImagenes(CACHE_IMAGENES_BYTES, CACHE_IMAGENES_DIR, CACHE_IMAGENES_DISCO_BYTES)
+
+# Petición (clave_peticion_imagen) -> ETag, para contestar 304 antes de calcular
+etiquetas_imagenes = CacheLRU(tamano_max=CACHE_ETIQUETAS_TAMANO)
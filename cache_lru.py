@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Caché en memoria con política LRU, tamaño máximo y caducidad opcional (TTL).
+    Es segura entre hilos y lleva contadores de aciertos, fallos y expulsiones.
+    
+    Args:
+        tamano_max: Número máximo de entradas; al superarlo se expulsa la menos usada
+        ttl: Segundos de vida de cada entrada (None = no caduca)
+    """
+    
+    def __init__(self, tamano_max=1024, ttl=None):
+        if tamano_max < 1:
+            raise ValueError("El tamaño máximo de la caché debe ser al menos 1")
+        self.tamano_max = tamano_max
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.caducadas = 0
+    
+    def obtener(self, clave, defecto=None):
+        """
+        Devuelve el valor guardado para `clave` (y lo marca como reciente),
+        o `defecto` si no existe o ha caducado.
+        """
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return defecto
+            
+            expira, valor = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                self.caducadas += 1
+                self.fallos += 1
+                return defecto
+            
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+    
+    def guardar(self, clave, valor):
+        """
+        Guarda `valor` para `clave`, expulsando las entradas menos usadas
+        si se supera el tamaño máximo.
+        """
+        expira = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_max:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+    
+    def limpiar(self):
+        """Vacía la caché (los contadores se conservan)."""
+        with self._lock:
+            self._datos.clear()
+    
+    def estadisticas(self):
+        """Devuelve un diccionario con el tamaño y los contadores de la caché."""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "tamano_max": self.tamano_max,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "caducadas": self.caducadas,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0
+            }
+    
+    def __len__(self):
+        return len(self._datos)
+    
+    def __contains__(self, clave):
+        return clave in self._datos
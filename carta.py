@@ -0,0 +1,258 @@
+"""
+Resultado de una carta astral como objeto compacto (Carta).
+
+El resultado de siempre son diccionarios anidados: uno por cuerpo y por
+cúspide, con el nombre del signo repetido y los grados ya redondeados a 2
+decimales. El renderizador y los aspectos volvían a leer esos diccionarios
+y trabajaban con los grados redondeados. Una Carta guarda lo mismo en unos
+pocos arrays float64 (longitudes, velocidades y cúspides) y los índices de
+signo y casa, con __slots__:
+
+- astral_calculator.calcular_carta() la construye; la caché de cartas, el
+  ejecutor de cálculo, el renderizador, los aspectos y el formato en
+  columnas la usan tal cual, con toda la precisión.
+- a_dict() da el formato de la API (el mismo que realizar_calculo_astral)
+  solo al responder. Se construye una vez por carta y las copias con otros
+  datos personales (con_datos_personales) lo reutilizan.
+- a_estado() y Carta.desde_estado() la pasan a JSON y de vuelta sin perder
+  precisión (caché compartida y ETag de las imágenes).
+"""
+import time
+
+import numpy as np
+
+from metricas import DURACION_ETAPAS
+
+# Signos zodiacales en orden, empezando por Aries (0°)
+SIGNOS = ["Aries", "Tauro", "Géminis", "Cáncer", "Leo", "Virgo",
+          "Libra", "Escorpio", "Sagitario", "Capricornio", "Acuario", "Piscis"]
+
+NOMBRES_CASAS = [
+    "Casa 1", "Casa 2", "Casa 3", "Casa 4", "Casa 5", "Casa 6",
+    "Casa 7", "Casa 8", "Casa 9", "Casa 10", "Casa 11", "Casa 12"
+]
+
+# Versión de a_estado(); un estado de otra versión no se puede leer
+VERSION_ESTADO = 1
+
+# Atributos que se guardan en a_estado() y al serializar con pickle
+_ATRIBUTOS = ("nombre", "ciudad", "lat", "lng", "fecha_hora_calculo", "jd_ut", "campos", "cuerpos",
+              "longitudes", "velocidades", "casas_cuerpos", "cuspides", "ascendente", "medio_cielo",
+              "sistema_casas", "advertencias")
+
+
+def indices_signos(grados):
+    """Índice en SIGNOS de cada longitud de un array."""
+    return (np.asarray(grados, dtype=np.float64) % 360 // 30).astype(np.int64)
+
+
+def _formatear(grados, signo, en_signo):
+    # Mismo redondeo que astral_calculator.formatear_signo
+    return {"grados_totales": round(grados, 2), "signo": SIGNOS[signo], "grados_en_signo": round(en_signo, 2)}
+
+
+def _formatear_array(grados):
+    grados = np.asarray(grados, dtype=np.float64)
+    normalizados = grados % 360
+    return [_formatear(g, s, e) for g, s, e in zip(grados.tolist(), (normalizados // 30).astype(np.int64).tolist(),
+                                                  (normalizados % 30).tolist())]
+
+
+class Carta:
+    """
+    Args:
+        nombre, ciudad, lat, lng: Datos personales de la petición
+        fecha_hora_calculo: "DD/MM/AAAA HH:MM"
+        jd_ut: Día juliano (UT)
+        campos: Partes pedidas (ver astral_calculator.CAMPOS)
+        cuerpos: Nombres de los cuerpos calculados, en el orden de los arrays
+        longitudes, velocidades: Arrays (len(cuerpos),) en grados y °/día
+        casas_cuerpos: Array de casas (1-12) de cada cuerpo, o None sin casas
+        cuspides: Array (12,) de las cúspides de las casas 1 a 12, o None
+        ascendente, medio_cielo: Grados, o None si no se calcularon las casas
+        sistema_casas: Código del sistema de casas, o None
+        advertencias: Lista de mensajes
+
+    Los arrays se comparten entre copias y con la caché: no deben modificarse.
+    """
+    __slots__ = _ATRIBUTOS + ("_origen", "_formato")
+
+    def __init__(self, nombre, ciudad, lat, lng, fecha_hora_calculo, jd_ut, campos, cuerpos,
+                 longitudes, velocidades, casas_cuerpos=None, cuspides=None, ascendente=None,
+                 medio_cielo=None, sistema_casas=None, advertencias=None):
+        self.nombre = nombre
+        self.ciudad = ciudad
+        self.lat = lat
+        self.lng = lng
+        self.fecha_hora_calculo = fecha_hora_calculo
+        self.jd_ut = jd_ut
+        self.campos = tuple(campos)
+        self.cuerpos = tuple(cuerpos)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.velocidades = np.asarray(velocidades, dtype=np.float64)
+        self.casas_cuerpos = None if casas_cuerpos is None else np.asarray(casas_cuerpos, dtype=np.int64)
+        self.cuspides = None if cuspides is None else np.asarray(cuspides, dtype=np.float64)
+        self.ascendente = ascendente
+        self.medio_cielo = medio_cielo
+        self.sistema_casas = sistema_casas
+        self.advertencias = list(advertencias or [])
+        self._origen = None
+        self._formato = None
+
+    # --- Datos derivados ---
+
+    @property
+    def signos_cuerpos(self):
+        """Índice en SIGNOS del signo de cada cuerpo."""
+        return indices_signos(self.longitudes)
+
+    @property
+    def retrogrados(self):
+        """Array de booleanos: cuerpos con velocidad negativa."""
+        return self.velocidades < 0
+
+    def longitudes_por_cuerpo(self):
+        """{cuerpo: longitud} con toda la precisión."""
+        return dict(zip(self.cuerpos, self.longitudes.tolist()))
+
+    # --- Copias ---
+
+    def con_datos_personales(self, nombre, ciudad, lat, lng):
+        """
+        Copia con otros datos personales que comparte los arrays y el
+        diccionario de a_dict() con esta carta (la de la caché).
+        """
+        copia = Carta.__new__(Carta)
+        for atributo in _ATRIBUTOS:
+            setattr(copia, atributo, getattr(self, atributo))
+        copia.nombre = nombre
+        copia.ciudad = ciudad
+        copia.lat = lat
+        copia.lng = lng
+        copia._origen = self if self._origen is None else self._origen
+        copia._formato = None
+        return copia
+
+    def __getstate__(self):
+        # Sin la carta de origen ni el diccionario ya formateado: al ejecutor
+        # o al pool de renderizado solo viajan los arrays
+        return {atributo: getattr(self, atributo) for atributo in _ATRIBUTOS}
+
+    def __setstate__(self, estado):
+        for atributo, valor in estado.items():
+            setattr(self, atributo, valor)
+        self._origen = None
+        self._formato = None
+
+    # --- Formato de la API ---
+
+    def _formateado(self):
+        if self._formato is None:
+            inicio = time.perf_counter()
+            self._formato = self._construir_dict()
+            DURACION_ETAPAS.observar(time.perf_counter() - inicio, etapa="formato")
+        return self._formato
+
+    def _construir_dict(self):
+        resultado = {
+            "nombre": self.nombre,
+            "fecha_hora_calculo": self.fecha_hora_calculo,
+            "ciudad": self.ciudad,
+            "coordenadas": {"lat": self.lat, "lng": self.lng}
+        }
+        if "ascendente" in self.campos:
+            resultado["ascendente"] = {} if self.ascendente is None else _formatear_array([self.ascendente])[0]
+        if "medio_cielo" in self.campos:
+            resultado["medio_cielo"] = {} if self.medio_cielo is None else _formatear_array([self.medio_cielo])[0]
+        if "planetas" in self.campos:
+            posiciones = dict(zip(self.cuerpos, _formatear_array(self.longitudes)))
+            if self.casas_cuerpos is not None:
+                for posicion, casa in zip(posiciones.values(), self.casas_cuerpos.tolist()):
+                    posicion["casa"] = casa
+            resultado["posiciones_planetarias"] = posiciones
+        if "casas" in self.campos and self.cuspides is not None:
+            resultado["casas_astrologicas"] = dict(zip(NOMBRES_CASAS, _formatear_array(self.cuspides)))
+        if self.sistema_casas is not None:
+            resultado["sistema_casas"] = self.sistema_casas
+        resultado["dia_juliano"] = round(self.jd_ut, 2)
+        if self.advertencias:
+            resultado["advertencias"] = self.advertencias
+        return resultado
+
+    def a_dict(self):
+        """
+        Resultado en el formato de la API (el de realizar_calculo_astral).
+        Devuelve un diccionario nuevo, pero los diccionarios internos son
+        compartidos y no deben modificarse.
+        """
+        if self._origen is None:
+            return dict(self._formateado())
+        resultado = dict(self._origen._formateado())
+        resultado["nombre"] = self.nombre
+        resultado["ciudad"] = self.ciudad
+        resultado["coordenadas"] = {"lat": self.lat, "lng": self.lng}
+        return resultado
+
+    # --- Estado en JSON (sin pérdida de precisión) ---
+
+    def a_estado(self):
+        """Diccionario JSON con todos los datos; se lee con Carta.desde_estado."""
+        estado = {"version": VERSION_ESTADO}
+        for atributo in _ATRIBUTOS:
+            valor = getattr(self, atributo)
+            if isinstance(valor, np.ndarray):
+                valor = valor.tolist()
+            elif isinstance(valor, tuple):
+                valor = list(valor)
+            estado[atributo] = valor
+        return estado
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Carta de un diccionario de a_estado(), o None si es de otra versión."""
+        if not isinstance(estado, dict) or estado.get("version") != VERSION_ESTADO:
+            return None
+        return cls(**{atributo: estado[atributo] for atributo in _ATRIBUTOS})
+
+    @classmethod
+    def desde_resultado(cls, resultado):
+        """
+        Carta a partir de un resultado en el formato de la API (con los grados
+        redondeados). Solo para quien aún tiene el diccionario, como el
+        ejemplo del generador visual; las velocidades quedan en 0.
+        """
+        posiciones = resultado.get("posiciones_planetarias", {})
+        cuerpos = list(posiciones)
+        casas = resultado.get("casas_astrologicas")
+        casas_cuerpos = None
+        if cuerpos and all("casa" in posiciones[c] for c in cuerpos):
+            casas_cuerpos = [posiciones[c]["casa"] for c in cuerpos]
+        coordenadas = resultado.get("coordenadas", {})
+        campos = [c for c, clave in (("planetas", "posiciones_planetarias"), ("ascendente", "ascendente"),
+                                     ("medio_cielo", "medio_cielo"), ("casas", "casas_astrologicas"))
+                  if clave in resultado]
+        return cls(
+            nombre=resultado.get("nombre"),
+            ciudad=resultado.get("ciudad", ""),
+            lat=coordenadas.get("lat"),
+            lng=coordenadas.get("lng"),
+            fecha_hora_calculo=resultado.get("fecha_hora_calculo", ""),
+            jd_ut=resultado.get("dia_juliano"),
+            campos=campos,
+            cuerpos=cuerpos,
+            longitudes=[posiciones[c]["grados_totales"] for c in cuerpos],
+            velocidades=np.zeros(len(cuerpos)),
+            casas_cuerpos=casas_cuerpos,
+            # Las cúspides que falten quedan en NaN y no se dibujan
+            cuspides=None if casas is None else [casas[n]["grados_totales"] if n in casas else np.nan
+                                                 for n in NOMBRES_CASAS],
+            ascendente=(resultado.get("ascendente") or {}).get("grados_totales"),
+            medio_cielo=(resultado.get("medio_cielo") or {}).get("grados_totales"),
+            sistema_casas=resultado.get("sistema_casas"),
+            advertencias=resultado.get("advertencias")
+        )
+
+
+def como_carta(datos_carta):
+    """La misma Carta, o una construida con Carta.desde_resultado si es un diccionario."""
+    return datos_carta if isinstance(datos_carta, Carta) else Carta.desde_resultado(datos_carta)
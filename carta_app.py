@@ -1,12 +1,35 @@
 # --- START OF FILE carta_app.py ---
 
 # ======> PASO 1: Importa lo necesario de FastAPI y `os` para leer variables de entorno <======
-from fastapi import FastAPI, HTTPException, Depends, Header
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse, JSONResponse, FileResponse
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Dict
+from datetime import datetime
 import swisseph as swe
 import os
+import time
 
-from astral_calculator import realizar_calculo_astral
+from astral_calculator import (realizar_calculo_astral_lote, cache_planetas, configurar_motor_efemerides,
+                               motor_efemerides, motor_casas, SISTEMA_CASAS)
+from cache_cartas import calcular_carta_con_cache, calcular_carta_con_cache_async, cache_cartas, precargar_cache_cartas
+from cache_compartida import cache_compartida, CACHE_COMPARTIDA_PRECARGA
+from ejecutor_calculo import EjecutorCalculo, ColaCalculoLlena
+from transitos import preparar_serie, transitos_ndjson, transitos_codificados
+from formatos_compactos import (elegir_formato, codificar, carta_en_columnas, lote_en_columnas,
+                                FormatoNoDisponible, TIPOS_MEDIO)
+from eventos import buscar_eventos
+from relocalizacion import calcular_relocalizacion, rejilla_puntos
+from nomenclator import cargar_nomenclator
+from download_eph import cargar_manifiesto, verificar_efemerides
+from astrocartografia import calcular_astrocartografia, astrocartografia_geojson, PASO_LATITUD, LATITUD_MAXIMA
+from aspectos import aspectos_de_carta, aspectos_sinastria, ranking_compatibilidad, longitudes_planetarias
+from cache_imagenes import cache_imagenes, etiquetas_imagenes, etag_imagen, clave_peticion_imagen, coincide_etag
+from trabajadores_render import pool_render, ColaRenderLlena, TiempoRenderAgotado, DURACION_RENDER
+from trabajos_animacion import GestorAnimaciones, ColaAnimacionesLlena
+from animacion_transitos import FORMATOS_ANIMACION
+import metricas
+from generador_carta_astral_svg import renderizar_carta_svg, ANCHO as ANCHO_SVG, ALTO as ALTO_SVG
 
 app = FastAPI()
 
@@ -16,9 +39,104 @@ EPH_PATH = "ephe"
 swe.set_ephe_path(EPH_PATH)
 # ... etc ...
 
+# Un fichero de efemérides vacío o que swisseph no puede usar hace que todo se
+# calcule con Moshier sin avisar: se comprueba al arrancar. Con
+# EFEMERIDES_ESTRICTO=1 la API no arranca si falta alguno o no es válido.
+EFEMERIDES_ESTRICTO = os.getenv("EFEMERIDES_ESTRICTO", "0") == "1"
+errores_efemerides = verificar_efemerides(cargar_manifiesto(), EPH_PATH)
+if errores_efemerides:
+    mensaje = "Efemérides no válidas en '{}': {}".format(EPH_PATH, "; ".join(errores_efemerides.values()))
+    if EFEMERIDES_ESTRICTO:
+        raise RuntimeError(mensaje)
+    print(f"ADVERTENCIA: {mensaje}. Los cálculos usarán Moshier; ejecute `python download_eph.py`.")
+
+# Motor de efemérides: "swisseph" (por defecto) o "tabla" (tabla precalculada
+# 1900-2100, generada con `python tabla_efemerides.py`)
+MOTOR_EFEMERIDES = os.getenv("MOTOR_EFEMERIDES", "swisseph")
+configurar_motor_efemerides(MOTOR_EFEMERIDES, os.getenv("TABLA_EFEMERIDES"))
+
+# El motor de casas se elige al importar astral_calculator (MOTOR_CASAS fuerza
+# uno: swisseph, swisseph_texto o aproximado); /health indica cuál se usa
+
+# Ejecutor de los cálculos de /carta-astral: CALCULO_MODO = "hilos" o "procesos"
+# (cada proceso configura swisseph y el motor una vez), CALCULO_TRABAJADORES
+# y CALCULO_COLA_MAX fijan la concurrencia y la espera admitida
+ejecutor_calculo = EjecutorCalculo(ruta_ephe=EPH_PATH, motor=MOTOR_EFEMERIDES,
+                                   ruta_tabla=os.getenv("TABLA_EFEMERIDES"))
+
+# Animaciones de tránsitos en segundo plano: ANIMACION_TRABAJADORES procesos
+# (configurados como los del ejecutor), ANIMACION_COLA_MAX trabajos en espera
+# y ficheros en ANIMACIONES_DIR, con el estado de los trabajos en una tabla
+# SQLite en ese directorio que comparten todos los workers de la máquina
+gestor_animaciones = GestorAnimaciones(ruta_ephe=EPH_PATH, motor=MOTOR_EFEMERIDES,
+                                       ruta_tabla=os.getenv("TABLA_EFEMERIDES"))
+
+# Caché de cartas compartida entre workers (CACHE_COMPARTIDA_RUTA): al
+# arrancar se cargan en memoria las CACHE_COMPARTIDA_PRECARGA más pedidas
+if cache_compartida is not None and CACHE_COMPARTIDA_PRECARGA > 0:
+    print(f"Caché compartida: {precargar_cache_cartas(CACHE_COMPARTIDA_PRECARGA)} cartas precargadas")
+
+# --- Métricas (GET /metrics, formato Prometheus) ---
+DURACION_PETICIONES = metricas.histograma(
+    "http_peticion_segundos",
+    "Duración de cada petición HTTP hasta enviar las cabeceras de la respuesta",
+    ("metodo", "ruta", "estado")
+)
+
+def _estado_colas():
+    render = pool_render.estadisticas()
+    calculo = ejecutor_calculo.estadisticas()
+    animacion = gestor_animaciones.estadisticas()
+    return {
+        ("render", "en_curso"): render["en_curso"], ("render", "en_cola"): render["en_cola"],
+        ("calculo", "en_curso"): calculo["en_curso"], ("calculo", "en_cola"): calculo["en_cola"],
+        ("animacion", "en_curso"): animacion["en_curso"], ("animacion", "en_cola"): animacion["en_cola"]
+    }
+
+metricas.medidor("carta_cola_trabajos", "Trabajos en curso y en cola de cada pool", _estado_colas, ("pool", "estado"))
+metricas.medidor(
+    "carta_cache_entradas", "Entradas de cada caché",
+    lambda: {("cartas",): len(cache_cartas), ("planetas",): len(cache_planetas),
+             ("imagenes",): cache_imagenes.estadisticas()["entradas"]},
+    ("cache",)
+)
+
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    inicio = time.perf_counter()
+    respuesta = await call_next(request)
+    # Se usa la plantilla de la ruta ("/carta-astral"), no la URL, para acotar las series
+    ruta = request.scope.get("route")
+    DURACION_PETICIONES.observar(
+        time.perf_counter() - inicio,
+        metodo=request.method, ruta=ruta.path if ruta else "desconocida", estado=respuesta.status_code
+    )
+    return respuesta
+
 # ======> PASO 2: Leer la clave secreta desde las variables de entorno <======
 API_KEY_SECRET = os.getenv("API_KEY")
 
+# Máximo de registros aceptados en una sola petición por lotes
+LOTE_MAX_REGISTROS = int(os.getenv("LOTE_MAX_REGISTROS", "10000"))
+
+# Máximo de filas de una serie de tránsitos
+TRANSITOS_MAX_FILAS = int(os.getenv("TRANSITOS_MAX_FILAS", "2000000"))
+
+# Máximo de días de un rango de búsqueda de eventos
+EVENTOS_MAX_DIAS = int(os.getenv("EVENTOS_MAX_DIAS", "3660"))
+
+# Máximo de lugares de un mapa de relocalización (1° x 1° en todo el mundo son ~65k)
+RELOCALIZACION_MAX_PUNTOS = int(os.getenv("RELOCALIZACION_MAX_PUNTOS", "100000"))
+
+# Límites de las imágenes: resolución (dpi) y píxeles totales (ancho x alto)
+IMAGEN_DPI_MIN = int(os.getenv("IMAGEN_DPI_MIN", "50"))
+IMAGEN_DPI_MAX = int(os.getenv("IMAGEN_DPI_MAX", "300"))
+IMAGEN_MAX_PIXELES = int(os.getenv("IMAGEN_MAX_PIXELES", "16000000"))
+
+# Límites de las animaciones de tránsitos: fotogramas y píxeles de cada fotograma
+ANIMACION_MAX_FOTOGRAMAS = int(os.getenv("ANIMACION_MAX_FOTOGRAMAS", "2000"))
+ANIMACION_MAX_PIXELES = int(os.getenv("ANIMACION_MAX_PIXELES", "1000000"))
+
 # ======> PASO 3: Crear la función "guardián" (Dependencia) <======
 async def get_api_key(x_api_key: str = Header(None)):
     """
@@ -45,8 +163,125 @@ class CartaAstralInput(BaseModel):
     hora: int
     minuto: int
     ciudad: str
+    # Código de Swiss Ephemeris: P (Placidus), K (Koch), W (signos enteros), E (casas iguales)
+    sistema_casas: str = SISTEMA_CASAS
+    # Si faltan, se toman del nomenclátor a partir de `ciudad` ("Mérida, VE" para elegir país)
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    # Solo se calcula lo pedido: campos de CAMPOS y cuerpos de CUERPOS
+    # (los diez planetas y Nodo_Norte, Nodo_Sur, Quirón, Lilith). Sin ellos, la carta completa.
+    campos: Optional[List[str]] = None
+    cuerpos: Optional[List[str]] = None
+
+    @model_validator(mode="after")
+    def completar_coordenadas(self):
+        return completar_coordenadas(self)
+
+def completar_coordenadas(data):
+    """
+    Rellena lat y lng de `data` con el nomenclátor si faltan las dos.
+    Lanza un ValueError si no se puede.
+    """
+    if data.lat is not None and data.lng is not None:
+        return data
+    if data.lat is not None or data.lng is not None:
+        raise ValueError("Indique lat y lng juntas, o ninguna para buscar la ciudad")
+    try:
+        encontrada = cargar_nomenclator().resolver(data.ciudad)
+    except FileNotFoundError:
+        raise ValueError("Nomenclátor no disponible: indique lat y lng")
+    if encontrada is None:
+        raise ValueError(f"Ciudad desconocida: {data.ciudad} (indique lat y lng)")
+    data.lat, data.lng = encontrada["lat"], encontrada["lng"]
+    return data
+
+class RegistroLoteInput(CartaAstralInput):
+    # En un lote la ciudad se busca al calcular: un registro sin coordenadas
+    # lleva su propio "error" en lugar de rechazar toda la petición
+    @model_validator(mode="after")
+    def completar_coordenadas(self):
+        return self
+
+class CartaAstralLoteInput(BaseModel):
+    registros: List[RegistroLoteInput]
+
+class TransitosInput(BaseModel):
+    inicio: datetime
+    fin: datetime
+    paso: str = "1d"
+    cuerpos: Optional[List[str]] = None
+
+class AnimacionTransitosInput(BaseModel):
+    carta: CartaAstralInput
+    inicio: datetime
+    fin: datetime
+    paso: str = "1d"
+    cuerpos: Optional[List[str]] = None
+    # gif, apng o webm (este solo si el servidor tiene ffmpeg)
+    formato: str = "gif"
+    fps: int = 10
+    # Lado en pulgadas; el lado en píxeles es tamano * dpi
+    tamano: float = 6.0
+    dpi: int = 100
+
+class SinastriaInput(BaseModel):
+    carta_a: CartaAstralInput
+    carta_b: CartaAstralInput
+    orbes: Optional[Dict[str, float]] = None
+
+class PerfilLongitudes(BaseModel):
+    id: str
+    # Longitudes de los diez planetas, en el orden Sol, Luna, ..., Plutón
+    longitudes: List[float]
+
+class RankingCompatibilidadInput(BaseModel):
+    referencia: CartaAstralInput
+    perfiles: List[PerfilLongitudes]
+    limite: int = 50
+    orbes: Optional[Dict[str, float]] = None
+
+class EventosInput(BaseModel):
+    inicio: datetime
+    fin: datetime
+    cuerpos: Optional[List[str]] = None
+    tipos: Optional[List[str]] = None
+    aspectos: Optional[List[str]] = None
+
+class RejillaInput(BaseModel):
+    lat_min: float = -60.0
+    lat_max: float = 60.0
+    lng_min: float = -180.0
+    lng_max: float = 180.0
+    paso: float = 1.0
+
+class LugarInput(BaseModel):
     lat: float
     lng: float
+    ciudad: Optional[str] = None
+
+class RelocalizacionInput(BaseModel):
+    anio: int
+    mes: int
+    dia: int
+    hora: int
+    minuto: int
+    # Una rejilla regular o una lista de lugares (no ambas)
+    rejilla: Optional[RejillaInput] = None
+    lugares: Optional[List[LugarInput]] = None
+    incluir_casas: bool = True
+    # Mismo sistema de casas que en /carta-astral: P, K, W o E
+    sistema_casas: str = SISTEMA_CASAS
+
+class AstrocartografiaInput(BaseModel):
+    anio: int
+    mes: int
+    dia: int
+    hora: int
+    minuto: int
+    cuerpos: Optional[List[str]] = None
+    tipos: Optional[List[str]] = None  # MC, IC, ASC, DSC
+    paso: float = PASO_LATITUD
+    lat_max: float = LATITUD_MAXIMA
 
 @app.get("/")
 def read_root():
@@ -56,25 +291,414 @@ def read_root():
 @app.get("/health")
 def health_check():
     # ... (esto no cambia) ...
-    return {"status": "healthy"}
+    return {"status": "healthy", "efemerides_validas": not errores_efemerides,
+            "errores_efemerides": list(errores_efemerides.values()),
+            "motor_efemerides": motor_efemerides(), "motor_casas": motor_casas().describir()}
 
 
+def _formato_pedido(formato, accept):
+    """Formato de respuesta (json, columnas o msgpack) o HTTPException 400/406."""
+    try:
+        return elegir_formato(formato, accept)
+    except FormatoNoDisponible as fn:
+        raise HTTPException(status_code=406, detail=str(fn))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+def _respuesta_compacta(contenido, formato):
+    # Vary: el mismo recurso cambia de formato según la cabecera Accept
+    return Response(content=codificar(contenido, formato), media_type=TIPOS_MEDIO[formato],
+                    headers={"Vary": "Accept"})
+
 # ======> PASO 4: Proteger el endpoint importante <======
 # Añadimos `dependencies=[Depends(get_api_key)]` para activar el guardián.
 @app.post("/carta-astral", dependencies=[Depends(get_api_key)])
-def calcular_carta_astral_endpoint(data: CartaAstralInput):
+async def calcular_carta_astral_endpoint(data: CartaAstralInput, cache: bool = True, aspectos: bool = False,
+                                         formato: Optional[str] = Query(None, alias="format"),
+                                         accept: Optional[str] = Header(None)):
     """
     Este endpoint AHORA está protegido. Solo se ejecutará si la clave de API es correcta.
+    Con `?cache=false` se ignora la caché de resultados y se recalcula la carta.
+    Con `?aspectos=true` se añaden los aspectos entre los cuerpos de la carta.
+    Con `?format=columnas` o `?format=msgpack` (o Accept: application/x-msgpack)
+    la carta se devuelve en columnas, en JSON o MessagePack.
+    El cálculo corre en el ejecutor dedicado (ver CALCULO_MODO), no en el bucle de eventos.
     """
+    formato = _formato_pedido(formato, accept)
     try:
-        resultado_calculado = realizar_calculo_astral(data)
+        carta = await calcular_carta_con_cache_async(data, ejecutor_calculo, usar_cache=cache)
+        extra = {"aspectos": aspectos_de_carta(carta)} if aspectos else {}
+        if formato != "json":
+            return _respuesta_compacta(carta_en_columnas(carta, extra), formato)
+        # El diccionario de la API solo se construye aquí, al responder
+        resultado_calculado = carta.a_dict()
+        resultado_calculado.update(extra)
         return resultado_calculado
+    except ColaCalculoLlena as cl:
+        raise HTTPException(status_code=503, detail=str(cl), headers={"Retry-After": str(cl.reintentar_en)})
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         print(f"ERROR en el motor de cálculo: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno al calcular la carta astral: {str(e)}")
 
+TIPOS_IMAGEN = {"png": "image/png", "svg": "image/svg+xml"}
+
+def _respuesta_imagen(contenido, formato, etag):
+    # no-cache: el cliente guarda la imagen pero revalida con If-None-Match
+    cabeceras = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if contenido is None:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=contenido, media_type=TIPOS_IMAGEN[formato], headers=cabeceras)
+
+@app.post("/carta-astral/imagen", dependencies=[Depends(get_api_key)])
+def imagen_carta_astral_endpoint(data: CartaAstralInput, dpi: int = 100, tamano: float = 12.0, cache: bool = True,
+                                 formato: str = Query("png", alias="format"),
+                                 if_none_match: Optional[str] = Header(None)):
+    """
+    Calcula la carta y devuelve la rueda zodiacal como PNG, generado en memoria.
+    `tamano` es el lado de la imagen en pulgadas; el lado en píxeles es tamano * dpi.
+    Con `?format=svg` se devuelve SVG (sin matplotlib, mucho más rápido); en ese
+    caso tamano y dpi solo fijan el ancho en píxeles declarado en el SVG.
+    La respuesta lleva ETag; con If-None-Match se contesta 304 si no ha cambiado.
+    Con `?cache=false` se recalcula y se vuelve a renderizar siempre.
+    """
+    if formato not in TIPOS_IMAGEN:
+        raise HTTPException(status_code=400, detail="format debe ser 'png' o 'svg'")
+    if not IMAGEN_DPI_MIN <= dpi <= IMAGEN_DPI_MAX:
+        raise HTTPException(status_code=400, detail=f"dpi debe estar entre {IMAGEN_DPI_MIN} y {IMAGEN_DPI_MAX}")
+    if tamano <= 0 or (tamano * dpi) ** 2 > IMAGEN_MAX_PIXELES:
+        raise HTTPException(status_code=400, detail=f"La imagen no puede superar {IMAGEN_MAX_PIXELES} píxeles")
+    try:
+        # La rueda necesita casas y ángulos; de la selección solo se respetan los cuerpos
+        data = data.model_copy(update={"campos": None})
+        clave = clave_peticion_imagen(data, formato, tamano, dpi)
+        if cache:
+            etag = etiquetas_imagenes.obtener(clave)
+            if etag is not None and coincide_etag(if_none_match, etag):
+                return _respuesta_imagen(None, formato, etag)
+
+        carta = calcular_carta_con_cache(data, usar_cache=cache)
+        etag = etag_imagen(carta, formato, tamano, dpi)
+        if cache:
+            etiquetas_imagenes.guardar(clave, etag)
+            if coincide_etag(if_none_match, etag):
+                return _respuesta_imagen(None, formato, etag)
+            contenido = cache_imagenes.obtener(etag)
+            if contenido is not None:
+                return _respuesta_imagen(contenido, formato, etag)
+
+        if formato == "svg":
+            ancho = round(tamano * dpi)
+            with DURACION_RENDER.medir(formato="svg"):
+                contenido = renderizar_carta_svg(carta, ancho, round(ancho * ALTO_SVG / ANCHO_SVG)).encode("utf-8")
+        else:
+            contenido = pool_render.renderizar_png(carta, (tamano, tamano), dpi)
+        if cache:
+            cache_imagenes.guardar(etag, contenido)
+        return _respuesta_imagen(contenido, formato, etag)
+    except ColaRenderLlena as cl:
+        raise HTTPException(status_code=503, detail=str(cl), headers={"Retry-After": str(cl.reintentar_en)})
+    except TiempoRenderAgotado as ta:
+        raise HTTPException(status_code=504, detail=str(ta))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        print(f"ERROR al generar la imagen de la carta: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno al generar la imagen: {str(e)}")
+
+@app.post("/carta-astral/batch", dependencies=[Depends(get_api_key)])
+def calcular_cartas_lote_endpoint(data: CartaAstralLoteInput, formato: Optional[str] = Query(None, alias="format"),
+                                  accept: Optional[str] = Header(None)):
+    """
+    Calcula muchas cartas en una sola petición (la clave se comprueba una vez).
+    Devuelve un resultado por registro, en el orden de entrada; los registros
+    con datos no válidos llevan un campo "error" en lugar de "resultado".
+    Con `?format=columnas` o `?format=msgpack` se devuelve en columnas (una
+    fila por carta calculada y los errores aparte).
+    """
+    if len(data.registros) > LOTE_MAX_REGISTROS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote admite como máximo {LOTE_MAX_REGISTROS} registros"
+        )
+    formato = _formato_pedido(formato, accept)
+    try:
+        errores = {}
+        for i, registro in enumerate(data.registros):
+            try:
+                completar_coordenadas(registro)
+            except ValueError as ve:
+                errores[i] = str(ve)
+        calculados = iter(realizar_calculo_astral_lote(
+            [registro for i, registro in enumerate(data.registros) if i not in errores]
+        ))
+        # Índices de la petición completa, no de los registros calculados
+        resultados = [{"indice": i, "error": errores[i]} if i in errores else dict(next(calculados), indice=i)
+                      for i in range(len(data.registros))]
+        if formato != "json":
+            return _respuesta_compacta(lote_en_columnas(resultados), formato)
+        return {"total": len(resultados), "resultados": resultados}
+    except Exception as e:
+        print(f"ERROR en el motor de cálculo por lotes: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno al calcular el lote: {str(e)}")
+
+@app.get("/cache/estadisticas", dependencies=[Depends(get_api_key)])
+def estadisticas_cache():
+    """
+    Tamaño y contadores (aciertos, fallos, expulsiones) de las cachés
+    de cartas completas (en memoria y compartida entre workers), de posiciones
+    planetarias por minuto y de imágenes.
+    """
+    return {
+        "cartas": cache_cartas.estadisticas(),
+        "planetas": cache_planetas.estadisticas(),
+        "imagenes": cache_imagenes.estadisticas(),
+        "etiquetas_imagenes": etiquetas_imagenes.estadisticas(),
+        "compartida": cache_compartida.estadisticas() if cache_compartida is not None else None
+    }
+
+@app.get("/render/estadisticas", dependencies=[Depends(get_api_key)])
+def estadisticas_render():
+    """
+    Estado del pool de renderizado: trabajos en curso y en cola, rechazados
+    por cola llena, agotados por tiempo y percentiles de latencia (segundos).
+    """
+    return pool_render.estadisticas()
+
+@app.get("/calculo/estadisticas", dependencies=[Depends(get_api_key)])
+def estadisticas_calculo():
+    """
+    Estado del ejecutor de cálculos: modo, cálculos en curso y en cola,
+    y percentiles (segundos) de espera en cola y de ejecución.
+    """
+    return ejecutor_calculo.estadisticas()
+
+@app.get("/metrics", dependencies=[Depends(get_api_key)], response_class=PlainTextResponse)
+def metricas_endpoint():
+    """
+    Métricas en formato de texto de Prometheus: duración por etapa del cálculo,
+    intentos de cada método de casas, renderizado, colas, cachés y peticiones HTTP.
+    """
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ciudades", dependencies=[Depends(get_api_key)])
+def buscar_ciudades_endpoint(q: str, limite: int = Query(10, ge=1, le=100), pais: Optional[str] = None):
+    """
+    Autocompletado de ciudades: las que empiezan por `q` (sin distinguir
+    tildes ni mayúsculas, también por nombres alternativos), de más a menos
+    poblada. `pais` filtra por código ISO de dos letras.
+    """
+    try:
+        return {"ciudades": cargar_nomenclator().buscar(q, limite, pais)}
+    except FileNotFoundError as fe:
+        raise HTTPException(status_code=503, detail=str(fe))
+
+@app.get("/ciudades/cercana", dependencies=[Depends(get_api_key)])
+def ciudad_cercana_endpoint(lat: float, lng: float):
+    """Ciudad del nomenclátor más cercana a unas coordenadas, con la distancia en km."""
+    try:
+        return cargar_nomenclator().cercana(lat, lng)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except FileNotFoundError as fe:
+        raise HTTPException(status_code=503, detail=str(fe))
+
+@app.post("/relocalizacion", dependencies=[Depends(get_api_key)])
+def relocalizacion_endpoint(data: RelocalizacionInput):
+    """
+    ASC, MC y casas de un mismo instante en muchos lugares (rejilla o lista).
+    Los planetas y el tiempo sidéreo se calculan una vez; por lugar solo las
+    casas. La respuesta va en columnas: una lista por campo, un valor por lugar.
+    Con `incluir_casas=false` solo se devuelven ASC y MC (mucho más rápido).
+    """
+    try:
+        if (data.rejilla is None) == (data.lugares is None):
+            raise ValueError("Indique una rejilla o una lista de lugares")
+        ciudades = None
+        if data.rejilla is not None:
+            r = data.rejilla
+            latitudes, longitudes = rejilla_puntos(r.lat_min, r.lat_max, r.lng_min, r.lng_max, r.paso,
+                                                   max_puntos=RELOCALIZACION_MAX_PUNTOS)
+        else:
+            if len(data.lugares) > RELOCALIZACION_MAX_PUNTOS:
+                raise ValueError(f"Se admiten como máximo {RELOCALIZACION_MAX_PUNTOS} lugares")
+            latitudes = [l.lat for l in data.lugares]
+            longitudes = [l.lng for l in data.lugares]
+            ciudades = [l.ciudad for l in data.lugares]
+
+        resultado = calcular_relocalizacion(data, latitudes, longitudes, incluir_casas=data.incluir_casas)
+        if ciudades is not None:
+            resultado["ciudad"] = ciudades
+        # Ya son tipos JSON: JSONResponse evita recorrer cientos de miles de valores con jsonable_encoder
+        return JSONResponse(resultado)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        print(f"ERROR en la relocalización: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno al calcular la relocalización: {str(e)}")
+
+@app.post("/astrocartografia", dependencies=[Depends(get_api_key)])
+def astrocartografia_endpoint(data: AstrocartografiaInput):
+    """
+    Líneas MC, IC, ASC y DSC de cada planeta sobre el globo, como GeoJSON
+    (FeatureCollection de MultiLineString, partidas en el antimeridiano).
+    La colección se envía Feature a Feature.
+    """
+    try:
+        propiedades, features = calcular_astrocartografia(
+            data, data.cuerpos, data.tipos, paso=data.paso, lat_max=data.lat_max
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    return StreamingResponse(
+        astrocartografia_geojson(propiedades, features),
+        media_type="application/geo+json"
+    )
+
+@app.post("/transitos", dependencies=[Depends(get_api_key)])
+def transitos_endpoint(data: TransitosInput, formato: Optional[str] = Query(None, alias="format"),
+                       accept: Optional[str] = Header(None)):
+    """
+    Serie de posiciones planetarias (signo, grados, velocidad) entre dos
+    fechas UT, como NDJSON (una fila por instante). Las posiciones se
+    calculan por bloques y se envían según se producen; el generador solo
+    avanza cuando el cliente ha recibido el bloque anterior.
+    Con `?format=columnas` cada línea es un bloque en columnas; con
+    `?format=msgpack`, un objeto MessagePack por bloque.
+    """
+    formato = _formato_pedido(formato, accept)
+    try:
+        inicio, paso, filas, cuerpos = preparar_serie(
+            data.inicio, data.fin, data.paso, data.cuerpos, max_filas=TRANSITOS_MAX_FILAS
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    
+    if formato != "json":
+        return StreamingResponse(
+            transitos_codificados(inicio, paso, filas, cuerpos, formato),
+            media_type="application/x-msgpack" if formato == "msgpack" else "application/x-ndjson",
+            headers={"Vary": "Accept"}
+        )
+    return StreamingResponse(
+        transitos_ndjson(inicio, paso, filas, cuerpos),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/transitos/animacion", dependencies=[Depends(get_api_key)], status_code=202)
+def animacion_transitos_endpoint(data: AnimacionTransitosInput):
+    """
+    Encola una animación de los tránsitos entre dos fechas UT sobre la rueda
+    de la carta natal (un fotograma por paso) y devuelve al momento el id del
+    trabajo. El fichero se recoge en GET /transitos/animacion/{id}.
+    """
+    if not 1 <= data.fps <= 60:
+        raise HTTPException(status_code=400, detail="fps debe estar entre 1 y 60")
+    if not IMAGEN_DPI_MIN <= data.dpi <= IMAGEN_DPI_MAX:
+        raise HTTPException(status_code=400, detail=f"dpi debe estar entre {IMAGEN_DPI_MIN} y {IMAGEN_DPI_MAX}")
+    if data.tamano <= 0 or (data.tamano * data.dpi) ** 2 > ANIMACION_MAX_PIXELES:
+        raise HTTPException(status_code=400,
+                            detail=f"Cada fotograma no puede superar {ANIMACION_MAX_PIXELES} píxeles")
+    try:
+        inicio, paso, filas, cuerpos = preparar_serie(
+            data.inicio, data.fin, data.paso, data.cuerpos, max_filas=ANIMACION_MAX_FOTOGRAMAS
+        )
+        # La rueda necesita casas y ángulos; de la selección solo se respetan los cuerpos
+        carta = calcular_carta_con_cache(data.carta.model_copy(update={"campos": None}))
+        id_trabajo = gestor_animaciones.encolar(carta, inicio, paso, filas, cuerpos, data.formato,
+                                                (data.tamano, data.tamano), data.dpi, data.fps)
+    except ColaAnimacionesLlena as cl:
+        raise HTTPException(status_code=503, detail=str(cl), headers={"Retry-After": str(cl.reintentar_en)})
+    except FormatoNoDisponible as fn:
+        raise HTTPException(status_code=406, detail=str(fn))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        print(f"ERROR al encolar la animación de tránsitos: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno al encolar la animación: {str(e)}")
+    return {"id": id_trabajo, "estado": "en_cola", "fotogramas": filas,
+            "url": f"/transitos/animacion/{id_trabajo}"}
+
+@app.get("/transitos/animacion/{id_trabajo}", dependencies=[Depends(get_api_key)])
+def resultado_animacion_endpoint(id_trabajo: str):
+    """
+    Estado de una animación: mientras se genera, 202 con el estado
+    ("en_cola" o "en_curso"); al terminar, el fichero.
+    """
+    estado = gestor_animaciones.consultar(id_trabajo)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Animación desconocida o caducada")
+    if estado["estado"] == "error":
+        raise HTTPException(status_code=500, detail=f"Error al generar la animación: {estado['error']}")
+    if estado["estado"] != "terminado":
+        return JSONResponse(status_code=202, content=estado, headers={"Retry-After": "1"})
+    return FileResponse(estado["ruta"], media_type=FORMATOS_ANIMACION[estado["formato"]],
+                        filename=f"transitos_{id_trabajo}.{estado['formato']}")
+
+@app.get("/transitos/animacion", dependencies=[Depends(get_api_key)])
+def estadisticas_animaciones():
+    """Trabajos de animación en curso y en cola, contadores y percentiles de duración (segundos)."""
+    return gestor_animaciones.estadisticas()
+
+@app.post("/sinastria", dependencies=[Depends(get_api_key)])
+def sinastria_endpoint(data: SinastriaInput):
+    """
+    Aspectos entre los cuerpos de dos cartas (primero el de la carta A).
+    """
+    try:
+        carta_a = calcular_carta_con_cache(data.carta_a)
+        carta_b = calcular_carta_con_cache(data.carta_b)
+        return {
+            "carta_a": carta_a.a_dict(),
+            "carta_b": carta_b.a_dict(),
+            "aspectos": aspectos_sinastria(carta_a, carta_b, data.orbes)
+        }
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+@app.post("/sinastria/ranking", dependencies=[Depends(get_api_key)])
+def ranking_compatibilidad_endpoint(data: RankingCompatibilidadInput):
+    """
+    Compara una carta con muchos perfiles guardados (longitudes de sus diez
+    planetas) y devuelve los más compatibles, de mayor a menor puntuación.
+    """
+    try:
+        # Los perfiles son de los diez planetas: la referencia se calcula completa
+        referencia = calcular_carta_con_cache(data.referencia.model_copy(update={"campos": None, "cuerpos": None}))
+        mejores = ranking_compatibilidad(
+            longitudes_planetarias(referencia),
+            [perfil.longitudes for perfil in data.perfiles],
+            limite=data.limite,
+            orbes=data.orbes
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    
+    return {
+        "total_perfiles": len(data.perfiles),
+        "ranking": [
+            {"id": data.perfiles[i].id, "puntuacion": round(puntuacion, 4), "aspectos": n}
+            for i, puntuacion, n in mejores
+        ]
+    }
+
+@app.post("/eventos", dependencies=[Depends(get_api_key)])
+def eventos_endpoint(data: EventosInput):
+    """
+    Instantes exactos (al segundo) de ingresos en signo, estaciones y
+    aspectos exactos entre dos fechas UT.
+    """
+    try:
+        return buscar_eventos(data.inicio, data.fin, data.cuerpos, data.tipos, data.aspectos,
+                              max_dias=EVENTOS_MAX_DIAS)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        print(f"ERROR en la búsqueda de eventos: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno al buscar eventos: {str(e)}")
+
 # El bloque para correr localmente no cambia
 if __name__ == "__main__":
     import uvicorn
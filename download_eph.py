@@ -1,105 +1,293 @@
+"""
+Descarga y verificación de los ficheros de efemérides de Swiss Ephemeris.
+
+- Los ficheros se descargan en paralelo y por trozos, directamente a disco.
+- Cada descarga se escribe en "<fichero>.part" dentro del directorio de
+  caché; si se corta, la siguiente ejecución continúa desde donde quedó
+  (cabecera Range) en lugar de empezar de nuevo.
+- Un fichero solo se da por bueno si coincide con el manifiesto (tamaño y
+  sha256, si están fijados) y si Swiss Ephemeris lo usa de verdad: se
+  calcula un cuerpo con FLG_SWIEPH y se comprueba que no cae a Moshier.
+- Los ficheros válidos se guardan en EPH_CACHE_DIR y de ahí se copian a
+  ephe/; una reconstrucción con la caché llena no descarga nada.
+- Nunca se escriben ficheros vacíos: si algo falla se informa y el programa
+  termina con error, y la API usará Moshier hasta que se corrija.
+
+Variables de entorno:
+    EPH_BASE_URL               URL base de los ficheros (por defecto astro.com)
+    EPH_CACHE_DIR              Caché local de ficheros ya verificados
+    EPH_DESCARGAS_PARALELAS    Descargas simultáneas
+    EPH_MANIFIESTO             Fichero JSON con los ficheros esperados
+
+Uso:
+    python download_eph.py                 # descargar y verificar
+    python download_eph.py --verificar     # solo comprobar ephe/
+    python download_eph.py --fijar-manifiesto   # guardar tamaño y sha256 de los ficheros verificados
+"""
+import argparse
+import hashlib
+import json
 import os
-import requests
-import zipfile
-import io
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-# URLs alternativas para las efemérides de Swiss Ephemeris
-EPH_URLS = [
-    "https://github.com/astrorigin/pyswisseph/raw/master/swisseph/src/sweph_18.tar.gz",
-    "https://www.astro.com/ftp/swisseph/ephe/sepl_18.se1",
-    "https://www.astro.com/ftp/swisseph/ephe/semo_18.se1", 
-    "https://www.astro.com/ftp/swisseph/ephe/seas_18.se1"
-]
+import requests
+import swisseph as swe
 
 # Directorio donde guardaremos los archivos
 EPH_PATH = "ephe"
 
-def download_individual_files():
+EPH_BASE_URL = os.getenv("EPH_BASE_URL", "https://www.astro.com/ftp/swisseph/ephe/")
+EPH_CACHE_DIR = os.getenv("EPH_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "carta_astral", "ephe"))
+EPH_DESCARGAS_PARALELAS = int(os.getenv("EPH_DESCARGAS_PARALELAS", "3"))
+EPH_MANIFIESTO = os.getenv("EPH_MANIFIESTO", "efemerides_manifiesto.json")
+
+TAMANO_TROZO = 1024 * 1024
+TIEMPO_ESPERA = 30
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Instante de prueba (J2000), dentro del rango de los ficheros *_18 (1800-2400)
+JD_PRUEBA = 2451545.0
+
+
+class EfemeridesInvalidas(Exception):
+    """Un fichero de efemérides está vacío, incompleto o Swiss Ephemeris no lo usa."""
+
+
+def cargar_manifiesto(ruta=EPH_MANIFIESTO):
+    """
+    Ficheros esperados: {nombre: {"bytes": int o null, "sha256": str o null,
+    "cuerpo": índice de swisseph que se calcula con ese fichero}}.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)["ficheros"]
+
+
+def _sha256(ruta):
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(TAMANO_TROZO), b""):
+            resumen.update(trozo)
+    return resumen.hexdigest()
+
+
+def probar_cuerpo(directorio, cuerpo):
+    """
+    Calcula `cuerpo` con los ficheros de `directorio` y comprueba que Swiss
+    Ephemeris los ha usado (el retflag no indica Moshier). Deja swisseph
+    apuntando a `directorio`.
+    """
+    swe.close()
+    swe.set_ephe_path(directorio)
+    try:
+        _, retflag = swe.calc_ut(JD_PRUEBA, cuerpo, swe.FLG_SWIEPH)
+    except swe.Error as e:
+        raise EfemeridesInvalidas(f"swisseph no puede calcular el cuerpo {cuerpo}: {e}")
+    if not retflag & swe.FLG_SWIEPH:
+        raise EfemeridesInvalidas(f"el cuerpo {cuerpo} se calcula con Moshier, no con los ficheros")
+
+
+def verificar_fichero(ruta, esperado):
+    """
+    Comprueba un fichero contra su entrada del manifiesto.
+    Lanza EfemeridesInvalidas si no es válido.
+    """
+    nombre = os.path.basename(ruta)
+    if not os.path.exists(ruta):
+        raise EfemeridesInvalidas(f"{nombre}: no existe")
+    tamano = os.path.getsize(ruta)
+    if tamano == 0:
+        raise EfemeridesInvalidas(f"{nombre}: está vacío")
+    if esperado.get("bytes") is not None and tamano != esperado["bytes"]:
+        raise EfemeridesInvalidas(f"{nombre}: {tamano} bytes, se esperaban {esperado['bytes']}")
+    if esperado.get("sha256") and _sha256(ruta) != esperado["sha256"]:
+        raise EfemeridesInvalidas(f"{nombre}: el sha256 no coincide con el manifiesto")
+    if esperado.get("cuerpo") is not None:
+        probar_cuerpo(os.path.dirname(ruta) or ".", esperado["cuerpo"])
+
+
+def descargar_fichero(nombre, esperado, directorio_cache=EPH_CACHE_DIR, base_url=EPH_BASE_URL):
     """
-    Descarga archivos individuales de efemérides necesarios.
+    Deja `nombre` verificado en la caché, descargándolo si hace falta.
+    Continúa una descarga parcial (.part) si el servidor admite Range.
+    Devuelve la ruta del fichero en la caché.
     """
-    # Archivos básicos necesarios para cálculos planetarios
-    basic_files = [
-        "https://www.astro.com/ftp/swisseph/ephe/sepl_18.se1",  # Planetas principales
-        "https://www.astro.com/ftp/swisseph/ephe/semo_18.se1",  # Luna
-        "https://www.astro.com/ftp/swisseph/ephe/seas_18.se1"   # Asteroides principales
-    ]
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
-    success_count = 0
-    
-    for url in basic_files:
+    destino = os.path.join(directorio_cache, nombre)
+    if os.path.exists(destino):
         try:
-            filename = url.split('/')[-1]
-            filepath = os.path.join(EPH_PATH, filename)
-            
-            print(f"Descargando: {filename}")
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            
-            print(f"✓ Descargado: {filename} ({len(response.content)} bytes)")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"✗ Error descargando {filename}: {e}")
-    
-    return success_count > 0
+            verificar_fichero(destino, esperado)
+            print(f"✓ En caché: {nombre}")
+            return destino
+        except EfemeridesInvalidas as e:
+            print(f"Fichero de la caché no válido ({e}); se descarga de nuevo")
+            os.remove(destino)
+
+    parcial = destino + ".part"
+    ya_descargado = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    if esperado.get("bytes") is not None and ya_descargado > esperado["bytes"]:
+        ya_descargado = 0
+    cabeceras = dict(HEADERS)
+    if ya_descargado:
+        cabeceras["Range"] = f"bytes={ya_descargado}-"
+
+    url = base_url.rstrip("/") + "/" + nombre
+    with requests.get(url, headers=cabeceras, stream=True, timeout=TIEMPO_ESPERA) as respuesta:
+        # 416 con un .part: ya estaba completo, solo falta verificarlo
+        if not (respuesta.status_code == 416 and ya_descargado):
+            respuesta.raise_for_status()
+            continuar = ya_descargado > 0 and respuesta.status_code == 206
+            if continuar:
+                print(f"Continuando {nombre} desde el byte {ya_descargado}")
+            elif ya_descargado:
+                print(f"El servidor no admite continuar {nombre}; se descarga entero")
+            with open(parcial, "ab" if continuar else "wb") as f:
+                for trozo in respuesta.iter_content(chunk_size=TAMANO_TROZO):
+                    f.write(trozo)
+
+    try:
+        verificar_fichero(parcial, {**esperado, "cuerpo": None})
+    except EfemeridesInvalidas:
+        # Un .part que no cuadra no sirve para continuar
+        os.remove(parcial)
+        raise
+    os.replace(parcial, destino)
+    try:
+        verificar_fichero(destino, esperado)
+    except EfemeridesInvalidas:
+        os.remove(destino)
+        raise
+    print(f"✓ Descargado: {nombre} ({os.path.getsize(destino)} bytes)")
+    return destino
+
+
+def descartar_fichero(nombre, *directorios):
+    """Borra `nombre` de cada directorio donde esté (un fichero dañado hace fallar a swisseph)."""
+    for directorio in directorios:
+        ruta = os.path.join(directorio, nombre)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
 
-def create_minimal_ephemeris_files():
+def instalar_fichero(origen, directorio=EPH_PATH):
+    """Copia un fichero verificado de la caché a `directorio` (sin dejar copias a medias)."""
+    destino = os.path.join(directorio, os.path.basename(origen))
+    temporal = destino + ".tmp"
+    shutil.copyfile(origen, temporal)
+    os.replace(temporal, destino)
+    return destino
+
+
+def preparar_efemerides(manifiesto, directorio=EPH_PATH, directorio_cache=EPH_CACHE_DIR,
+                        base_url=EPH_BASE_URL, paralelas=EPH_DESCARGAS_PARALELAS):
     """
-    Crea archivos mínimos de efemérides para que pyswisseph funcione.
+    Deja en `directorio` todos los ficheros del manifiesto, verificados.
+    Los que ya son válidos no se tocan. Devuelve {nombre: error} de los que fallan.
     """
-    print("Creando archivos mínimos de efemérides...")
-    
-    # Crear archivos vacíos con nombres esperados por Swiss Ephemeris
-    minimal_files = [
-        "sepl_18.se1",  # Planetas
-        "semo_18.se1",  # Luna  
-        "seas_18.se1"   # Asteroides
-    ]
-    
-    for filename in minimal_files:
-        filepath = os.path.join(EPH_PATH, filename)
-        # Crear archivo vacío - pyswisseph usará cálculos internos
-        with open(filepath, 'wb') as f:
-            f.write(b'')
-        print(f"Creado archivo mínimo: {filename}")
-
-def download_and_extract_eph():
+    os.makedirs(directorio, exist_ok=True)
+    os.makedirs(directorio_cache, exist_ok=True)
+
+    pendientes = {}
+    for nombre, esperado in manifiesto.items():
+        try:
+            verificar_fichero(os.path.join(directorio, nombre), esperado)
+            print(f"✓ Ya instalado: {nombre}")
+        except EfemeridesInvalidas:
+            # Si está pero swisseph no lo puede usar, se quita hasta tener uno bueno:
+            # sin él la API usa Moshier; con él dañado, falla cada cálculo
+            descartar_fichero(nombre, directorio)
+            pendientes[nombre] = esperado
+
+    errores = {}
+    # Las descargas en paralelo solo comprueban tamaño y sha256: la prueba con
+    # swisseph cambia su estado global, así que se hace después, de una en una,
+    # sobre el fichero de la caché y antes de instalarlo
+    sin_prueba = {nombre: {**esperado, "cuerpo": None} for nombre, esperado in pendientes.items()}
+    with ThreadPoolExecutor(max_workers=max(1, paralelas)) as pool:
+        futuros = {
+            nombre: pool.submit(descargar_fichero, nombre, esperado, directorio_cache, base_url)
+            for nombre, esperado in sin_prueba.items()
+        }
+    for nombre, futuro in futuros.items():
+        try:
+            ruta = futuro.result()
+            verificar_fichero(ruta, pendientes[nombre])
+            instalar_fichero(ruta, directorio)
+        except EfemeridesInvalidas as e:
+            descartar_fichero(nombre, directorio_cache, directorio)
+            errores[nombre] = str(e)
+        except Exception as e:
+            errores[nombre] = str(e)
+
+    for nombre, error in verificar_efemerides(manifiesto, directorio).items():
+        errores.setdefault(nombre, error)
+    return errores
+
+
+def verificar_efemerides(manifiesto, directorio=EPH_PATH):
     """
-    Descarga y extrae los archivos de efemérides en el directorio EPH_PATH.
+    Comprueba los ficheros del manifiesto que hay en `directorio` y cualquier
+    fichero .se1 vacío. Devuelve {nombre: error} (vacío si todo es válido) y
+    deja swisseph apuntando a `directorio`.
     """
-    if os.path.exists(EPH_PATH):
-        # Verificar si ya hay archivos
-        files = os.listdir(EPH_PATH)
-        if files:
-            print(f"El directorio '{EPH_PATH}' ya contiene archivos: {files}")
-            return
-        else:
-            print(f"El directorio '{EPH_PATH}' existe pero está vacío.")
-    else:
-        print(f"Creando directorio '{EPH_PATH}'...")
-        os.makedirs(EPH_PATH)
-
-    # Intentar descargar archivos individuales
-    print("Intentando descargar archivos de efemérides...")
-    
-    if download_individual_files():
-        print("✓ Efemérides descargadas correctamente.")
-        return
-    
-    # Si la descarga falla, crear archivos mínimos
-    print("Descarga falló. Creando archivos mínimos...")
-    create_minimal_ephemeris_files()
-    
-    print("✓ Configuración de efemérides completada.")
-    print("NOTA: Se usarán cálculos internos de pyswisseph para mayor precisión.")
+    errores = {}
+    presentes = os.listdir(directorio) if os.path.isdir(directorio) else []
+    for nombre in presentes:
+        if nombre.endswith(".se1") and os.path.getsize(os.path.join(directorio, nombre)) == 0:
+            errores[nombre] = f"{nombre}: está vacío"
+    for nombre, esperado in manifiesto.items():
+        if nombre in errores:
+            continue
+        try:
+            verificar_fichero(os.path.join(directorio, nombre), esperado)
+        except EfemeridesInvalidas as e:
+            errores[nombre] = str(e)
+    swe.close()
+    swe.set_ephe_path(directorio)
+    return errores
+
+
+def fijar_manifiesto(ruta=EPH_MANIFIESTO, directorio=EPH_PATH):
+    """Guarda en el manifiesto el tamaño y sha256 de los ficheros de `directorio` que Swiss Ephemeris usa."""
+    with open(ruta, encoding="utf-8") as f:
+        contenido = json.load(f)
+    for nombre, esperado in contenido["ficheros"].items():
+        ruta_fichero = os.path.join(directorio, nombre)
+        verificar_fichero(ruta_fichero, esperado)
+        esperado["bytes"] = os.path.getsize(ruta_fichero)
+        esperado["sha256"] = _sha256(ruta_fichero)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(temporal, ruta)
+
 
 if __name__ == "__main__":
-    download_and_extract_eph()
+    parser = argparse.ArgumentParser(description="Descarga y verifica las efemérides de Swiss Ephemeris")
+    parser.add_argument("--verificar", action="store_true", help="solo comprobar los ficheros de ephe/")
+    parser.add_argument("--fijar-manifiesto", action="store_true",
+                        help="guardar tamaño y sha256 de los ficheros verificados en el manifiesto")
+    args = parser.parse_args()
+
+    manifiesto = cargar_manifiesto()
+    if args.fijar_manifiesto:
+        fijar_manifiesto()
+        print(f"✓ Manifiesto actualizado: {EPH_MANIFIESTO}")
+        sys.exit(0)
+
+    if args.verificar:
+        errores = verificar_efemerides(manifiesto)
+    else:
+        print(f"Preparando efemérides en '{EPH_PATH}' desde {EPH_BASE_URL} (caché: {EPH_CACHE_DIR})")
+        errores = preparar_efemerides(manifiesto)
+
+    if errores:
+        for nombre, error in errores.items():
+            print(f"✗ {error}")
+        print("ERROR: efemérides incompletas; los cálculos usarán Moshier (menos precisión).")
+        sys.exit(1)
+    print("✓ Efemérides verificadas.")
@@ -0,0 +1,198 @@
+"""
+Ejecutor dedicado para los cálculos con swisseph.
+
+swisseph tiene estado global (ruta de efemérides, última posición calculada)
+y no libera el GIL, así que varios hilos calculando a la vez no escalan y no
+está claro que sea seguro. Con CALCULO_MODO se elige dónde corre el cálculo:
+
+- "hilos": un ThreadPoolExecutor de CALCULO_TRABAJADORES hilos.
+- "procesos": un ProcessPoolExecutor; cada proceso llama a swe.set_ephe_path
+  y configura el motor de efemerides una sola vez al arrancar, y el cálculo
+  escala con los núcleos.
+
+Como mucho hay CALCULO_TRABAJADORES cálculos a la vez y CALCULO_COLA_MAX
+esperando; el resto se rechaza con ColaCalculoLlena (503). Se mide cuánto
+espera cada petición antes de empezar a calcular.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metricas import histograma
+from trabajadores_render import percentil
+
+MODOS_CALCULO = ("hilos", "procesos")
+
+# --- Configuración (variables de entorno) ---
+CALCULO_MODO = os.getenv("CALCULO_MODO", "hilos")
+CALCULO_TRABAJADORES = int(os.getenv("CALCULO_TRABAJADORES", str(os.cpu_count() or 1)))
+CALCULO_COLA_MAX = int(os.getenv("CALCULO_COLA_MAX", "256"))
+
+# Esperas y duraciones recientes que se guardan para los percentiles
+MUESTRAS_LATENCIA = 1000
+
+
+ESPERA_CALCULO = histograma(
+    "carta_calculo_espera_segundos",
+    "Tiempo que espera un cálculo en cola antes de ejecutarse"
+)
+
+EJECUCION_CALCULO = histograma(
+    "carta_calculo_ejecucion_segundos",
+    "Duración de un cálculo en el ejecutor"
+)
+
+
+class ColaCalculoLlena(Exception):
+    """No caben más cálculos en espera."""
+
+    def __init__(self, reintentar_en):
+        super().__init__("Demasiados cálculos en espera")
+        self.reintentar_en = reintentar_en
+
+
+def _iniciar_trabajador(ruta_ephe, motor, ruta_tabla):
+    """Inicializador de cada proceso: estado de swisseph y motor de efemérides, una vez."""
+    import swisseph as swe
+    from astral_calculator import configurar_motor_efemerides
+    swe.set_ephe_path(ruta_ephe)
+    configurar_motor_efemerides(motor, ruta_tabla)
+
+
+def _ejecutar_medido(funcion, args):
+    """Corre en el trabajador; devuelve (resultado, segundos de ejecución)."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+class EjecutorCalculo:
+    """
+    Ejecutor de cálculos con límite de concurrencia y métricas de espera.
+
+    Args:
+        modo: "hilos" o "procesos"
+        trabajadores: Cálculos simultáneos (hilos o procesos)
+        cola_max: Cálculos que pueden esperar además de los que están en curso
+        ruta_ephe, motor, ruta_tabla: Estado que cada proceso configura al arrancar
+    """
+
+    def __init__(self, modo=CALCULO_MODO, trabajadores=CALCULO_TRABAJADORES, cola_max=CALCULO_COLA_MAX,
+                 ruta_ephe="ephe", motor="swisseph", ruta_tabla=None):
+        if modo not in MODOS_CALCULO:
+            raise ValueError(f"Modo de cálculo desconocido: {modo} (use {' o '.join(MODOS_CALCULO)})")
+        if trabajadores < 1 or cola_max < 0:
+            raise ValueError("Se necesita al menos un trabajador y una cola no negativa")
+        self.modo = modo
+        self.trabajadores = trabajadores
+        self.cola_max = cola_max
+        self._estado_procesos = (ruta_ephe, motor, ruta_tabla)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.completados = 0
+        self.rechazados = 0
+        self.errores = 0
+        self._esperas = deque(maxlen=MUESTRAS_LATENCIA)
+        self._ejecuciones = deque(maxlen=MUESTRAS_LATENCIA)
+
+    def _obtener_pool(self):
+        if self._pool is None:
+            if self.modo == "procesos":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.trabajadores,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_iniciar_trabajador,
+                    initargs=self._estado_procesos
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.trabajadores, thread_name_prefix="calculo")
+        return self._pool
+
+    def _liberar(self, _futuro=None):
+        with self._lock:
+            self._pendientes -= 1
+
+    async def ejecutar(self, funcion, *args):
+        """
+        Ejecuta funcion(*args) en el pool sin bloquear el bucle de eventos.
+        En modo "procesos" la función y los argumentos deben poder serializarse
+        (funciones de módulo, tipos simples; no modelos de la petición).
+        """
+        with self._lock:
+            if self._pendientes >= self.trabajadores + self.cola_max:
+                self.rechazados += 1
+                raise ColaCalculoLlena(self._estimar_espera())
+            self._pendientes += 1
+            pool = self._obtener_pool()
+
+        inicio = time.perf_counter()
+        try:
+            futuro = pool.submit(_ejecutar_medido, funcion, args)
+        except Exception:
+            self._liberar()
+            raise
+        # El hueco se libera cuando el cálculo termina de verdad, no cuando la
+        # petición deja de esperar: si el cliente se desconecta, el cálculo
+        # sigue ocupando un trabajador
+        futuro.add_done_callback(self._liberar)
+
+        try:
+            resultado, segundos = await asyncio.wrap_future(futuro)
+        except BrokenProcessPool:
+            with self._lock:
+                self.errores += 1
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        except Exception:
+            with self._lock:
+                self.errores += 1
+            raise
+
+        espera = max(0.0, time.perf_counter() - inicio - segundos)
+        ESPERA_CALCULO.observar(espera)
+        EJECUCION_CALCULO.observar(segundos)
+        with self._lock:
+            self.completados += 1
+            self._esperas.append(espera)
+            self._ejecuciones.append(segundos)
+        return resultado
+
+    def _estimar_espera(self):
+        medio = (sum(self._ejecuciones) / len(self._ejecuciones)) if self._ejecuciones else 0.1
+        return max(1, round(medio * self._pendientes / self.trabajadores))
+
+    def estadisticas(self):
+        """Modo, ocupación y percentiles (segundos) de espera en cola y de ejecución."""
+        with self._lock:
+            esperas = list(self._esperas)
+            ejecuciones = list(self._ejecuciones)
+            en_curso = min(self._pendientes, self.trabajadores)
+            return {
+                "modo": self.modo,
+                "trabajadores": self.trabajadores,
+                "cola_max": self.cola_max,
+                "en_curso": en_curso,
+                "en_cola": self._pendientes - en_curso,
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+                "errores": self.errores,
+                "espera_p50": percentil(esperas, 50),
+                "espera_p95": percentil(esperas, 95),
+                "espera_p99": percentil(esperas, 99),
+                "ejecucion_p50": percentil(ejecuciones, 50),
+                "ejecucion_p95": percentil(ejecuciones, 95)
+            }
+
+    def cerrar(self):
+        """Termina los hilos o procesos del pool (se vuelve a crear si se usa otra vez)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
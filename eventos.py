@@ -0,0 +1,304 @@
+"""
+Búsqueda de eventos: ingresos en signo, estaciones (retrógrada / directa)
+y aspectos exactos entre planetas, con precisión de un segundo.
+
+En lugar de muestrear minuto a minuto, cada planeta se muestrea con un paso
+de horas o días y las velocidades (pos[3] de swe.calc_ut) se usan de dos
+formas:
+- Para acotar: donde la velocidad cambia de signo hay una estación, y el
+  intervalo se parte en ella; en cada trozo el movimiento es monótono, así
+  que un ingreso o un aspecto cruza como mucho una vez y no se pierde.
+- Para refinar: la velocidad es la derivada de la longitud, y el instante
+  exacto se obtiene por Newton (con bisección de salvaguarda).
+Cada evento cuesta unas decenas de llamadas a las efemérides.
+"""
+from astral_calculator import (
+    PLANETAS_INDICES, SIGNOS, ASPECTOS_MAYORES,
+    calcular_posicion, calcular_posiciones_bloque
+)
+from transitos import a_utc, dia_juliano_de_fecha, fecha_de_dia_juliano
+
+TIPOS_EVENTO = ("ingresos", "estaciones", "aspectos")
+
+# Paso de muestreo (días) de cada planeta: la Luna recorre un signo en ~2.5 días
+PASO_MUESTREO = {
+    "Sol": 1.0, "Luna": 0.5, "Mercurio": 1.0, "Venus": 2.0, "Marte": 2.0,
+    "Júpiter": 4.0, "Saturno": 4.0, "Urano": 4.0, "Neptuno": 4.0, "Plutón": 4.0
+}
+
+# Planetas que nunca se detienen
+SIN_ESTACIONES = ("Sol", "Luna")
+
+# Precisión del instante de cada evento (medio segundo, en días)
+TOLERANCIA = 0.5 / 86400
+
+
+def _ajustar_180(grados):
+    """Lleva un ángulo a [-180, 180)."""
+    return (grados + 180.0) % 360.0 - 180.0
+
+
+class _Efemerides:
+    """Acceso a las posiciones con caché de muestreo y contador de llamadas."""
+
+    def __init__(self, jd_inicio, jd_fin):
+        self.jd_inicio = jd_inicio
+        self.jd_fin = jd_fin
+        self.llamadas = 0
+        self._muestras = {}
+
+    def posicion(self, jd, nombre):
+        self.llamadas += 1
+        return calcular_posicion(jd, PLANETAS_INDICES[nombre])
+
+    def rejilla(self, paso):
+        n = int((self.jd_fin - self.jd_inicio) / paso) + 1
+        jds = [self.jd_inicio + i * paso for i in range(n)]
+        if jds[-1] < self.jd_fin:
+            jds.append(self.jd_fin)
+        return jds
+
+    def muestras(self, nombre, paso):
+        """Longitudes y velocidades de un planeta en la rejilla de `paso` días."""
+        clave = (nombre, paso)
+        if clave not in self._muestras:
+            jds = self.rejilla(paso)
+            longitudes, velocidades = calcular_posiciones_bloque(jds, [PLANETAS_INDICES[nombre]])
+            self.llamadas += len(jds)
+            self._muestras[clave] = (jds, longitudes[0].tolist(), velocidades[0].tolist())
+        return self._muestras[clave]
+
+
+def _raiz(f, a, b, fa, fb):
+    """
+    Raíz de f en [a, b], con f(a) y f(b) de signos opuestos.
+    f(t) devuelve (valor, derivada). Con derivada se usa Newton; sin ella,
+    regula falsi (variante Illinois). Si un paso sale del intervalo se hace
+    bisección, así que siempre converge.
+    """
+    lado = 0
+    t = a + (b - a) * fa / (fa - fb)
+    for _ in range(100):
+        ft, derivada = f(t)
+        if ft == 0.0:
+            return t
+
+        if (ft < 0) == (fa < 0):
+            a, fa = t, ft
+            if lado == -1:
+                fb /= 2
+            lado = -1
+        else:
+            b, fb = t, ft
+            if lado == 1:
+                fa /= 2
+            lado = 1
+
+        if b - a < TOLERANCIA:
+            return (a + b) / 2
+
+        if derivada:
+            siguiente = t - ft / derivada
+            # Newton converge cuadráticamente: un paso menor que la
+            # tolerancia deja el error muy por debajo de ella
+            if abs(siguiente - t) < TOLERANCIA and a <= siguiente <= b:
+                return siguiente
+        else:
+            siguiente = a + (b - a) * fa / (fa - fb)
+        if not (a < siguiente < b):
+            siguiente = (a + b) / 2
+        t = siguiente
+    return t
+
+
+def _tramos_monotonos(jds, valores, velocidades, buscar_parada, f_velocidad):
+    """
+    Parte la rejilla en tramos donde `velocidades` no cambia de signo.
+    Devuelve (tramos, paradas): tramos = [(t0, v0, t1, v1)], paradas = [(t, velocidad_antes)].
+    `valores` son las longitudes (o diferencias) en cada punto de la rejilla.
+    """
+    tramos = []
+    paradas = []
+    for i in range(len(jds) - 1):
+        a, b = jds[i], jds[i + 1]
+        va, vb = valores[i], valores[i + 1]
+        wa, wb = velocidades[i], velocidades[i + 1]
+
+        if (wa < 0) != (wb < 0) and wa != 0.0:
+            t = _raiz(f_velocidad, a, b, wa, wb)
+            vt = buscar_parada(t)
+            paradas.append((t, wa))
+            tramos.append((a, va, t, vt))
+            tramos.append((t, vt, b, vb))
+        else:
+            tramos.append((a, va, b, vb))
+    return tramos, paradas
+
+
+def _buscar_planeta(efemerides, nombre, tipos):
+    """Ingresos y estaciones de un planeta."""
+    eventos = []
+    jds, longitudes, velocidades = efemerides.muestras(nombre, PASO_MUESTREO[nombre])
+
+    def f_velocidad(t):
+        return efemerides.posicion(t, nombre)[1], None
+
+    def longitud(t):
+        return efemerides.posicion(t, nombre)[0]
+
+    if nombre in SIN_ESTACIONES:
+        tramos = [(jds[i], longitudes[i], jds[i + 1], longitudes[i + 1]) for i in range(len(jds) - 1)]
+        paradas = []
+    else:
+        tramos, paradas = _tramos_monotonos(jds, longitudes, velocidades, longitud, f_velocidad)
+
+    if "estaciones" in tipos:
+        for t, velocidad_antes in paradas:
+            grados = longitud(t)
+            eventos.append({
+                "tipo": "estacion",
+                "dia_juliano": t,
+                "cuerpo": nombre,
+                "movimiento": "retrógrado" if velocidad_antes > 0 else "directo",
+                "grados_totales": round(grados, 4),
+                "signo": SIGNOS[int(grados % 360 // 30)]
+            })
+
+    if "ingresos" in tipos:
+        for a, la, b, lb in tramos:
+            avance = _ajustar_180(lb - la)
+            signo_a = la // 30
+            signo_b = (la + avance) // 30
+            if signo_a == signo_b:
+                continue
+
+            limite = 30.0 * max(signo_a, signo_b)
+
+            def f_ingreso(t, limite=limite):
+                lon, vel = efemerides.posicion(t, nombre)
+                return _ajustar_180(lon - limite), vel
+
+            t = _raiz(f_ingreso, a, b, _ajustar_180(la - limite), _ajustar_180(la + avance - limite))
+            eventos.append({
+                "tipo": "ingreso",
+                "dia_juliano": t,
+                "cuerpo": nombre,
+                "signo": SIGNOS[int(signo_b % 12)],
+                "retrogrado": avance < 0
+            })
+
+    return eventos
+
+
+def _buscar_aspectos(efemerides, nombre_a, nombre_b, aspectos):
+    """Instantes exactos de los aspectos entre dos planetas."""
+    eventos = []
+    paso = min(PASO_MUESTREO[nombre_a], PASO_MUESTREO[nombre_b])
+    jds, longitudes_a, velocidades_a = efemerides.muestras(nombre_a, paso)
+    _, longitudes_b, velocidades_b = efemerides.muestras(nombre_b, paso)
+
+    diferencias = [la - lb for la, lb in zip(longitudes_a, longitudes_b)]
+    relativas = [va - vb for va, vb in zip(velocidades_a, velocidades_b)]
+
+    def relativo(t):
+        lon_a, vel_a = efemerides.posicion(t, nombre_a)
+        lon_b, vel_b = efemerides.posicion(t, nombre_b)
+        return lon_a - lon_b, vel_a - vel_b
+
+    def f_velocidad(t):
+        return relativo(t)[1], None
+
+    tramos, _ = _tramos_monotonos(
+        jds, diferencias, relativas, lambda t: relativo(t)[0], f_velocidad
+    )
+
+    # Ángulos objetivo de la diferencia de longitudes (ambos lados del círculo)
+    objetivos = []
+    for nombre_aspecto, angulo in aspectos.items():
+        objetivos.append((nombre_aspecto, angulo, angulo))
+        if 0.0 < angulo < 180.0:
+            objetivos.append((nombre_aspecto, angulo, -angulo))
+
+    for a, da, b, db in tramos:
+        avance = _ajustar_180(db - da)
+        for nombre_aspecto, angulo, objetivo in objetivos:
+            fa = _ajustar_180(da - objetivo)
+            fb = fa + avance
+            # Cruza el objetivo si fa y fb tienen signos opuestos sin dar la vuelta
+            if (fa < 0) == (fb < 0) or abs(fb) >= 180:
+                continue
+
+            def f_aspecto(t, objetivo=objetivo):
+                diferencia, relativa = relativo(t)
+                return _ajustar_180(diferencia - objetivo), relativa
+
+            t = _raiz(f_aspecto, a, b, fa, fb)
+            eventos.append({
+                "tipo": "aspecto",
+                "dia_juliano": t,
+                "cuerpos": [nombre_a, nombre_b],
+                "aspecto": nombre_aspecto,
+                "angulo": angulo
+            })
+
+    return eventos
+
+
+def buscar_eventos(inicio, fin, cuerpos=None, tipos=None, aspectos=None, max_dias=None):
+    """
+    Busca ingresos, estaciones y aspectos exactos entre dos fechas UT.
+
+    Args:
+        inicio, fin: datetime (sin zona = UT)
+        cuerpos: nombres de planetas (por defecto, los diez)
+        tipos: subconjunto de TIPOS_EVENTO (por defecto, todos)
+        aspectos: nombres de ASPECTOS_MAYORES (por defecto, todos)
+        max_dias: días máximos del rango (None = sin límite)
+
+    Devuelve {"eventos": [...], "llamadas_efemerides": n}, con los eventos
+    ordenados por fecha. Lanza ValueError si los parámetros no son válidos.
+    """
+    inicio, fin = a_utc(inicio), a_utc(fin)
+    if fin <= inicio:
+        raise ValueError("La fecha final debe ser posterior a la inicial")
+    if inicio.year < 1900 or fin.year > 2100:
+        raise ValueError("Las fechas deben estar entre 1900 y 2100")
+    if max_dias is not None and (fin - inicio).days > max_dias:
+        raise ValueError(f"El rango admite como máximo {max_dias} días")
+
+    cuerpos = list(PLANETAS_INDICES) if cuerpos is None else list(cuerpos)
+    if not cuerpos:
+        raise ValueError("Indique al menos un cuerpo")
+    desconocidos = [c for c in cuerpos if c not in PLANETAS_INDICES]
+    if desconocidos:
+        raise ValueError(f"Cuerpos desconocidos: {', '.join(desconocidos)}")
+
+    tipos = TIPOS_EVENTO if tipos is None else tuple(tipos)
+    desconocidos = [t for t in tipos if t not in TIPOS_EVENTO]
+    if desconocidos:
+        raise ValueError(f"Tipos de evento desconocidos: {', '.join(desconocidos)}")
+
+    nombres_aspectos = list(ASPECTOS_MAYORES) if aspectos is None else list(aspectos)
+    desconocidos = [a for a in nombres_aspectos if a not in ASPECTOS_MAYORES]
+    if desconocidos:
+        raise ValueError(f"Aspectos desconocidos: {', '.join(desconocidos)}")
+    angulos = {a: ASPECTOS_MAYORES[a] for a in nombres_aspectos}
+
+    efemerides = _Efemerides(dia_juliano_de_fecha(inicio), dia_juliano_de_fecha(fin))
+    eventos = []
+
+    if "ingresos" in tipos or "estaciones" in tipos:
+        for nombre in cuerpos:
+            eventos.extend(_buscar_planeta(efemerides, nombre, tipos))
+
+    if "aspectos" in tipos and angulos:
+        for i, nombre_a in enumerate(cuerpos):
+            for nombre_b in cuerpos[i + 1:]:
+                eventos.extend(_buscar_aspectos(efemerides, nombre_a, nombre_b, angulos))
+
+    eventos.sort(key=lambda e: e["dia_juliano"])
+    for evento in eventos:
+        evento["fecha"] = fecha_de_dia_juliano(evento["dia_juliano"]).strftime("%Y-%m-%dT%H:%M:%SZ")
+        evento["dia_juliano"] = round(evento["dia_juliano"], 6)
+
+    return {"eventos": eventos, "llamadas_efemerides": efemerides.llamadas}
@@ -0,0 +1,196 @@
+"""
+Formatos compactos de respuesta: JSON en columnas y MessagePack.
+
+El formato normal repite en cada cuerpo y cada cúspide las claves
+("grados_totales", "signo", "grados_en_signo") y el nombre del signo. En
+columnas cada dato es un array (una posición por cuerpo o por casa), los
+signos son índices en la tabla "signos" que va una vez por respuesta, y los
+grados dentro del signo no se envían (son longitud % 30).
+
+Se elige con ?format=json|columnas|msgpack o con la cabecera
+Accept: application/x-msgpack. MessagePack usa la misma estructura en
+columnas. Si están instalados, se codifica con orjson y msgpack; sin orjson
+se usa json de la biblioteca estándar y sin msgpack ese formato no está
+disponible (406).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from carta import SIGNOS, NOMBRES_CASAS, indices_signos
+
+FORMATOS = ("json", "columnas", "msgpack")
+
+TIPOS_MEDIO = {
+    "json": "application/json",
+    "columnas": "application/json",
+    "msgpack": "application/x-msgpack"
+}
+
+TIPOS_MSGPACK = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+VERSION_COLUMNAS = 1
+
+
+class FormatoNoDisponible(Exception):
+    """El formato pedido necesita una dependencia que no está instalada."""
+
+
+def elegir_formato(formato=None, accept=None):
+    """
+    Formato de la respuesta: el parámetro `format` si se da; si no, MessagePack
+    cuando la cabecera Accept lo pide y JSON normal en cualquier otro caso.
+    Lanza ValueError si el formato no existe y FormatoNoDisponible si falta msgpack.
+    """
+    if formato is None:
+        tipos = [t.split(";")[0].strip().lower() for t in (accept or "").split(",")]
+        formato = "msgpack" if any(t in TIPOS_MSGPACK for t in tipos) else "json"
+    formato = formato.lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato} (use {', '.join(FORMATOS)})")
+    if formato == "msgpack" and msgpack is None:
+        raise FormatoNoDisponible("MessagePack no está disponible en este servidor (falta el paquete msgpack)")
+    return formato
+
+
+def codificar(objeto, formato):
+    """Bytes de `objeto` en el formato dado ("json" y "columnas" son JSON)."""
+    if formato == "msgpack":
+        return msgpack.packb(objeto, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(objeto)
+    return json.dumps(objeto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _indice_signo(grados):
+    return int((grados % 360) // 30)
+
+
+def _columnas_posiciones(resultado):
+    """
+    Arrays de cuerpos, cúspides y ángulos de un resultado en el formato normal.
+    Lo que no se pidió (ver astral_calculator.CAMPOS) queda vacío o en None.
+    """
+    posiciones = resultado.get("posiciones_planetarias", {})
+    cuerpos = list(posiciones)
+    longitudes = [posiciones[c]["grados_totales"] for c in cuerpos]
+
+    casas = resultado.get("casas_astrologicas", {})
+    cuspides = [casas[c]["grados_totales"] if c in casas else None for c in NOMBRES_CASAS]
+
+    angulos = [resultado.get("ascendente", {}).get("grados_totales"),
+               resultado.get("medio_cielo", {}).get("grados_totales")]
+
+    return cuerpos, {
+        "longitudes": longitudes,
+        "signos_cuerpos": [_indice_signo(l) for l in longitudes],
+        "casas_cuerpos": [posiciones[c].get("casa") for c in cuerpos],
+        "cuspides": cuspides,
+        "signos_cuspides": [None if c is None else _indice_signo(c) for c in cuspides],
+        "angulos": angulos,
+        "signos_angulos": [None if a is None else _indice_signo(a) for a in angulos]
+    }
+
+
+def _redondear(valores):
+    return [None if v is None else round(v, 2) for v in valores]
+
+
+def _columnas_carta(carta):
+    """Los mismos arrays que _columnas_posiciones, leídos directamente de una Carta."""
+    longitudes = carta.longitudes.tolist()
+    if "casas" in carta.campos and carta.cuspides is not None:
+        cuspides = carta.cuspides.tolist()
+        signos_cuspides = indices_signos(carta.cuspides).tolist()
+    else:
+        cuspides = signos_cuspides = [None] * len(NOMBRES_CASAS)
+    angulos = [grados if campo in carta.campos else None
+               for campo, grados in (("ascendente", carta.ascendente), ("medio_cielo", carta.medio_cielo))]
+    return {
+        "longitudes": _redondear(longitudes),
+        "signos_cuerpos": carta.signos_cuerpos.tolist(),
+        "casas_cuerpos": ([None] * len(longitudes) if carta.casas_cuerpos is None
+                          else carta.casas_cuerpos.tolist()),
+        "cuspides": _redondear(cuspides),
+        "signos_cuspides": signos_cuspides,
+        "angulos": _redondear(angulos),
+        "signos_angulos": [None if a is None else _indice_signo(a) for a in angulos]
+    }
+
+
+def carta_en_columnas(carta, extra=None):
+    """
+    Una Carta en columnas, sin pasar por el formato normal. Las claves de
+    `extra` (p. ej. "aspectos") se añaden tal cual.
+    """
+    compacto = {
+        "formato": "columnas",
+        "version": VERSION_COLUMNAS,
+        "signos": SIGNOS,
+        "cuerpos": list(carta.cuerpos),
+        "lat": carta.lat,
+        "lng": carta.lng,
+        "nombre": carta.nombre,
+        "fecha_hora_calculo": carta.fecha_hora_calculo,
+        "ciudad": carta.ciudad
+    }
+    if carta.sistema_casas is not None:
+        compacto["sistema_casas"] = carta.sistema_casas
+    compacto["dia_juliano"] = round(carta.jd_ut, 2)
+    if carta.advertencias:
+        compacto["advertencias"] = carta.advertencias
+    if extra:
+        compacto.update(extra)
+    compacto.update(_columnas_carta(carta))
+    return compacto
+
+
+def lote_en_columnas(salida):
+    """
+    Salida de realizar_calculo_astral_lote en columnas: una fila por carta
+    calculada (en el orden de "indice") y los registros con error aparte.
+    Las filas con otros cuerpos que la primera (por una selección de
+    cuerpos) se indican en "cuerpos_por_fila".
+    """
+    compacto = {
+        "formato": "columnas",
+        "version": VERSION_COLUMNAS,
+        "signos": SIGNOS,
+        "total": len(salida),
+        "cuerpos": [],
+        "indice": [], "nombre": [], "fecha_hora_calculo": [], "ciudad": [],
+        "lat": [], "lng": [], "dia_juliano": [],
+        "longitudes": [], "signos_cuerpos": [], "casas_cuerpos": [],
+        "cuspides": [], "signos_cuspides": [], "angulos": [], "signos_angulos": [],
+        "advertencias": [],
+        "cuerpos_por_fila": [],
+        "errores": []
+    }
+    for registro in salida:
+        if "error" in registro:
+            compacto["errores"].append([registro["indice"], registro["error"]])
+            continue
+        resultado = registro["resultado"]
+        cuerpos, columnas = _columnas_posiciones(resultado)
+        if not compacto["indice"]:
+            compacto["cuerpos"] = cuerpos
+        elif cuerpos != compacto["cuerpos"]:
+            compacto["cuerpos_por_fila"].append([registro["indice"], cuerpos])
+        compacto["indice"].append(registro["indice"])
+        for clave in ("nombre", "fecha_hora_calculo", "ciudad", "dia_juliano"):
+            compacto[clave].append(resultado[clave])
+        compacto["lat"].append(resultado["coordenadas"]["lat"])
+        compacto["lng"].append(resultado["coordenadas"]["lng"])
+        for clave, valor in columnas.items():
+            compacto[clave].append(valor)
+        if "advertencias" in resultado:
+            compacto["advertencias"].append([registro["indice"], resultado["advertencias"]])
+    return compacto
@@ -0,0 +1,206 @@
+"""
+Renderizador de la carta astral en SVG, sin matplotlib.
+
+Dibuja la misma rueda que generador_carta_astral_visual.py (sectores de
+signos, cúspides, planetas, ASC/MC) escribiendo el SVG como texto. Toda la
+parte fija (círculos, sectores, símbolos y leyenda) se construye una sola
+vez al importar el módulo; por carta solo se formatean unas decenas de
+elementos, así que cuesta décimas de milisegundo. El cliente puede
+rasterizar el SVG al tamaño que necesite.
+"""
+import math
+from xml.sax.saxutils import escape
+
+from carta import como_carta
+from simbolos_carta import (
+    COLORES_SIGNOS, SIMBOLOS_SIGNOS, SIMBOLOS_PLANETAS, COLORES_PLANETAS, SIGNOS_ORDEN, etiquetas_cuerpos
+)
+
+# Escala: píxeles por unidad del dibujo (la rueda exterior tiene radio 1.3)
+ESCALA = 360.0
+ANCHO = 1200
+ALTO = 1300
+CENTRO_X = ANCHO / 2
+CENTRO_Y = 660.0
+
+# Puntos tipográficos de matplotlib a píxeles del lienzo (100 dpi)
+PUNTO = 100 / 72
+
+CASAS_ANGULARES = (1, 4, 7, 10)
+
+FUENTE = "DejaVu Sans, Arial, sans-serif"
+
+
+def _punto(radio, angulo_grados):
+    """Coordenadas SVG de un punto en polares (ángulo a la manera de matplotlib)."""
+    angulo = math.radians(angulo_grados)
+    return (CENTRO_X + radio * ESCALA * math.cos(angulo),
+            CENTRO_Y - radio * ESCALA * math.sin(angulo))
+
+
+def _angulo_ecliptico(grados):
+    """Ángulo de dibujo de una longitud eclíptica (0° Aries arriba, sentido horario)."""
+    return 90 - grados
+
+
+def _texto(x, y, contenido, tamano, color="black", negrita=False, ancla="middle"):
+    peso = ' font-weight="bold"' if negrita else ""
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-size="{tamano * PUNTO:.1f}" fill="{color}"'
+            f' text-anchor="{ancla}" dominant-baseline="central"{peso}>{escape(contenido)}</text>')
+
+
+def _caja_texto(x, y, lineas, tamano, fondo, borde="black", ancla="middle", negrita=False,
+                color="black", opacidad=0.8):
+    """Texto de una o varias líneas dentro de una caja redondeada (equivale al bbox de matplotlib)."""
+    alto_linea = tamano * PUNTO * 1.2
+    ancho = max(len(l) for l in lineas) * tamano * PUNTO * 0.6 + 2 * tamano * PUNTO * 0.5
+    alto = alto_linea * len(lineas) + tamano * PUNTO * 0.6
+    if ancla == "middle":
+        x0 = x - ancho / 2
+    elif ancla == "end":
+        x0 = x - ancho
+    else:
+        x0 = x
+    y0 = y - alto / 2
+    partes = [f'<rect x="{x0:.1f}" y="{y0:.1f}" width="{ancho:.1f}" height="{alto:.1f}" rx="{tamano * PUNTO * 0.4:.1f}"'
+              f' fill="{fondo}" fill-opacity="{opacidad}" stroke="{borde}"/>']
+    x_texto = {"middle": x0 + ancho / 2, "end": x0 + ancho - tamano * PUNTO * 0.5}.get(ancla, x0 + tamano * PUNTO * 0.5)
+    primera = y - alto_linea * (len(lineas) - 1) / 2
+    for i, linea in enumerate(lineas):
+        partes.append(_texto(x_texto, primera + i * alto_linea, linea, tamano, color, negrita, ancla))
+    return "".join(partes)
+
+
+def _circulo(radio, color, grosor):
+    return (f'<circle cx="{CENTRO_X:.1f}" cy="{CENTRO_Y:.1f}" r="{radio * ESCALA:.1f}"'
+            f' fill="none" stroke="{color}" stroke-width="{grosor * PUNTO:.2f}"/>')
+
+
+def _sector(radio_exterior, radio_interior, angulo_inicio, angulo_fin):
+    """Trayectoria de un sector de corona entre dos ángulos (angulo_fin < angulo_inicio)."""
+    x1, y1 = _punto(radio_exterior, angulo_inicio)
+    x2, y2 = _punto(radio_exterior, angulo_fin)
+    x3, y3 = _punto(radio_interior, angulo_fin)
+    x4, y4 = _punto(radio_interior, angulo_inicio)
+    re, ri = radio_exterior * ESCALA, radio_interior * ESCALA
+    # En SVG (eje y hacia abajo) ir de angulo_inicio a angulo_fin es sentido horario: sweep=1
+    return (f"M{x1:.1f},{y1:.1f} A{re:.1f},{re:.1f} 0 0 1 {x2:.1f},{y2:.1f} "
+            f"L{x3:.1f},{y3:.1f} A{ri:.1f},{ri:.1f} 0 0 0 {x4:.1f},{y4:.1f} Z")
+
+
+def _construir_fondo():
+    """Capa fija de la rueda, igual para todas las cartas."""
+    partes = [f'<rect width="{ANCHO}" height="{ALTO}" fill="white"/>']
+
+    for i, signo in enumerate(SIGNOS_ORDEN):
+        angulo_inicio = 90 - (i * 30)
+        angulo_fin = angulo_inicio - 30
+        partes.append(f'<path d="{_sector(1.1, 0.9, angulo_inicio, angulo_fin)}" fill="{COLORES_SIGNOS[signo]}"'
+                      f' fill-opacity="0.3" stroke="black" stroke-width="{PUNTO:.2f}"/>')
+
+        x, y = _punto(1.2, angulo_inicio - 15)
+        partes.append(_texto(x, y, SIMBOLOS_SIGNOS[signo], 16, COLORES_SIGNOS[signo], negrita=True))
+        x, y = _punto(1.0, angulo_inicio - 15)
+        partes.append(_texto(x, y, signo[:3], 10, negrita=True))
+
+    partes.append(_circulo(1.3, "black", 3))
+    partes.append(_circulo(1.1, "black", 2))
+    partes.append(_circulo(0.9, "gray", 1))
+    partes.append(_circulo(0.7, "lightgray", 1))
+
+    leyenda = ["Elementos:", "♈♌♐ Fuego (Rojo)", "♉♍♑ Tierra (Verde/Marrón)",
+               "♊♎♒ Aire (Amarillo/Azul)", "♋♏♓ Agua (Azul)"]
+    partes.append(_caja_texto(CENTRO_X + 1.4 * ESCALA, CENTRO_Y + 1.45 * ESCALA, leyenda, 9,
+                              "lightblue", ancla="end"))
+    return "".join(partes)
+
+
+# Geometría fija (sectores, símbolos, círculos y leyenda), calculada al importar
+FONDO_SVG = _construir_fondo()
+
+
+def _dibujar_casas(carta):
+    partes = []
+    if carta.cuspides is None:
+        return partes
+    for i, grados in enumerate(carta.cuspides.tolist(), start=1):
+        if not math.isfinite(grados):
+            continue
+        angulo = _angulo_ecliptico(grados)
+        x, y = _punto(0.9, angulo)
+        angular = i in CASAS_ANGULARES
+        partes.append(f'<line x1="{CENTRO_X:.1f}" y1="{CENTRO_Y:.1f}" x2="{x:.1f}" y2="{y:.1f}"'
+                      f' stroke="{"red" if angular else "gray"}" stroke-width="{(2 if angular else 1) * PUNTO:.2f}"'
+                      f' stroke-opacity="0.7"/>')
+        x, y = _punto(0.8, angulo)
+        partes.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{12 * PUNTO * 0.75:.1f}" fill="white"'
+                      f' fill-opacity="0.8" stroke="black"/>')
+        partes.append(_texto(x, y, str(i), 12, negrita=True))
+    return partes
+
+
+def _dibujar_planetas(carta):
+    partes = []
+    for planeta, grados, info in etiquetas_cuerpos(carta):
+        angulo = _angulo_ecliptico(grados)
+        color = COLORES_PLANETAS.get(planeta, "#000000")
+
+        x, y = _punto(0.6, angulo)
+        xb, yb = _punto(0.88, angulo)
+        partes.append(f'<line x1="{x:.1f}" y1="{y:.1f}" x2="{xb:.1f}" y2="{yb:.1f}"'
+                      f' stroke="{color}" stroke-opacity="0.5" stroke-width="{PUNTO:.2f}"/>')
+        partes.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{0.04 * ESCALA:.1f}" fill="{color}" stroke="black"/>')
+        partes.append(_texto(x, y, SIMBOLOS_PLANETAS.get(planeta, planeta[:2]), 12,
+                             "white" if planeta != "Sol" else "black", negrita=True))
+
+        x, y = _punto(1.35, angulo)
+        partes.append(_caja_texto(x, y, [planeta, info], 8, "white"))
+    return partes
+
+
+def _dibujar_angulos(carta):
+    partes = []
+    for grados, etiqueta, color in ((carta.ascendente, "ASC", "red"), (carta.medio_cielo, "MC", "blue")):
+        if grados is not None:
+            angulo = _angulo_ecliptico(grados)
+            x, y = _punto(1.1, angulo)
+            partes.append(f'<line x1="{CENTRO_X:.1f}" y1="{CENTRO_Y:.1f}" x2="{x:.1f}" y2="{y:.1f}"'
+                          f' stroke="{color}" stroke-opacity="0.8" stroke-width="{4 * PUNTO:.2f}"/>')
+            x, y = _punto(1.21, angulo)
+            partes.append(_caja_texto(x, y, [etiqueta], 12, "white", borde=color, color=color,
+                                      negrita=True, opacidad=1))
+    return partes
+
+
+def _dibujar_informacion(carta):
+    nombre = carta.nombre or "Carta Astral"
+    partes = [_texto(ANCHO / 2, 50, f"Carta Astral de {nombre}", 16, negrita=True)]
+
+    lineas = [f"Fecha: {carta.fecha_hora_calculo}", f"Lugar: {carta.ciudad}"]
+    if carta.lat is not None and carta.lng is not None:
+        lineas.append(f"Coordenadas: {carta.lat:.2f}°, {carta.lng:.2f}°")
+    partes.append(_caja_texto(CENTRO_X - 1.4 * ESCALA, CENTRO_Y + 1.38 * ESCALA, lineas, 10,
+                              "lightgray", ancla="start"))
+    return partes
+
+
+def renderizar_carta_svg(datos_carta, ancho=None, alto=None):
+    """
+    SVG (str) de la carta astral.
+
+    Args:
+        datos_carta: Carta (de calcular_carta) o resultado de realizar_calculo_astral
+        ancho, alto: Tamaño de salida en píxeles; por defecto el del lienzo.
+            El dibujo se escala con viewBox, así que no cambia el coste.
+    """
+    carta = como_carta(datos_carta)
+    ancho = ANCHO if ancho is None else ancho
+    alto = ALTO if alto is None else alto
+    partes = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}"'
+              f' viewBox="0 0 {ANCHO} {ALTO}" font-family="{FUENTE}">', FONDO_SVG]
+    partes.extend(_dibujar_casas(carta))
+    partes.extend(_dibujar_planetas(carta))
+    partes.extend(_dibujar_angulos(carta))
+    partes.extend(_dibujar_informacion(carta))
+    partes.append("</svg>")
+    return "".join(partes)
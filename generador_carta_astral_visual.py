@@ -1,74 +1,71 @@
+import io
+import math
+import os
+import threading
+
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import numpy as np
-import math
-from matplotlib.patches import FancyBboxPatch
-import matplotlib.font_manager as fm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
 
-def generar_carta_astral_imagen(datos_carta, archivo_salida="carta_astral.png", tamaño_figura=(12, 12)):
-    """
-    Genera una carta astral en formato imagen con la rueda zodiacal completa.
-    
-    Args:
-        datos_carta: Diccionario con los datos de la carta astral (del calculador completo)
-        archivo_salida: Nombre del archivo de imagen a generar
-        tamaño_figura: Tupla con el tamaño de la figura (ancho, alto)
-    """
-    
-    # Configuración inicial
-    fig, ax = plt.subplots(figsize=tamaño_figura, facecolor='white')
+from cache_lru import CacheLRU
+from carta import como_carta
+from simbolos_carta import (
+    COLORES_SIGNOS, SIMBOLOS_SIGNOS, SIMBOLOS_PLANETAS, COLORES_PLANETAS, SIGNOS_ORDEN, etiquetas_cuerpos
+)
+
+ELEMENTOS_TEXTO = "\n".join([
+    "Elementos:",
+    "♈♌♐ Fuego (Rojo)",
+    "♉♍♑ Tierra (Verde/Marrón)",
+    "♊♎♒ Aire (Amarillo/Azul)",
+    "♋♏♓ Agua (Azul)"
+])
+
+# Recuadros de información y leyenda: anclados por abajo en las esquinas
+# inferiores de la figura (coordenadas de figura), para que crezcan hacia
+# arriba y quepan enteros con cualquier tamaño; x coincide con ±1.4 del dibujo
+X_RECUADRO_IZQUIERDA, X_RECUADRO_DERECHA, Y_RECUADROS = 0.07, 0.93, 0.015
+
+# Posición fija de los ejes en las imágenes en memoria (deja sitio al título);
+# la capa estática cacheada y la dinámica deben coincidir píxel a píxel
+RECT_EJES = (0.04, 0.08, 0.92, 0.84)
+
+# Nivel zlib de los PNG servidos (0-9): 1 comprime casi igual que 6 y es
+# varias veces más rápido con imágenes de colores planos como esta
+COMPRESION_PNG = int(os.getenv("COMPRESION_PNG", "1"))
+
+
+# --- Capas de dibujo ---
+
+def _preparar_ejes(ax):
     ax.set_xlim(-1.5, 1.5)
     ax.set_ylim(-1.5, 1.5)
     ax.set_aspect('equal')
     ax.axis('off')
-    
-    # Colores zodiacales tradicionales
-    colores_signos = {
-        "Aries": "#FF4500", "Tauro": "#228B22", "Géminis": "#FFD700",
-        "Cáncer": "#4169E1", "Leo": "#FF8C00", "Virgo": "#8B4513",
-        "Libra": "#FFB6C1", "Escorpio": "#8B0000", "Sagitario": "#9932CC",
-        "Capricornio": "#2F4F4F", "Acuario": "#00CED1", "Piscis": "#20B2AA"
-    }
-    
-    # Símbolos zodiacales (Unicode)
-    simbolos_signos = {
-        "Aries": "♈", "Tauro": "♉", "Géminis": "♊",
-        "Cáncer": "♋", "Leo": "♌", "Virgo": "♍",
-        "Libra": "♎", "Escorpio": "♏", "Sagitario": "♐",
-        "Capricornio": "♑", "Acuario": "♒", "Piscis": "♓"
-    }
-    
-    # Símbolos planetarios
-    simbolos_planetas = {
-        "Sol": "☉", "Luna": "☽", "Mercurio": "☿",
-        "Venus": "♀", "Marte": "♂", "Júpiter": "♃",
-        "Saturno": "♄", "Urano": "♅", "Neptuno": "♆", "Plutón": "♇"
-    }
-    
-    signos_orden = ["Aries", "Tauro", "Géminis", "Cáncer", "Leo", "Virgo",
-                   "Libra", "Escorpio", "Sagitario", "Capricornio", "Acuario", "Piscis"]
-    
+
+
+def _dibujar_rueda(ax):
+    """
+    Capa estática: círculos, sectores de signos con sus símbolos y nombres,
+    y la leyenda de elementos. Es igual para todas las cartas.
+    """
     # 1. DIBUJAR CÍRCULOS CONCÉNTRICOS
     
     # Círculo exterior (borde)
-    circulo_exterior = plt.Circle((0, 0), 1.3, fill=False, color='black', linewidth=3)
-    ax.add_patch(circulo_exterior)
-    
+    ax.add_patch(patches.Circle((0, 0), 1.3, fill=False, color='black', linewidth=3))
     # Círculo de signos zodiacales
-    circulo_signos = plt.Circle((0, 0), 1.1, fill=False, color='black', linewidth=2)
-    ax.add_patch(circulo_signos)
-    
+    ax.add_patch(patches.Circle((0, 0), 1.1, fill=False, color='black', linewidth=2))
     # Círculo de casas
-    circulo_casas = plt.Circle((0, 0), 0.9, fill=False, color='gray', linewidth=1)
-    ax.add_patch(circulo_casas)
-    
+    ax.add_patch(patches.Circle((0, 0), 0.9, fill=False, color='gray', linewidth=1))
     # Círculo interior (planetas)
-    circulo_interior = plt.Circle((0, 0), 0.7, fill=False, color='lightgray', linewidth=1)
-    ax.add_patch(circulo_interior)
+    ax.add_patch(patches.Circle((0, 0), 0.7, fill=False, color='lightgray', linewidth=1))
     
     # 2. DIBUJAR SECTORES DE SIGNOS ZODIACALES
     
-    for i, signo in enumerate(signos_orden):
+    for i, signo in enumerate(SIGNOS_ORDEN):
         # Ángulo inicial (Aries empieza en 0°, pero en matplotlib 0° está a la derecha)
         # En astrología, Aries está en la izquierda, así que rotamos
         angulo_inicio = 90 - (i * 30)  # Empezar en 90° y ir en sentido horario
@@ -76,7 +73,7 @@ def generar_carta_astral_imagen(datos_carta, archivo_salida="carta_astral.png",
         
         # Crear sector del signo
         wedge = patches.Wedge((0, 0), 1.1, angulo_fin, angulo_inicio, 
-                             width=0.2, facecolor=colores_signos[signo], 
+                             width=0.2, facecolor=COLORES_SIGNOS[signo], 
                              alpha=0.3, edgecolor='black', linewidth=1)
         ax.add_patch(wedge)
         
@@ -85,9 +82,9 @@ def generar_carta_astral_imagen(datos_carta, archivo_salida="carta_astral.png",
         x_simbolo = 1.2 * math.cos(angulo_medio)
         y_simbolo = 1.2 * math.sin(angulo_medio)
         
-        ax.text(x_simbolo, y_simbolo, simbolos_signos[signo], 
+        ax.text(x_simbolo, y_simbolo, SIMBOLOS_SIGNOS[signo], 
                fontsize=16, ha='center', va='center', 
-               color=colores_signos[signo], fontweight='bold')
+               color=COLORES_SIGNOS[signo], fontweight='bold')
         
         # Añadir nombre del signo
         x_nombre = 1.0 * math.cos(angulo_medio)
@@ -97,180 +94,223 @@ def generar_carta_astral_imagen(datos_carta, archivo_salida="carta_astral.png",
                fontsize=10, ha='center', va='center', 
                color='black', fontweight='bold')
     
-    # 3. DIBUJAR LÍNEAS DE CASAS
-    
-    if "casas_astrologicas" in datos_carta:
-        casas = datos_carta["casas_astrologicas"]
-        
-        for i in range(1, 13):
-            casa_nombre = f"Casa {i}"
-            if casa_nombre in casas:
-                grados_casa = casas[casa_nombre]["grados_totales"]
-                
-                # Convertir grados astrológicos a ángulo matplotlib
-                # En astrología: 0° = Aries (izquierda), en matplotlib 0° = derecha
-                angulo_matplotlib = 90 - grados_casa
-                angulo_rad = math.radians(angulo_matplotlib)
-                
-                # Línea desde el centro hasta el círculo de casas
-                x_fin = 0.9 * math.cos(angulo_rad)
-                y_fin = 0.9 * math.sin(angulo_rad)
-                
-                # Línea más gruesa para casas angulares (1, 4, 7, 10)
-                grosor = 2 if i in [1, 4, 7, 10] else 1
-                color = 'red' if i in [1, 4, 7, 10] else 'gray'
-                
-                ax.plot([0, x_fin], [0, y_fin], color=color, linewidth=grosor, alpha=0.7)
-                
-                # Número de casa
-                x_num = 0.8 * math.cos(angulo_rad)
-                y_num = 0.8 * math.sin(angulo_rad)
-                
-                ax.text(x_num, y_num, str(i), 
-                       fontsize=12, ha='center', va='center', 
-                       color='black', fontweight='bold',
-                       bbox=dict(boxstyle="circle,pad=0.1", facecolor='white', alpha=0.8))
-    
-    # 4. DIBUJAR PLANETAS
-    
-    if "posiciones_planetarias" in datos_carta:
-        planetas = datos_carta["posiciones_planetarias"]
-        
-        # Agrupar planetas por proximidad para evitar superposición
-        posiciones_planetas = []
-        for planeta, datos in planetas.items():
-            grados = datos["grados_totales"]
-            posiciones_planetas.append((planeta, grados, datos))
-        
-        # Ordenar por grados
-        posiciones_planetas.sort(key=lambda x: x[1])
-        
-        # Dibujar cada planeta
-        for i, (planeta, grados, datos) in enumerate(posiciones_planetas):
-            # Convertir a ángulo matplotlib
-            angulo_matplotlib = 90 - grados
+    # Leyenda de elementos
+    ax.figure.text(X_RECUADRO_DERECHA, Y_RECUADROS, ELEMENTOS_TEXTO, fontsize=9, va='bottom', ha='right',
+           bbox=dict(boxstyle="round,pad=0.5", facecolor='lightblue', alpha=0.8))
+
+
+def _dibujar_casas(ax, carta):
+    """3. Líneas y números de las casas."""
+    if carta.cuspides is None:
+        return
+    
+    for i, grados_casa in enumerate(carta.cuspides.tolist(), start=1):
+        if math.isfinite(grados_casa):
+            # Convertir grados astrológicos a ángulo matplotlib
+            # En astrología: 0° = Aries (izquierda), en matplotlib 0° = derecha
+            angulo_matplotlib = 90 - grados_casa
             angulo_rad = math.radians(angulo_matplotlib)
             
-            # Calcular posición (con pequeño offset para evitar superposición)
-            radio_planeta = 0.6
-            offset_angular = 0  # Podríamos añadir lógica para separar planetas cercanos
+            # Línea desde el centro hasta el círculo de casas
+            x_fin = 0.9 * math.cos(angulo_rad)
+            y_fin = 0.9 * math.sin(angulo_rad)
             
-            x_planeta = radio_planeta * math.cos(angulo_rad + math.radians(offset_angular))
-            y_planeta = radio_planeta * math.sin(angulo_rad + math.radians(offset_angular))
+            # Línea más gruesa para casas angulares (1, 4, 7, 10)
+            grosor = 2 if i in [1, 4, 7, 10] else 1
+            color = 'red' if i in [1, 4, 7, 10] else 'gray'
             
-            # Color del planeta
-            colores_planetas = {
-                "Sol": "#FFD700", "Luna": "#C0C0C0", "Mercurio": "#FFA500",
-                "Venus": "#FF69B4", "Marte": "#FF4500", "Júpiter": "#4169E1",
-                "Saturno": "#8B4513", "Urano": "#00CED1", "Neptuno": "#4682B4", "Plutón": "#8B008B"
-            }
-            
-            color_planeta = colores_planetas.get(planeta, '#000000')
+            ax.plot([0, x_fin], [0, y_fin], color=color, linewidth=grosor, alpha=0.7)
             
-            # Círculo del planeta
-            circulo_planeta = plt.Circle((x_planeta, y_planeta), 0.04, 
-                                       facecolor=color_planeta, edgecolor='black', linewidth=1)
-            ax.add_patch(circulo_planeta)
+            # Número de casa
+            x_num = 0.8 * math.cos(angulo_rad)
+            y_num = 0.8 * math.sin(angulo_rad)
             
-            # Símbolo del planeta
-            simbolo = simbolos_planetas.get(planeta, planeta[:2])
-            ax.text(x_planeta, y_planeta, simbolo, 
+            ax.text(x_num, y_num, str(i), 
                    fontsize=12, ha='center', va='center', 
-                   color='white' if planeta != 'Sol' else 'black', fontweight='bold')
-            
-            # Línea desde el planeta al borde (aspecto)
-            x_borde = 0.88 * math.cos(angulo_rad)
-            y_borde = 0.88 * math.sin(angulo_rad)
-            
-            ax.plot([x_planeta, x_borde], [y_planeta, y_borde], 
-                   color=color_planeta, linewidth=1, alpha=0.5)
-            
-            # Información del planeta (grados y signo)
-            info_planeta = f"{datos['signo'][:3]} {datos['grados_en_signo']:.0f}°"
-            if 'casa' in datos:
-                info_planeta += f" C{datos['casa']}"
-            
-            # Posición del texto (fuera del círculo)
-            x_texto = 1.35 * math.cos(angulo_rad)
-            y_texto = 1.35 * math.sin(angulo_rad)
-            
-            ax.text(x_texto, y_texto, f"{planeta}\n{info_planeta}", 
-                   fontsize=8, ha='center', va='center', 
-                   bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
-    
-    # 5. MARCAR ASCENDENTE Y MEDIO CIELO
-    
-    if "ascendente" in datos_carta and datos_carta["ascendente"]:
-        asc_grados = datos_carta["ascendente"]["grados_totales"]
-        angulo_asc = math.radians(90 - asc_grados)
+                   color='black', fontweight='bold',
+                   bbox=dict(boxstyle="circle,pad=0.1", facecolor='white', alpha=0.8))
+
+
+def _dibujar_planetas(ax, carta):
+    """4. Planetas con su símbolo, línea al borde y etiqueta de signo y casa."""
+    for planeta, grados, info_planeta in etiquetas_cuerpos(carta):
+        # Convertir a ángulo matplotlib
+        angulo_rad = math.radians(90 - grados)
         
-        # Línea del Ascendente (más gruesa)
-        x_asc = 1.1 * math.cos(angulo_asc)
-        y_asc = 1.1 * math.sin(angulo_asc)
+        radio_planeta = 0.6
+        x_planeta = radio_planeta * math.cos(angulo_rad)
+        y_planeta = radio_planeta * math.sin(angulo_rad)
         
-        ax.plot([0, x_asc], [0, y_asc], color='red', linewidth=4, alpha=0.8)
-        ax.text(x_asc * 1.1, y_asc * 1.1, 'ASC', 
-               fontsize=12, ha='center', va='center', 
-               color='red', fontweight='bold',
-               bbox=dict(boxstyle="round,pad=0.2", facecolor='white', edgecolor='red'))
-    
-    if "medio_cielo" in datos_carta and datos_carta["medio_cielo"]:
-        mc_grados = datos_carta["medio_cielo"]["grados_totales"]
-        angulo_mc = math.radians(90 - mc_grados)
+        color_planeta = COLORES_PLANETAS.get(planeta, '#000000')
         
-        # Línea del Medio Cielo
-        x_mc = 1.1 * math.cos(angulo_mc)
-        y_mc = 1.1 * math.sin(angulo_mc)
+        # Círculo del planeta
+        ax.add_patch(patches.Circle((x_planeta, y_planeta), 0.04, 
+                                    facecolor=color_planeta, edgecolor='black', linewidth=1))
         
-        ax.plot([0, x_mc], [0, y_mc], color='blue', linewidth=4, alpha=0.8)
-        ax.text(x_mc * 1.1, y_mc * 1.1, 'MC', 
+        # Símbolo del planeta
+        simbolo = SIMBOLOS_PLANETAS.get(planeta, planeta[:2])
+        ax.text(x_planeta, y_planeta, simbolo, 
                fontsize=12, ha='center', va='center', 
-               color='blue', fontweight='bold',
-               bbox=dict(boxstyle="round,pad=0.2", facecolor='white', edgecolor='blue'))
-    
-    # 6. INFORMACIÓN GENERAL
-    
-    # Título
-    nombre = datos_carta.get("nombre", "Carta Astral")
-    fecha = datos_carta.get("fecha_hora_calculo", "")
-    ciudad = datos_carta.get("ciudad", "")
+               color='white' if planeta != 'Sol' else 'black', fontweight='bold')
+        
+        # Línea desde el planeta al borde (aspecto)
+        x_borde = 0.88 * math.cos(angulo_rad)
+        y_borde = 0.88 * math.sin(angulo_rad)
+        
+        ax.plot([x_planeta, x_borde], [y_planeta, y_borde], 
+               color=color_planeta, linewidth=1, alpha=0.5)
+        
+        # Posición del texto (fuera del círculo)
+        x_texto = 1.35 * math.cos(angulo_rad)
+        y_texto = 1.35 * math.sin(angulo_rad)
+        
+        ax.text(x_texto, y_texto, f"{planeta}\n{info_planeta}", 
+               fontsize=8, ha='center', va='center', 
+               bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
+
+
+def _dibujar_angulos(ax, carta):
+    """5. Ascendente y Medio Cielo."""
+    for grados, etiqueta, color in ((carta.ascendente, "ASC", "red"), (carta.medio_cielo, "MC", "blue")):
+        if grados is not None:
+            angulo = math.radians(90 - grados)
+            
+            x = 1.1 * math.cos(angulo)
+            y = 1.1 * math.sin(angulo)
+            
+            ax.plot([0, x], [0, y], color=color, linewidth=4, alpha=0.8)
+            ax.text(x * 1.1, y * 1.1, etiqueta, 
+                   fontsize=12, ha='center', va='center', 
+                   color=color, fontweight='bold',
+                   bbox=dict(boxstyle="round,pad=0.2", facecolor='white', edgecolor=color))
+
+
+def _dibujar_informacion(fig, ax, carta):
+    """6. Título, fecha, lugar y coordenadas."""
+    nombre = carta.nombre or "Carta Astral"
     
-    plt.suptitle(f"Carta Astral de {nombre}", fontsize=16, fontweight='bold', y=0.95)
+    fig.suptitle(f"Carta Astral de {nombre}", fontsize=16, fontweight='bold', y=0.95)
     
-    # Información adicional
-    info_texto = f"Fecha: {fecha}\nLugar: {ciudad}"
-    if "coordenadas" in datos_carta:
-        lat = datos_carta["coordenadas"]["lat"]
-        lng = datos_carta["coordenadas"]["lng"]
-        info_texto += f"\nCoordenadas: {lat:.2f}°, {lng:.2f}°"
+    info_texto = f"Fecha: {carta.fecha_hora_calculo}\nLugar: {carta.ciudad}"
+    if carta.lat is not None and carta.lng is not None:
+        info_texto += f"\nCoordenadas: {carta.lat:.2f}°, {carta.lng:.2f}°"
     
-    ax.text(-1.4, -1.3, info_texto, fontsize=10, va='top', ha='left',
+    fig.text(X_RECUADRO_IZQUIERDA, Y_RECUADROS, info_texto, fontsize=10, va='bottom', ha='left',
            bbox=dict(boxstyle="round,pad=0.5", facecolor='lightgray', alpha=0.8))
+
+
+def _dibujar_capa_carta(fig, ax, carta):
+    """Todo lo que depende de la carta: casas, planetas, ángulos e información."""
+    _dibujar_casas(ax, carta)
+    _dibujar_planetas(ax, carta)
+    _dibujar_angulos(ax, carta)
+    _dibujar_informacion(fig, ax, carta)
+
+
+def generar_carta_astral_imagen(datos_carta, archivo_salida="carta_astral.png", tamaño_figura=(12, 12),
+                                dpi=300, mostrar=True):
+    """
+    Genera una carta astral en formato imagen con la rueda zodiacal completa.
     
-    # Leyenda de elementos
-    elementos_texto = """
-    Elementos:
-    ♈♌♐ Fuego (Rojo)
-    ♉♍♑ Tierra (Verde/Marrón)  
-    ♊♎♒ Aire (Amarillo/Azul)
-    ♋♏♓ Agua (Azul)
+    Args:
+        datos_carta: Carta (de calcular_carta) o diccionario con los datos de la
+            carta astral (del calculador completo)
+        archivo_salida: Nombre del archivo de imagen a generar
+        tamaño_figura: Tupla con el tamaño de la figura (ancho, alto)
+        dpi: Resolución de la imagen guardada
+        mostrar: Si es True, abre la ventana de matplotlib al terminar
     """
     
-    ax.text(1.4, -1.3, elementos_texto, fontsize=9, va='top', ha='right',
-           bbox=dict(boxstyle="round,pad=0.5", facecolor='lightblue', alpha=0.8))
+    # Configuración inicial
+    fig, ax = plt.subplots(figsize=tamaño_figura, facecolor='white')
+    _preparar_ejes(ax)
+    
+    _dibujar_rueda(ax)
+    _dibujar_capa_carta(fig, ax, como_carta(datos_carta))
     
     # 7. GUARDAR IMAGEN
     
     plt.tight_layout()
-    plt.savefig(archivo_salida, dpi=300, bbox_inches='tight', 
+    plt.savefig(archivo_salida, dpi=dpi, bbox_inches='tight', 
                facecolor='white', edgecolor='none')
-    plt.show()
+    if mostrar:
+        plt.show()
     
     print(f"✅ Carta astral guardada como: {archivo_salida}")
     
     return fig, ax
 
 
+# --- Renderizado en memoria (API) ---
+
+# Fondos ya dibujados, por (tamaño, dpi); el lock evita dibujar dos veces el mismo
+fondos_rueda = CacheLRU(int(os.getenv("FONDOS_RUEDA_TAMANO", "16")))
+_fondos_lock = threading.Lock()
+
+
+def _nueva_figura(tamaño_figura, dpi):
+    """Figura independiente de pyplot (sin estado global) con los ejes en RECT_EJES."""
+    fig = Figure(figsize=tamaño_figura, dpi=dpi, facecolor='white')
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes(RECT_EJES)
+    _preparar_ejes(ax)
+    return fig, ax
+
+
+def fondo_rueda(tamaño_figura, dpi):
+    """
+    Píxeles RGB de la capa estática (rueda zodiacal) para un tamaño y dpi,
+    como float32 listos para componer. Se dibuja una sola vez por
+    combinación y se reutiliza en cada petición.
+    """
+    clave = (tuple(tamaño_figura), dpi)
+    fondo = fondos_rueda.obtener(clave)
+    if fondo is None:
+        with _fondos_lock:
+            fondo = fondos_rueda.obtener(clave)
+            if fondo is None:
+                fig, ax = _nueva_figura(tamaño_figura, dpi)
+                _dibujar_rueda(ax)
+                fig.canvas.draw()
+                fondo = np.asarray(fig.canvas.buffer_rgba())[..., :3].astype(np.float32)
+                fondo.setflags(write=False)
+                fondos_rueda.guardar(clave, fondo)
+    return fondo
+
+
+def renderizar_carta_rgb(datos_carta, tamaño_figura=(12, 12), dpi=100):
+    """
+    Píxeles RGB (uint8, alto x ancho x 3) de la carta.
+    Solo se rasteriza la capa de la carta, sobre fondo transparente, y se
+    compone con la rueda cacheada: out = capa * alfa + fondo * (1 - alfa).
+    `datos_carta` es una Carta (o un diccionario del formato de la API).
+    """
+    fondo = fondo_rueda(tamaño_figura, dpi)
+    fig, ax = _nueva_figura(tamaño_figura, dpi)
+    fig.patch.set_alpha(0.0)
+    ax.patch.set_visible(False)
+    
+    _dibujar_capa_carta(fig, ax, como_carta(datos_carta))
+    fig.canvas.draw()
+    
+    capa = np.asarray(fig.canvas.buffer_rgba())
+    alfa = capa[..., 3:].astype(np.float32) * (1.0 / 255.0)
+    compuesta = fondo + (capa[..., :3] - fondo) * alfa
+    return (compuesta + 0.5).astype(np.uint8)
+
+
+def renderizar_carta_png(datos_carta, tamaño_figura=(12, 12), dpi=100, compresion=COMPRESION_PNG):
+    """
+    Renderiza la carta directamente a bytes PNG, sin tocar el disco.
+    La rueda zodiacal sale de la caché de fondos; solo se dibujan las
+    casas, los planetas y las etiquetas de esta carta encima.
+    """
+    pixeles = renderizar_carta_rgb(datos_carta, tamaño_figura, dpi)
+    buffer = io.BytesIO()
+    Image.fromarray(pixeles).save(buffer, format="PNG", compress_level=compresion, dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
 # FUNCIÓN DE EJEMPLO PARA PROBAR
 def ejemplo_uso():
     """
@@ -0,0 +1,206 @@
+"""
+Métricas del servicio en formato de texto de Prometheus, sin dependencias.
+
+Histogramas (duraciones), contadores y medidores con etiquetas. Registrar
+una observación cuesta un bisect y una suma bajo un lock, así que se puede
+usar en el camino caliente del cálculo. `exponer()` genera el texto que
+sirve el endpoint /metrics.
+
+Las métricas son de cada proceso: con CALCULO_MODO=procesos, las etapas
+internas del cálculo se registran en los procesos trabajadores y /metrics
+solo muestra las del servidor (peticiones, colas, renderizado en memoria).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Límites (segundos) por defecto de los histogramas de duración:
+# de 10 µs (una etapa del cálculo) a 10 s (una imagen grande)
+LIMITES_DURACION = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_registro = []
+_registro_lock = threading.Lock()
+
+
+def _registrar(metrica):
+    with _registro_lock:
+        if any(m.nombre == metrica.nombre for m in _registro):
+            raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+        _registro.append(metrica)
+    return metrica
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _clave(self, valores):
+        if set(valores) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre} espera las etiquetas {', '.join(self.etiquetas)}")
+        return tuple(str(valores[e]) for e in self.etiquetas)
+
+    def _cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Contador monótono (p. ej. veces que se usa cada método de casas)."""
+    tipo = "counter"
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        return self._series.get(self._clave(etiquetas), 0)
+
+    def exponer(self):
+        lineas = self._cabecera()
+        with self._lock:
+            series = sorted(self._series.items())
+        for clave, valor in series:
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histograma(_Metrica):
+    """Histograma acumulativo con límites fijos, como los de Prometheus."""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        posicion = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # [cuentas por intervalo (+Inf al final), suma, total]
+                serie = self._series[clave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """Observa la duración (segundos) del bloque `with`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def exponer(self):
+        lineas = self._cabecera()
+        with self._lock:
+            series = sorted((clave, (list(s[0]), s[1], s[2])) for clave, s in self._series.items())
+        for clave, (cuentas, suma, total) in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (float("inf"),), cuentas):
+                acumulado += cuenta
+                le = _formatear_etiquetas(self.etiquetas, clave, f'le="{_numero(float(limite))}"')
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+
+class Medidor(_Metrica):
+    """
+    Valor instantáneo que se lee al exponer (p. ej. profundidad de una cola).
+    `funcion` devuelve un número, o un dict {tupla de valores de etiquetas: número}.
+    """
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def exponer(self):
+        lineas = self._cabecera()
+        try:
+            valores = self.funcion()
+        except Exception as e:
+            print(f"ERROR leyendo la métrica {self.nombre}: {e}")
+            return lineas
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        for clave, valor in sorted(valores.items()):
+            if valor is not None:
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+def contador(nombre, ayuda, etiquetas=()):
+    return _registrar(Contador(nombre, ayuda, etiquetas))
+
+
+def histograma(nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+    return _registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+
+def medidor(nombre, ayuda, funcion, etiquetas=()):
+    return _registrar(Medidor(nombre, ayuda, funcion, etiquetas))
+
+
+def exponer():
+    """Todas las métricas registradas, en formato de texto de Prometheus 0.0.4."""
+    with _registro_lock:
+        metricas = list(_registro)
+    lineas = []
+    for metrica in metricas:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+# --- Métricas del cálculo (se registran aquí para que cualquier módulo las use) ---
+
+DURACION_ETAPAS = histograma(
+    "carta_calculo_etapa_segundos",
+    "Duración de cada etapa del cálculo de una carta (calcular_carta y Carta.a_dict)",
+    ("etapa",)
+)
+
+DURACION_CASAS = histograma(
+    "carta_casas_intento_segundos",
+    "Duración de cada intento de cálculo de casas, por motor",
+    ("metodo",)
+)
+
+INTENTOS_CASAS = contador(
+    "carta_casas_intentos_total",
+    "Intentos de cálculo de casas por motor (ver motores_casas) y resultado",
+    ("metodo", "resultado")
+)
@@ -0,0 +1,129 @@
+"""
+Motores de cálculo de casas, elegidos una vez al arrancar.
+
+Según la versión de pyswisseph, swe.houses acepta el sistema de casas como
+bytes (b"P"), como texto ("P") o ninguno de los dos. Antes se probaba en
+cada carta, pagando una o dos excepciones por petición en las versiones
+donde la primera forma falla. Ahora detectar_motor_casas() prueba los
+motores en orden de precisión con una carta de referencia y se queda con el
+primero que funciona; las cartas solo llaman a ese motor.
+
+Cada motor declara su precisión:
+- "exacta": swe.houses (cúspides de Swiss Ephemeris, cualquier sistema).
+- "aproximada": fórmula manual con el tiempo sidéreo; el Ascendente y el
+  Medio Cielo son aproximados y Placidus y Koch se sustituyen por casas
+  iguales.
+
+Sistemas admitidos (código de Swiss Ephemeris): ver SISTEMAS_CASAS.
+"""
+import math
+import os
+from abc import ABC, abstractmethod
+
+import swisseph as swe
+
+SISTEMAS_CASAS = {
+    "P": "Placidus",
+    "K": "Koch",
+    "W": "Signos enteros",
+    "E": "Casas iguales"
+}
+
+# Carta de referencia para probar los motores (J2000, Madrid)
+_JD_PRUEBA = 2451545.0
+_LAT_PRUEBA, _LNG_PRUEBA = 40.4165, -3.7026
+
+
+class MotorCasas(ABC):
+    """
+    Interfaz de un motor de casas. calcular() devuelve (cúspides de las
+    casas 1 a 12, Ascendente, Medio Cielo) en grados, o lanza una excepción
+    si no hay solución (p. ej. Placidus o Koch en los círculos polares).
+    """
+    nombre = ""
+    precision = ""
+
+    @abstractmethod
+    def calcular(self, jd_ut, lat, lng, sistema):
+        ...
+
+    def describir(self):
+        return {"nombre": self.nombre, "precision": self.precision, "sistemas": list(SISTEMAS_CASAS)}
+
+
+class MotorSwissEphemeris(MotorCasas):
+    """swe.houses con el sistema como bytes (pyswisseph 2.x)."""
+    nombre = "swisseph"
+    precision = "exacta"
+
+    def calcular(self, jd_ut, lat, lng, sistema):
+        cuspides, ascmc = swe.houses(jd_ut, lat, lng, sistema.encode())
+        return list(cuspides[:12]), ascmc[0], ascmc[1]
+
+
+class MotorSwissEphemerisTexto(MotorCasas):
+    """swe.houses con el sistema como texto (versiones antiguas de pyswisseph)."""
+    nombre = "swisseph_texto"
+    precision = "exacta"
+
+    def calcular(self, jd_ut, lat, lng, sistema):
+        cuspides, ascmc = swe.houses(jd_ut, lat, lng, sistema)
+        return list(cuspides[:12]), ascmc[0], ascmc[1]
+
+
+class MotorAproximado(MotorCasas):
+    """
+    Aproximación con el tiempo sidéreo local, sin swe.houses. Casas iguales
+    desde el Ascendente (o signos enteros con "W"); no falla en ninguna latitud.
+    """
+    nombre = "aproximado"
+    precision = "aproximada"
+
+    def calcular(self, jd_ut, lat, lng, sistema):
+        # Tiempo sidéreo local (aproximado)
+        local_sidt = (swe.sidtime(jd_ut) + lng / 15.0) % 24.0
+        lat_rad = math.radians(lat)
+        lst_rad = math.radians(local_sidt * 15.0)
+
+        ascendente = math.degrees(math.atan2(-math.cos(lst_rad), math.sin(lst_rad) * math.cos(lat_rad))) % 360
+        medio_cielo = (local_sidt * 15.0) % 360
+
+        primera = ascendente - ascendente % 30 if sistema == "W" else ascendente
+        cuspides = [(primera + i * 30) % 360 for i in range(12)]
+        return cuspides, ascendente, medio_cielo
+
+
+MOTORES_CASAS = {
+    motor.nombre: motor
+    for motor in (MotorSwissEphemeris(), MotorSwissEphemerisTexto(), MotorAproximado())
+}
+
+motor_aproximado = MOTORES_CASAS["aproximado"]
+
+
+def _funciona(motor):
+    try:
+        cuspides, ascendente, medio_cielo = motor.calcular(_JD_PRUEBA, _LAT_PRUEBA, _LNG_PRUEBA, "P")
+    except Exception:
+        return False
+    return len(cuspides) == 12 and all(math.isfinite(v) for v in cuspides + [ascendente, medio_cielo])
+
+
+def detectar_motor_casas(preferido=None):
+    """
+    El primer motor que calcula bien la carta de referencia, del más al menos
+    preciso. Con `preferido` (o MOTOR_CASAS) se fuerza uno; si no funciona se
+    lanza ValueError.
+    """
+    preferido = preferido or os.getenv("MOTOR_CASAS")
+    if preferido:
+        if preferido not in MOTORES_CASAS:
+            raise ValueError(f"Motor de casas desconocido: {preferido} (use {', '.join(MOTORES_CASAS)})")
+        if not _funciona(MOTORES_CASAS[preferido]):
+            raise ValueError(f"El motor de casas '{preferido}' no funciona en esta instalación")
+        return MOTORES_CASAS[preferido]
+    for motor in MOTORES_CASAS.values():
+        if _funciona(motor):
+            return motor
+    # La aproximación solo usa swe.sidtime; si ni eso funciona no hay nada que hacer
+    raise RuntimeError("Ningún motor de casas funciona en esta instalación")
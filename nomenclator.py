@@ -0,0 +1,375 @@
+"""
+Nomenclátor de ciudades sin conexión: de nombre a coordenadas y al revés.
+
+Se genera una vez a partir de un fichero de GeoNames (cities15000.txt,
+allCountries.txt o la muestra de datos/) y se abre con np.memmap, igual que
+la tabla de efemérides: arrancar no copia datos y todos los workers que
+abren el mismo fichero comparten las páginas del sistema operativo.
+
+El fichero contiene:
+- Las ciudades (lat, lng, población y texto "nombre\\tpaís\\tzona horaria"),
+  ordenadas por celda de 1° x 1° para la búsqueda por cercanía; un array de
+  inicios de celda permite leer solo las celdas alrededor de un punto.
+- Las claves de búsqueda (nombre, nombre ASCII y nombres alternativos,
+  normalizados: sin tildes, en minúsculas y sin signos), de ancho fijo y
+  ordenadas, para buscar prefijos con np.searchsorted.
+
+Uso (generación offline):
+    python nomenclator.py --entrada cities15000.txt --salida datos/nomenclator.bin
+"""
+import argparse
+import math
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+RUTA_FUENTE = os.getenv("NOMENCLATOR_FUENTE", os.path.join("datos", "ciudades_muestra.tsv"))
+RUTA_NOMENCLATOR = os.getenv("NOMENCLATOR_RUTA", os.path.join("datos", "nomenclator.bin"))
+
+MAGIA = b"CARTANM1"
+VERSION = 1
+
+# Bytes de cada clave; las más largas se truncan (la búsqueda también)
+ANCHO_CLAVE = 40
+
+# Celdas de 1° x 1°: 180 filas de latitud por 360 columnas de longitud
+FILAS_CELDAS = 180
+COLUMNAS_CELDAS = 360
+
+RADIO_TIERRA_KM = 6371.0088
+
+_CABECERA = np.dtype([
+    ("magia", "S8"),
+    ("version", "<u4"),
+    ("n_ciudades", "<u4"),
+    ("n_claves", "<u4"),
+    ("bytes_texto", "<u4"),
+    ("desplazamiento_ciudades", "<i8"),
+    ("desplazamiento_celdas", "<i8"),
+    ("desplazamiento_claves", "<i8"),
+    ("desplazamiento_texto", "<i8"),
+])
+
+_CIUDAD = np.dtype([
+    ("lat", "<f8"),
+    ("lng", "<f8"),
+    ("poblacion", "<i8"),
+    ("texto", "<u4"),
+    ("longitud_texto", "<u4"),
+])
+
+_CLAVE = np.dtype([
+    ("clave", f"S{ANCHO_CLAVE}"),
+    ("ciudad", "<u4"),
+])
+
+# Columnas del formato de GeoNames que se usan
+_COL_NOMBRE, _COL_ASCII, _COL_ALTERNATIVOS = 1, 2, 3
+_COL_LAT, _COL_LNG, _COL_PAIS, _COL_POBLACION, _COL_ZONA = 4, 5, 8, 14, 17
+
+_NO_ALFANUMERICO = re.compile(r"[\W_]+")
+
+
+def normalizar_nombre(texto):
+    """'Saint-Étienne' -> 'saint etienne': sin tildes, minúsculas, sin signos."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(" ", sin_tildes.casefold()).strip()
+
+
+def _clave_bytes(texto):
+    """Clave normalizada en UTF-8, truncada a ANCHO_CLAVE sin partir un carácter."""
+    clave = normalizar_nombre(texto).encode("utf-8")[:ANCHO_CLAVE]
+    return clave.decode("utf-8", "ignore").encode("utf-8")
+
+
+def _celdas(latitudes, longitudes):
+    """Índice de celda de 1° x 1° de cada punto."""
+    fila = np.clip(np.floor(np.asarray(latitudes) + 90.0), 0, FILAS_CELDAS - 1).astype(np.int64)
+    columna = np.floor(np.asarray(longitudes) + 180.0).astype(np.int64) % COLUMNAS_CELDAS
+    return fila * COLUMNAS_CELDAS + columna
+
+
+# --- Generación (offline) ---
+
+def leer_geonames(ruta, poblacion_minima=0):
+    """
+    Lee un fichero de GeoNames (separado por tabuladores). Se ignoran las
+    líneas vacías o que empiezan por '#'. Devuelve una lista de diccionarios.
+    """
+    ciudades = []
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            if not linea.strip() or linea.startswith("#"):
+                continue
+            columnas = linea.rstrip("\n").split("\t")
+            if len(columnas) <= _COL_ZONA:
+                raise ValueError(f"{ruta}:{numero}: se esperaban al menos {_COL_ZONA + 1} columnas")
+            poblacion = int(columnas[_COL_POBLACION] or 0)
+            if poblacion < poblacion_minima:
+                continue
+            ciudades.append({
+                "nombre": columnas[_COL_NOMBRE],
+                "nombres": [columnas[_COL_NOMBRE], columnas[_COL_ASCII]]
+                           + [n for n in columnas[_COL_ALTERNATIVOS].split(",") if n],
+                "lat": float(columnas[_COL_LAT]),
+                "lng": float(columnas[_COL_LNG]),
+                "pais": columnas[_COL_PAIS],
+                "poblacion": poblacion,
+                "zona_horaria": columnas[_COL_ZONA]
+            })
+    return ciudades
+
+
+def generar_nomenclator(ruta_entrada=RUTA_FUENTE, ruta_salida=RUTA_NOMENCLATOR, poblacion_minima=0):
+    """
+    Genera el fichero binario del nomenclátor a partir de un fichero de GeoNames.
+    Devuelve (número de ciudades, número de claves).
+    """
+    ciudades = leer_geonames(ruta_entrada, poblacion_minima)
+    if not ciudades:
+        raise ValueError(f"'{ruta_entrada}' no contiene ciudades")
+
+    # Ordenar por celda (y por población descendente dentro de la celda)
+    celdas = _celdas([c["lat"] for c in ciudades], [c["lng"] for c in ciudades])
+    orden = sorted(range(len(ciudades)), key=lambda i: (celdas[i], -ciudades[i]["poblacion"]))
+    ciudades = [ciudades[i] for i in orden]
+    celdas = celdas[orden]
+
+    registros = np.zeros(len(ciudades), dtype=_CIUDAD)
+    texto = bytearray()
+    claves = []
+    for i, ciudad in enumerate(ciudades):
+        contenido = f"{ciudad['nombre']}\t{ciudad['pais']}\t{ciudad['zona_horaria']}".encode("utf-8")
+        registros[i] = (ciudad["lat"], ciudad["lng"], ciudad["poblacion"], len(texto), len(contenido))
+        texto += contenido
+        for clave in {_clave_bytes(n) for n in ciudad["nombres"]}:
+            if clave:
+                claves.append((clave, -ciudad["poblacion"], i))
+
+    # A igual clave, primero la ciudad más poblada
+    claves.sort()
+    tabla_claves = np.zeros(len(claves), dtype=_CLAVE)
+    tabla_claves["clave"] = [c[0] for c in claves]
+    tabla_claves["ciudad"] = [c[2] for c in claves]
+
+    inicios_celdas = np.searchsorted(celdas, np.arange(FILAS_CELDAS * COLUMNAS_CELDAS + 1)).astype("<u4")
+
+    cabecera = np.zeros(1, dtype=_CABECERA)
+    desplazamiento_ciudades = _CABECERA.itemsize
+    desplazamiento_celdas = desplazamiento_ciudades + registros.nbytes
+    desplazamiento_claves = desplazamiento_celdas + inicios_celdas.nbytes
+    desplazamiento_texto = desplazamiento_claves + tabla_claves.nbytes
+    cabecera[0] = (MAGIA, VERSION, len(registros), len(tabla_claves), len(texto),
+                   desplazamiento_ciudades, desplazamiento_celdas, desplazamiento_claves, desplazamiento_texto)
+
+    directorio = os.path.dirname(ruta_salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    # Temporal por proceso: varios workers pueden generarlo a la vez al arrancar
+    temporal = f"{ruta_salida}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        for bloque in (cabecera, registros, inicios_celdas, tabla_claves):
+            f.write(bloque.tobytes())
+        f.write(bytes(texto))
+    os.replace(temporal, ruta_salida)
+
+    return len(registros), len(tabla_claves)
+
+
+# --- Carga y consultas ---
+
+class Nomenclator:
+    """
+    Nomenclátor mapeado en memoria (solo lectura, sin copias).
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._mapa = np.memmap(ruta, dtype=np.uint8, mode="r")
+
+        cabecera = np.ndarray((), dtype=_CABECERA, buffer=self._mapa, offset=0)
+        if bytes(cabecera["magia"]) != MAGIA or int(cabecera["version"]) != VERSION:
+            raise ValueError(f"'{ruta}' no es un nomenclátor válido")
+
+        self._ciudades = np.ndarray((int(cabecera["n_ciudades"]),), dtype=_CIUDAD, buffer=self._mapa,
+                                    offset=int(cabecera["desplazamiento_ciudades"]))
+        self._inicios_celdas = np.ndarray((FILAS_CELDAS * COLUMNAS_CELDAS + 1,), dtype="<u4", buffer=self._mapa,
+                                          offset=int(cabecera["desplazamiento_celdas"]))
+        self._claves = np.ndarray((int(cabecera["n_claves"]),), dtype=_CLAVE, buffer=self._mapa,
+                                  offset=int(cabecera["desplazamiento_claves"]))
+        self._texto = self._mapa[int(cabecera["desplazamiento_texto"]):
+                                 int(cabecera["desplazamiento_texto"]) + int(cabecera["bytes_texto"])]
+        self._lat = self._ciudades["lat"]
+        self._lng = self._ciudades["lng"]
+        self._poblacion = self._ciudades["poblacion"]
+        self._claves_ordenadas = self._claves["clave"]
+        self._ciudad_de_clave = self._claves["ciudad"]
+
+    def __len__(self):
+        return len(self._ciudades)
+
+    def ciudad(self, indice, distancia_km=None):
+        """Datos de la ciudad `indice` como diccionario."""
+        registro = self._ciudades[indice]
+        inicio = int(registro["texto"])
+        nombre, pais, zona = bytes(self._texto[inicio:inicio + int(registro["longitud_texto"])]).decode("utf-8").split("\t")
+        resultado = {
+            "nombre": nombre,
+            "pais": pais,
+            "lat": float(registro["lat"]),
+            "lng": float(registro["lng"]),
+            "poblacion": int(registro["poblacion"]),
+            "zona_horaria": zona
+        }
+        if distancia_km is not None:
+            resultado["distancia_km"] = round(distancia_km, 3)
+        return resultado
+
+    def _rango_prefijo(self, prefijo):
+        """Posiciones [desde, hasta) de las claves que empiezan por `prefijo` (bytes)."""
+        desde = int(np.searchsorted(self._claves_ordenadas, prefijo, side="left"))
+        if len(prefijo) == ANCHO_CLAVE:
+            return desde, int(np.searchsorted(self._claves_ordenadas, prefijo, side="right"))
+        # Ningún carácter UTF-8 contiene el byte 0xff
+        hasta = int(np.searchsorted(self._claves_ordenadas, prefijo + b"\xff", side="left"))
+        return desde, hasta
+
+    def buscar(self, texto, limite=10, pais=None):
+        """
+        Ciudades cuyo nombre (o alguno de sus nombres alternativos) empieza por
+        `texto`, de más a menos poblada. `pais` filtra por código ISO (p. ej. "ES").
+        """
+        prefijo = _clave_bytes(texto)
+        if not prefijo or limite <= 0:
+            return []
+        desde, hasta = self._rango_prefijo(prefijo)
+        if desde == hasta:
+            return []
+        indices = np.unique(self._ciudad_de_clave[desde:hasta])
+        indices = indices[np.argsort(-self._poblacion[indices], kind="stable")]
+
+        resultados = []
+        for indice in indices.tolist():
+            ciudad = self.ciudad(indice)
+            if pais is None or ciudad["pais"] == pais.upper():
+                resultados.append(ciudad)
+                if len(resultados) == limite:
+                    break
+        return resultados
+
+    def resolver(self, texto):
+        """
+        La ciudad más poblada cuyo nombre coincide exactamente con `texto`.
+        Admite "Ciudad, PAÍS" con el código ISO del país ("Mérida, VE"). Si
+        ninguna es de ese país, las dos letras pueden ser un estado o
+        provincia ("Springfield, IL", "Washington, DC") y se devuelve la más
+        poblada de ese nombre. Devuelve None si no hay ninguna.
+        """
+        pais = None
+        nombre, separador, resto = texto.rpartition(",")
+        if separador and len(resto.strip()) == 2 and resto.strip().isalpha():
+            texto, pais = nombre, resto.strip().upper()
+        clave = _clave_bytes(texto)
+        if not clave:
+            return None
+        desde = int(np.searchsorted(self._claves_ordenadas, clave, side="left"))
+        hasta = int(np.searchsorted(self._claves_ordenadas, clave, side="right"))
+        # Las claves iguales ya están ordenadas por población descendente
+        indices = self._ciudad_de_clave[desde:hasta].tolist()
+        if not indices:
+            return None
+        if pais is not None:
+            for indice in indices:
+                ciudad = self.ciudad(indice)
+                if ciudad["pais"] == pais:
+                    return ciudad
+        return self.ciudad(indices[0])
+
+    def _candidatos(self, lat, lng, radio):
+        """Índices de las ciudades de las celdas que cubren el círculo de `radio` grados."""
+        fila_min = max(0, int(math.floor(lat - radio + 90.0)))
+        fila_max = min(FILAS_CELDAS - 1, int(math.floor(lat + radio + 90.0)))
+        # Máxima diferencia de longitud dentro del círculo
+        if radio >= 90.0 - abs(lat):
+            semiancho = 180.0
+        else:
+            semiancho = math.degrees(math.asin(min(1.0, math.sin(math.radians(radio)) / math.cos(math.radians(lat)))))
+        if semiancho >= 180.0:
+            columnas = [(0, COLUMNAS_CELDAS - 1)]
+        else:
+            col_min = int(math.floor(lng - semiancho + 180.0))
+            col_max = int(math.floor(lng + semiancho + 180.0))
+            if col_min < 0:
+                columnas = [(col_min % COLUMNAS_CELDAS, COLUMNAS_CELDAS - 1), (0, col_max)]
+            elif col_max >= COLUMNAS_CELDAS:
+                columnas = [(col_min, COLUMNAS_CELDAS - 1), (0, col_max % COLUMNAS_CELDAS)]
+            else:
+                columnas = [(col_min, col_max)]
+
+        tramos = []
+        for fila in range(fila_min, fila_max + 1):
+            base = fila * COLUMNAS_CELDAS
+            for col_min, col_max in columnas:
+                desde = int(self._inicios_celdas[base + col_min])
+                hasta = int(self._inicios_celdas[base + col_max + 1])
+                if hasta > desde:
+                    tramos.append(np.arange(desde, hasta))
+        return np.concatenate(tramos) if tramos else np.empty(0, dtype=np.int64)
+
+    def cercana(self, lat, lng):
+        """
+        Ciudad más cercana a (lat, lng) por distancia de círculo máximo.
+        Busca en las celdas de un círculo de 1° y lo dobla hasta encontrarla.
+        """
+        if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+            raise ValueError("Coordenadas fuera de rango")
+        if len(self._ciudades) == 0:
+            return None
+        radio = 1.0
+        while True:
+            indices = self._candidatos(lat, lng, radio)
+            if len(indices):
+                # Fórmula del haversine, en grados
+                phi1, phi2 = math.radians(lat), np.radians(self._lat[indices])
+                a = (np.sin((phi2 - phi1) / 2) ** 2
+                     + math.cos(phi1) * np.cos(phi2) * np.sin(np.radians(self._lng[indices] - lng) / 2) ** 2)
+                distancias = np.degrees(2 * np.arcsin(np.sqrt(np.minimum(a, 1.0))))
+                mejor = int(np.argmin(distancias))
+                # Solo es seguro si está dentro del círculo: fuera puede haber otra más cerca
+                if distancias[mejor] <= radio or radio >= 180.0:
+                    return self.ciudad(int(indices[mejor]), math.radians(distancias[mejor]) * RADIO_TIERRA_KM)
+            radio = min(180.0, radio * 2)
+
+
+_nomenclators_cargados = {}
+
+
+def cargar_nomenclator(ruta=RUTA_NOMENCLATOR, ruta_fuente=RUTA_FUENTE):
+    """
+    Abre (una sola vez por proceso) el nomenclátor de `ruta`. Si no existe y
+    hay fichero fuente, lo genera antes. Lanza FileNotFoundError si no hay
+    ninguno de los dos y ValueError si el fichero no es válido.
+    """
+    ruta = os.path.abspath(ruta)
+    if ruta not in _nomenclators_cargados:
+        if not os.path.exists(ruta):
+            if not ruta_fuente or not os.path.exists(ruta_fuente):
+                raise FileNotFoundError(f"No existe el nomenclátor '{ruta}' ni el fichero fuente '{ruta_fuente}'")
+            generar_nomenclator(ruta_fuente, ruta)
+        _nomenclators_cargados[ruta] = Nomenclator(ruta)
+    return _nomenclators_cargados[ruta]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera el nomenclátor de ciudades")
+    parser.add_argument("--entrada", default=RUTA_FUENTE, help="fichero de GeoNames (separado por tabuladores)")
+    parser.add_argument("--salida", default=RUTA_NOMENCLATOR, help="fichero binario de salida")
+    parser.add_argument("--poblacion-minima", type=int, default=0, help="descartar ciudades con menos habitantes")
+    args = parser.parse_args()
+
+    n_ciudades, n_claves = generar_nomenclator(args.entrada, args.salida, args.poblacion_minima)
+    print(f"✓ Nomenclátor guardado en {args.salida}: {n_ciudades} ciudades, {n_claves} claves "
+          f"({os.path.getsize(args.salida)} bytes)")
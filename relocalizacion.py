@@ -0,0 +1,149 @@
+"""
+Mapa de relocalización: Ascendente, Medio Cielo y casas de un mismo
+instante en muchos lugares.
+
+Los planetas, el tiempo sidéreo y la oblicuidad solo dependen del instante,
+así que se calculan una vez. Por lugar solo queda la parte local:
+ARMC = tiempo sidéreo de Greenwich + longitud, y con él
+- ASC y MC con fórmulas cerradas, vectorizadas sobre todos los puntos;
+- las 12 cúspides con swe.houses_armc (idéntico a swe.houses, pero sin
+  recalcular tiempo sidéreo ni nutación en cada punto).
+Un mapa mundial de 1° x 1° (65k puntos) cuesta unos 20 ms sin casas y entre
+medio segundo y un segundo y medio con casas, según la máquina (una llamada
+a swe.houses_armc por lugar), en lugar de 65k llamadas a
+realizar_calculo_astral. Las casas usan el sistema pedido (sistema_casas),
+como /carta-astral.
+"""
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import swisseph as swe
+
+from astral_calculator import (
+    SISTEMA_CASAS, NOMBRES_CASAS, _validar_datos,
+    calcular_posiciones_planetarias, casas_de_planetas, formatear_signo
+)
+
+
+def rejilla_puntos(lat_min, lat_max, lng_min, lng_max, paso, max_puntos=None):
+    """
+    Latitudes y longitudes (arrays planos) de una rejilla regular, extremos incluidos.
+    Si la rejilla da la vuelta completa en longitud, -180 y 180 se cuentan una vez.
+    Lanza ValueError si la rejilla tendría más de `max_puntos` puntos.
+    """
+    if paso <= 0:
+        raise ValueError("El paso de la rejilla debe ser positivo")
+    if lat_min > lat_max or lng_min > lng_max:
+        raise ValueError("Los mínimos de la rejilla no pueden superar a los máximos")
+    filas = int((lat_max - lat_min) / paso + 1e-9) + 1
+    columnas = int((lng_max - lng_min) / paso + 1e-9) + 1
+    if max_puntos is not None and filas * columnas > max_puntos:
+        raise ValueError(f"La rejilla tendría {filas * columnas} puntos (máximo {max_puntos})")
+    latitudes = lat_min + paso * np.arange(filas)
+    longitudes = lng_min + paso * np.arange(columnas)
+    if len(longitudes) > 1 and math.isclose(longitudes[-1] - longitudes[0], 360.0):
+        longitudes = longitudes[:-1]
+    malla_lat, malla_lng = np.meshgrid(latitudes, longitudes, indexing="ij")
+    return malla_lat.ravel(), malla_lng.ravel()
+
+
+def angulos_vectorizados(armc, latitudes, oblicuidad):
+    """
+    Ascendente y Medio Cielo (grados) para arrays de ARMC y latitud.
+    MC = atan2(sen ARMC, cos ARMC · cos ε)
+    ASC = atan2(cos ARMC, -(sen ARMC · cos ε + tan φ · sen ε))
+    """
+    armc = np.radians(armc)
+    eps = math.radians(oblicuidad)
+    phi = np.radians(latitudes)
+    mc = np.degrees(np.arctan2(np.sin(armc), np.cos(armc) * math.cos(eps))) % 360.0
+    asc = np.degrees(np.arctan2(
+        np.cos(armc), -(np.sin(armc) * math.cos(eps) + np.tan(phi) * math.sin(eps))
+    )) % 360.0
+    return asc, mc
+
+
+def calcular_relocalizacion(data, latitudes, longitudes, incluir_casas=True):
+    """
+    ASC, MC y casas de un instante en cada lugar.
+
+    Args:
+        data: Objeto con anio, mes, dia, hora, minuto (UT) y, opcionalmente,
+            sistema_casas (código de Swiss Ephemeris, como en la carta)
+        latitudes, longitudes: Secuencias de la misma longitud
+        incluir_casas: Si es False solo se calculan ASC y MC (todo vectorizado)
+
+    Devuelve un diccionario en columnas (una lista por campo, un valor por
+    lugar) con las posiciones planetarias formateadas una sola vez. En los
+    lugares donde el sistema no tiene solución (Placidus y Koch en los
+    círculos polares) las casas son iguales desde el Ascendente y el índice
+    aparece en "aproximadas".
+    """
+    sistema = getattr(data, "sistema_casas", SISTEMA_CASAS)
+    _validar_datos(SimpleNamespace(anio=data.anio, mes=data.mes, dia=data.dia, hora=data.hora,
+                                   minuto=data.minuto, lat=0.0, lng=0.0, sistema_casas=sistema))
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    if latitudes.shape != longitudes.shape or latitudes.ndim != 1:
+        raise ValueError("Latitudes y longitudes deben ser listas de la misma longitud")
+    if ((latitudes < -90) | (latitudes > 90)).any():
+        raise ValueError("Latitud debe estar entre -90 y 90")
+    if ((longitudes < -180) | (longitudes > 180)).any():
+        raise ValueError("Longitud debe estar entre -180 y 180")
+
+    # --- Una vez por instante ---
+    jd_ut = swe.julday(data.anio, data.mes, data.dia, data.hora + data.minuto / 60.0)
+    posiciones, errores = calcular_posiciones_planetarias(jd_ut)
+    oblicuidad = swe.calc_ut(jd_ut, swe.ECL_NUT)[0][0]
+    armc_greenwich = swe.sidtime(jd_ut) * 15.0
+
+    # --- Por lugar ---
+    armc = (armc_greenwich + longitudes) % 360.0
+    ascendentes, medios_cielos = angulos_vectorizados(armc, latitudes, oblicuidad)
+
+    resultado = {
+        "fecha_hora_calculo": f"{data.dia:02d}/{data.mes:02d}/{data.anio} {data.hora:02d}:{data.minuto:02d}",
+        "dia_juliano": round(jd_ut, 2),
+        "posiciones_planetarias": {p: formatear_signo(g) for p, g in posiciones.items()},
+        "lat": latitudes.tolist(),
+        "lng": longitudes.tolist()
+    }
+
+    if incluir_casas:
+        cuspides = np.empty((len(latitudes), 12))
+        codigo = sistema.encode()
+        aproximadas = []
+        for i, (a, lat) in enumerate(zip(armc.tolist(), latitudes.tolist())):
+            try:
+                casas, ascmc = swe.houses_armc(a, lat, oblicuidad, codigo)
+                cuspides[i] = casas[:12]
+                ascendentes[i], medios_cielos[i] = ascmc[0], ascmc[1]
+            except swe.Error:
+                aproximadas.append(i)
+        if aproximadas:
+            indices = np.array(aproximadas)
+            cuspides[indices] = (ascendentes[indices, None] + 30.0 * np.arange(12)) % 360.0
+
+        nombres_planetas = list(posiciones)
+        longitudes_planetas = np.broadcast_to(
+            np.array([posiciones[p] for p in nombres_planetas]), (len(latitudes), len(nombres_planetas))
+        )
+        casas_planetas = casas_de_planetas(longitudes_planetas, cuspides)
+
+        resultado["casas"] = {
+            nombre: np.round(cuspides[:, i], 2).tolist() for i, nombre in enumerate(NOMBRES_CASAS)
+        }
+        resultado["casas_planetas"] = {
+            planeta: casas_planetas[:, j].tolist() for j, planeta in enumerate(nombres_planetas)
+        }
+        resultado["aproximadas"] = aproximadas
+        if aproximadas:
+            errores.append(f"{len(aproximadas)} lugares sin solución {sistema}: casas iguales desde el Ascendente")
+        resultado["sistema_casas"] = sistema
+
+    resultado["ascendente"] = np.round(ascendentes, 2).tolist()
+    resultado["medio_cielo"] = np.round(medios_cielos, 2).tolist()
+    if errores:
+        resultado["advertencias"] = errores
+    return resultado
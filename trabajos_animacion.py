@@ -0,0 +1,354 @@
+"""
+Trabajos en segundo plano para las animaciones de tránsitos.
+
+Una animación de cientos de fotogramas tarda segundos o minutos: no cabe en
+una petición. POST /transitos/animacion encola el trabajo y contesta al
+momento con su id; el cliente consulta GET /transitos/animacion/{id} hasta
+que el fichero está listo.
+
+- Los trabajos corren en un pool de procesos propio (ANIMACION_TRABAJADORES),
+  separado del de renderizado para que una animación larga no retrase las
+  imágenes. Cada proceso configura swisseph y el motor de efemérides al
+  arrancar, como el ejecutor de cálculo en modo "procesos".
+- El estado de los trabajos está en una tabla SQLite (modo WAL) dentro de
+  ANIMACIONES_DIR, junto a los ficheros, y no en la memoria de cada worker
+  de uvicorn: cualquier worker contesta la consulta de un trabajo encolado
+  por otro, y la cola se limita en toda la máquina.
+- La cola está acotada: con ANIMACION_TRABAJADORES + ANIMACION_COLA_MAX
+  trabajos pendientes se rechaza el nuevo con ColaAnimacionesLlena (503 con
+  Retry-After). Un trabajo pendiente que no termina en ANIMACION_CADUCIDAD
+  segundos (su worker se reinició) se da por fallido.
+- Cada animación se escribe en ANIMACIONES_DIR como "<id>.part" y se
+  renombra al terminar: nunca se sirve un fichero a medias.
+- Se recuerdan ANIMACIONES_MAX_TRABAJOS trabajos; al pasar de ahí se
+  olvidan los terminados más antiguos y se borran sus ficheros, salvo los
+  consultados en los últimos PROTECCION_DESCARGA segundos (pueden estar
+  descargándose).
+"""
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from metricas import histograma
+from trabajadores_render import percentil
+
+# --- Configuración (variables de entorno) ---
+# Procesos que generan animaciones (0 = un hilo del propio proceso)
+ANIMACION_TRABAJADORES = int(os.getenv("ANIMACION_TRABAJADORES", "1"))
+# Trabajos que pueden esperar además de los que están en curso
+ANIMACION_COLA_MAX = int(os.getenv("ANIMACION_COLA_MAX", "16"))
+# Directorio de los ficheros generados y de la tabla de trabajos
+ANIMACIONES_DIR = os.getenv("ANIMACIONES_DIR", os.path.join(tempfile.gettempdir(), "animaciones_carta"))
+# Trabajos (y ficheros) que se conservan
+ANIMACIONES_MAX_TRABAJOS = int(os.getenv("ANIMACIONES_MAX_TRABAJOS", "100"))
+# Segundos tras los que un trabajo pendiente se da por abandonado
+ANIMACION_CADUCIDAD = float(os.getenv("ANIMACION_CADUCIDAD", "3600"))
+
+# Un fichero consultado hace menos de estos segundos no se borra
+PROTECCION_DESCARGA = 300
+
+# Duraciones recientes que se usan para estimar Retry-After
+MUESTRAS_DURACION = 100
+
+PENDIENTES = ("en_cola", "en_curso")
+TERMINADOS = ("terminado", "error")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    formato TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    fotogramas INTEGER NOT NULL,
+    segundos REAL,
+    error TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    ultimo_acceso REAL
+);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado);
+CREATE INDEX IF NOT EXISTS trabajos_creado ON trabajos (creado);
+"""
+
+
+DURACION_ANIMACION = histograma(
+    "carta_animacion_segundos",
+    "Duración de la generación de una animación de tránsitos",
+    ("formato",)
+)
+
+
+class ColaAnimacionesLlena(Exception):
+    """No caben más animaciones en espera."""
+
+    def __init__(self, reintentar_en):
+        super().__init__("La cola de animaciones está llena")
+        self.reintentar_en = reintentar_en
+
+
+def _conectar(ruta_db):
+    conexion = sqlite3.connect(ruta_db, timeout=30, isolation_level=None, check_same_thread=False)
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    return conexion
+
+
+def _actualizar(conexion, id_trabajo, **campos):
+    campos["actualizado"] = time.time()
+    columnas = ", ".join(f"{columna} = ?" for columna in campos)
+    conexion.execute(f"UPDATE trabajos SET {columnas} WHERE id = ?", (*campos.values(), id_trabajo))
+
+
+def _iniciar_trabajador(ruta_ephe, motor, ruta_tabla):
+    """Inicializador de cada proceso: backend sin pantalla y estado de swisseph."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from ejecutor_calculo import _iniciar_trabajador as iniciar_calculo
+    iniciar_calculo(ruta_ephe, motor, ruta_tabla)
+
+
+def _generar(ruta_db, id_trabajo, ruta, carta, inicio, paso, filas, cuerpos, formato, tamaño_figura, dpi, fps):
+    """
+    Trabajo que corre en el trabajador: marca el trabajo "en_curso", escribe
+    la animación en "<ruta>.part" y la renombra a `ruta` al terminar.
+    Devuelve (fotogramas, segundos).
+    """
+    from animacion_transitos import generar_animacion_transitos
+    conexion = _conectar(ruta_db)
+    try:
+        _actualizar(conexion, id_trabajo, estado="en_curso")
+    finally:
+        conexion.close()
+
+    inicio_trabajo = time.perf_counter()
+    parcial = ruta + ".part"
+    try:
+        fotogramas = generar_animacion_transitos(carta, inicio, paso, filas, cuerpos, parcial, formato,
+                                                 tamaño_figura, dpi, fps)
+        os.replace(parcial, ruta)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    return fotogramas, time.perf_counter() - inicio_trabajo
+
+
+class GestorAnimaciones:
+    """
+    Cola acotada de trabajos de animación, con el estado compartido en SQLite.
+
+    Args:
+        trabajadores: Número de procesos (0 = un hilo del proceso actual)
+        cola_max: Trabajos en espera admitidos además de los que están en curso
+        directorio: Donde se escriben las animaciones y la tabla de trabajos
+        max_trabajos: Trabajos que se recuerdan (los terminados más antiguos se borran)
+        caducidad: Segundos tras los que un trabajo pendiente se da por abandonado
+        ruta_ephe, motor, ruta_tabla: Estado que cada proceso configura al arrancar
+    """
+
+    def __init__(self, trabajadores=ANIMACION_TRABAJADORES, cola_max=ANIMACION_COLA_MAX,
+                 directorio=ANIMACIONES_DIR, max_trabajos=ANIMACIONES_MAX_TRABAJOS, caducidad=ANIMACION_CADUCIDAD,
+                 ruta_ephe="ephe", motor="swisseph", ruta_tabla=None):
+        if trabajadores < 0 or cola_max < 0:
+            raise ValueError("El número de trabajadores y el tamaño de la cola no pueden ser negativos")
+        if max_trabajos < 1:
+            raise ValueError("El número máximo de trabajos debe ser positivo")
+        self.trabajadores = trabajadores
+        self.cola_max = cola_max
+        self.directorio = directorio
+        self.max_trabajos = max_trabajos
+        self.caducidad = caducidad
+        self.ruta_db = os.path.join(directorio, "trabajos.sqlite3")
+        self._estado_procesos = (ruta_ephe, motor, ruta_tabla)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.completados = 0
+        self.rechazados = 0
+        self.errores = 0
+
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self._conectar()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(_ESQUEMA)
+
+    def _conectar(self):
+        """Conexión del hilo actual."""
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = _conectar(self.ruta_db)
+            self._local.conexion = conexion
+        return conexion
+
+    def _obtener_pool(self):
+        # Se crea en el primer uso; "spawn" evita heredar hilos y locks del servidor
+        if self._pool is None:
+            if self.trabajadores == 0:
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="animacion")
+            else:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.trabajadores,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_iniciar_trabajador,
+                    initargs=self._estado_procesos
+                )
+        return self._pool
+
+    def _ruta(self, id_trabajo, formato):
+        return os.path.join(self.directorio, f"{id_trabajo}.{formato}")
+
+    def encolar(self, carta, inicio, paso, filas, cuerpos, formato="gif", tamaño_figura=(6, 6), dpi=100, fps=10):
+        """
+        Encola la animación de los tránsitos sobre `carta` (ver
+        animacion_transitos.generar_animacion_transitos) y devuelve el id del
+        trabajo. Lanza ColaAnimacionesLlena si no hay sitio.
+        """
+        from animacion_transitos import comprobar_formato
+        comprobar_formato(formato)
+
+        id_trabajo = uuid.uuid4().hex
+        ahora = time.time()
+        conexion = self._conectar()
+        # Comprobar la cola e insertar en la misma transacción: dos workers no
+        # pueden ocupar a la vez el último hueco
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'error', error = 'Trabajo abandonado', actualizado = ? "
+                "WHERE estado IN (?, ?) AND creado < ?", (ahora, *PENDIENTES, ahora - self.caducidad)
+            )
+            pendientes = conexion.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado IN (?, ?)", PENDIENTES
+            ).fetchone()[0]
+            if pendientes >= max(1, self.trabajadores) + self.cola_max:
+                conexion.execute("ROLLBACK")
+                with self._lock:
+                    self.rechazados += 1
+                raise ColaAnimacionesLlena(self._estimar_espera(pendientes))
+            conexion.execute(
+                "INSERT INTO trabajos (id, formato, estado, fotogramas, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?)",
+                (id_trabajo, formato, "en_cola", filas, ahora, ahora)
+            )
+            olvidados = self._olvidar_antiguos(conexion, ahora)
+            conexion.execute("COMMIT")
+        except ColaAnimacionesLlena:
+            raise
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        for id_olvidado, formato_olvidado in olvidados:
+            try:
+                os.remove(self._ruta(id_olvidado, formato_olvidado))
+            except FileNotFoundError:
+                pass
+
+        try:
+            with self._lock:
+                pool = self._obtener_pool()
+            futuro = pool.submit(_generar, self.ruta_db, id_trabajo, self._ruta(id_trabajo, formato), carta,
+                                 inicio, paso, filas, dict(cuerpos), formato, tuple(tamaño_figura), dpi, fps)
+        except Exception as e:
+            _actualizar(conexion, id_trabajo, estado="error", error=str(e))
+            raise
+        futuro.add_done_callback(lambda f: self._terminar(id_trabajo, formato, f))
+        return id_trabajo
+
+    def _terminar(self, id_trabajo, formato, futuro):
+        conexion = self._conectar()
+        if futuro.cancelled():
+            _actualizar(conexion, id_trabajo, estado="error", error="Trabajo cancelado")
+            return
+        error = futuro.exception()
+        if error is not None:
+            _actualizar(conexion, id_trabajo, estado="error", error=str(error))
+            with self._lock:
+                self.errores += 1
+            print(f"ERROR al generar la animación {id_trabajo}: {error}")
+            return
+        fotogramas, segundos = futuro.result()
+        _actualizar(conexion, id_trabajo, estado="terminado", fotogramas=fotogramas, segundos=segundos)
+        with self._lock:
+            self.completados += 1
+        DURACION_ANIMACION.observar(segundos, formato=formato)
+
+    def _olvidar_antiguos(self, conexion, ahora):
+        """
+        Con más de max_trabajos, olvida los terminados más antiguos que no se
+        han consultado hace poco. Devuelve [(id, formato)] para borrar sus ficheros.
+        """
+        total = conexion.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0]
+        if total <= self.max_trabajos:
+            return []
+        olvidados = conexion.execute(
+            "SELECT id, formato FROM trabajos WHERE estado IN (?, ?) AND COALESCE(ultimo_acceso, 0) < ? "
+            "ORDER BY creado LIMIT ?", (*TERMINADOS, ahora - PROTECCION_DESCARGA, total - self.max_trabajos)
+        ).fetchall()
+        conexion.executemany("DELETE FROM trabajos WHERE id = ?", [(id_trabajo,) for id_trabajo, _ in olvidados])
+        return olvidados
+
+    def consultar(self, id_trabajo):
+        """
+        Estado de un trabajo ("en_cola", "en_curso", "terminado" o "error"),
+        o None si no existe. Si está terminado incluye la ruta del fichero.
+        """
+        conexion = self._conectar()
+        fila = conexion.execute(
+            "SELECT formato, estado, fotogramas, segundos, error FROM trabajos WHERE id = ?", (id_trabajo,)
+        ).fetchone()
+        if fila is None:
+            return None
+        formato, estado_trabajo, fotogramas, segundos, error = fila
+        estado = {"id": id_trabajo, "formato": formato, "estado": estado_trabajo, "fotogramas": fotogramas}
+        if estado_trabajo == "error":
+            estado["error"] = error
+        elif estado_trabajo == "terminado":
+            ruta = self._ruta(id_trabajo, formato)
+            if not os.path.exists(ruta):
+                return None
+            # Protege el fichero mientras se descarga
+            conexion.execute("UPDATE trabajos SET ultimo_acceso = ? WHERE id = ?", (time.time(), id_trabajo))
+            estado.update(segundos=round(segundos, 3), ruta=ruta)
+        return estado
+
+    def _estimar_espera(self, pendientes):
+        """Segundos sugeridos para Retry-After: lo que tarda en vaciarse la cola."""
+        duraciones = [fila[0] for fila in self._conectar().execute(
+            "SELECT segundos FROM trabajos WHERE estado = 'terminado' ORDER BY actualizado DESC LIMIT ?",
+            (MUESTRAS_DURACION,)
+        )]
+        media = (sum(duraciones) / len(duraciones)) if duraciones else 10.0
+        return max(1, round(media * pendientes / max(1, self.trabajadores)))
+
+    def estadisticas(self):
+        """
+        Trabajos en curso y en cola (de toda la máquina), contadores de este
+        proceso y percentiles de duración (segundos) de los trabajos recordados.
+        """
+        conexion = self._conectar()
+        por_estado = dict(conexion.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+        duraciones = [fila[0] for fila in conexion.execute(
+            "SELECT segundos FROM trabajos WHERE estado = 'terminado'"
+        )]
+        with self._lock:
+            return {
+                "trabajadores": self.trabajadores,
+                "cola_max": self.cola_max,
+                "en_curso": por_estado.get("en_curso", 0),
+                "en_cola": por_estado.get("en_cola", 0),
+                "trabajos": sum(por_estado.values()),
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+                "errores": self.errores,
+                "duracion_p50": percentil(duraciones, 50),
+                "duracion_p95": percentil(duraciones, 95)
+            }
+
+    def cerrar(self):
+        """Termina los procesos del pool (se vuelve a crear si se usa otra vez)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,172 @@
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import swisseph as swe
+
+from astral_calculator import PLANETAS_INDICES, SIGNOS, calcular_posiciones_bloque, formatear_signo
+from formatos_compactos import VERSION_COLUMNAS, codificar
+
+# Unidades admitidas en el paso de la serie ("30m", "6h", "1d")
+UNIDADES_PASO = {"m": timedelta(minutes=1), "h": timedelta(hours=1), "d": timedelta(days=1)}
+PASO_MINIMO = timedelta(seconds=1)
+
+# Instantes que se calculan juntos antes de escribirlos
+TAMANO_BLOQUE = 256
+
+
+def interpretar_paso(paso):
+    """
+    Convierte un paso como "30m", "6h" o "1d" en un timedelta.
+    Lanza un ValueError si el formato no es válido.
+    """
+    paso = paso.strip().lower()
+    if len(paso) < 2 or paso[-1] not in UNIDADES_PASO:
+        raise ValueError("El paso debe ser un número seguido de m, h o d (por ejemplo '6h')")
+    try:
+        cantidad = float(paso[:-1])
+    except ValueError:
+        raise ValueError("El paso debe ser un número seguido de m, h o d (por ejemplo '6h')")
+    if not math.isfinite(cantidad) or cantidad <= 0:
+        raise ValueError("El paso debe ser un número positivo")
+    try:
+        resultado = cantidad * UNIDADES_PASO[paso[-1]]
+    except OverflowError:
+        raise ValueError("El paso es demasiado grande")
+    if resultado < PASO_MINIMO:
+        raise ValueError("El paso debe ser de al menos 1 segundo")
+    return resultado
+
+
+def a_utc(fecha):
+    """Fecha UT sin zona horaria; las fechas sin zona se interpretan como UT."""
+    if fecha.tzinfo is None:
+        return fecha
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def dia_juliano_de_fecha(fecha):
+    """Día juliano (UT) de una fecha UT sin zona horaria."""
+    horas = fecha.hour + fecha.minute / 60.0 + (fecha.second + fecha.microsecond / 1e6) / 3600.0
+    return swe.julday(fecha.year, fecha.month, fecha.day, horas)
+
+
+def fecha_de_dia_juliano(jd_ut):
+    """Fecha UT (redondeada al segundo) de un día juliano."""
+    anio, mes, dia, horas = swe.revjul(jd_ut)
+    return datetime(anio, mes, dia) + timedelta(seconds=round(horas * 3600))
+
+
+def preparar_serie(inicio, fin, paso, cuerpos=None, max_filas=None):
+    """
+    Valida los parámetros de una serie de tránsitos.
+    Devuelve (inicio, paso, número de filas, {nombre: índice}) o lanza ValueError.
+    """
+    inicio, fin = a_utc(inicio), a_utc(fin)
+    paso = interpretar_paso(paso) if isinstance(paso, str) else paso
+    
+    if fin < inicio:
+        raise ValueError("La fecha final debe ser posterior a la inicial")
+    if inicio.year < 1900 or fin.year > 2100:
+        raise ValueError("Las fechas deben estar entre 1900 y 2100")
+    
+    if cuerpos is None:
+        cuerpos = list(PLANETAS_INDICES)
+    if not cuerpos:
+        raise ValueError("Indique al menos un cuerpo")
+    desconocidos = [c for c in cuerpos if c not in PLANETAS_INDICES]
+    if desconocidos:
+        raise ValueError(f"Cuerpos desconocidos: {', '.join(desconocidos)}")
+    
+    filas = math.floor((fin - inicio) / paso) + 1
+    if max_filas is not None and filas > max_filas:
+        raise ValueError(f"La serie tendría {filas} filas; el máximo es {max_filas}")
+    
+    return inicio, paso, filas, {c: PLANETAS_INDICES[c] for c in cuerpos}
+
+
+def _bloques(inicio, paso, filas, cuerpos, tamano_bloque):
+    """Instantes (días julianos) y posiciones (arrays cuerpo x instante) de cada bloque."""
+    indices = list(cuerpos.values())
+    jd_inicio = dia_juliano_de_fecha(inicio)
+    paso_dias = paso / timedelta(days=1)
+    
+    for desde in range(0, filas, tamano_bloque):
+        n = min(tamano_bloque, filas - desde)
+        jds = [jd_inicio + (desde + i) * paso_dias for i in range(n)]
+        longitudes, velocidades = calcular_posiciones_bloque(jds, indices)
+        yield desde, jds, longitudes, velocidades
+
+
+def generar_transitos(inicio, paso, filas, cuerpos, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Genera las filas de la serie una a una (diccionarios), calculando las
+    posiciones por bloques de `tamano_bloque` instantes. Nunca se guarda la
+    serie completa en memoria.
+    """
+    nombres = list(cuerpos)
+    
+    for desde, jds, longitudes, velocidades in _bloques(inicio, paso, filas, cuerpos, tamano_bloque):
+        longitudes, velocidades = longitudes.tolist(), velocidades.tolist()
+        
+        for i in range(len(jds)):
+            posiciones = {}
+            for k, nombre in enumerate(nombres):
+                posicion = formatear_signo(longitudes[k][i])
+                posicion["velocidad"] = round(velocidades[k][i], 4)
+                posicion["retrogrado"] = velocidades[k][i] < 0
+                posiciones[nombre] = posicion
+            
+            yield {
+                "fecha": (inicio + (desde + i) * paso).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "dia_juliano": round(jds[i], 5),
+                "posiciones": posiciones
+            }
+
+
+def generar_transitos_columnas(inicio, paso, filas, cuerpos, tamano_bloque=TAMANO_BLOQUE):
+    """
+    La misma serie en columnas: un diccionario por bloque con un array por
+    dato (una fila por cuerpo, una columna por instante) y los signos como
+    índices en la tabla "signos", que va solo en el primer bloque.
+    """
+    nombres = list(cuerpos)
+    
+    for desde, jds, longitudes, velocidades in _bloques(inicio, paso, filas, cuerpos, tamano_bloque):
+        bloque = {"desde": desde}
+        if desde == 0:
+            bloque.update(formato="columnas", version=VERSION_COLUMNAS, signos=SIGNOS, cuerpos=nombres)
+        bloque.update(
+            fechas=[(inicio + (desde + i) * paso).strftime("%Y-%m-%dT%H:%M:%SZ") for i in range(len(jds))],
+            dia_juliano=[round(jd, 5) for jd in jds],
+            longitudes=np.round(longitudes, 2).tolist(),
+            signos_cuerpos=(longitudes // 30).astype(np.int64).tolist(),
+            velocidades=np.round(velocidades, 4).tolist()
+        )
+        yield bloque
+
+
+def transitos_codificados(inicio, paso, filas, cuerpos, formato, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Serie en columnas codificada, un trozo por bloque: en "columnas", NDJSON
+    (un bloque JSON por línea); en "msgpack", objetos MessagePack seguidos.
+    """
+    for bloque in generar_transitos_columnas(inicio, paso, filas, cuerpos, tamano_bloque):
+        contenido = codificar(bloque, formato)
+        yield contenido if formato == "msgpack" else contenido + b"\n"
+
+
+def transitos_ndjson(inicio, paso, filas, cuerpos, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Serie de tránsitos como NDJSON: un trozo de bytes por bloque calculado,
+    con una fila JSON por línea.
+    """
+    lineas = []
+    for fila in generar_transitos(inicio, paso, filas, cuerpos, tamano_bloque):
+        lineas.append(json.dumps(fila, ensure_ascii=False))
+        if len(lineas) == tamano_bloque:
+            yield ("\n".join(lineas) + "\n").encode("utf-8")
+            lineas = []
+    if lineas:
+        yield ("\n".join(lineas) + "\n").encode("utf-8")